@@ -0,0 +1,106 @@
+from __future__ import annotations
+import asyncio
+import threading
+from concurrent.futures import Executor, TimeoutError
+import numpy as np
+from TangramSolver import TangramSolver
+from SearchEvent import SearchEvent
+import settings
+
+
+class AsyncSolver:
+    """
+    Runs the solver in an executor and gives the events of its search to asyncio code, so that a client shows the
+    progress of the search without blocking its event loop and cancels it by stopping to read them. The events go
+    through a bounded queue: the search pauses while the client does not read them.
+
+    Attributes:
+        puzzle_shadow:      black and white image of the shape to solve
+        executor:           executor running the search, the default executor of the event loop if None. The events
+                            are given by the solver object itself, so it must be a thread executor
+        solver_arguments:   other arguments of the TangramSolver, like its budgets or move ordering
+        stop_event:         event cancelling the search once set
+        reading_ended:      event set once the client stops reading the events, the search then stops sending them
+        solver:             solver of the puzzle, None until the search starts, holding the result once it has ended
+    """
+    def __init__(self, puzzle_shadow: np.ndarray, executor: Executor = None, **solver_arguments):
+        self.puzzle_shadow: np.ndarray = puzzle_shadow
+        self.executor: Executor | None = executor
+        self.solver_arguments: dict = solver_arguments
+        self.stop_event: threading.Event = threading.Event()
+        self.reading_ended: threading.Event = threading.Event()
+        self.solver: TangramSolver | None = None
+
+    def run_solver(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue) -> None:
+        """
+        Runs the search in the executor, sending each event to the queue of the event loop, then None once it has ended
+        :param loop: event loop reading the events
+        :param queue: queue of the events
+        """
+        self.solver = TangramSolver(self.puzzle_shadow, stop_event=self.stop_event, lazy=True, **self.solver_arguments)
+        steps = self.solver.solve_steps()
+        try:
+            for event in steps:
+                if not self.send_event(loop, queue, event):
+                    break
+        finally:
+            steps.close()
+            self.send_event(loop, queue, None)
+
+    def send_event(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, event: SearchEvent | None) -> bool:
+        """
+        Puts an event in the queue of the event loop, waiting while the queue is full so that the search only goes on
+        once the client has read the previous events
+        :param loop: event loop reading the events
+        :param queue: queue of the events
+        :param event: event to send, None once the search has ended
+        :return: True if the event has been put in the queue, False if the client stopped reading the events
+        """
+        if self.reading_ended.is_set():
+            return False
+        future = asyncio.run_coroutine_threadsafe(queue.put(event), loop)
+        while not self.reading_ended.is_set():
+            try:
+                future.result(timeout=.1)
+                return True
+            except TimeoutError:  # the queue is still full
+                continue
+        future.cancel()
+        return False
+
+    async def solve_steps(self):
+        """
+        Solves the puzzle in the executor. Leaving the loop reading the events, or cancelling the task reading them,
+        cancels the search, which then stops within a few nodes. The search waits while ASYNC_EVENTS_QUEUE_SIZE events
+        are not read.
+        :return: asynchronous generator of the events of the search, see TangramSolver.solve_steps
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=settings.ASYNC_EVENTS_QUEUE_SIZE)
+        future = loop.run_in_executor(self.executor, self.run_solver, loop, queue)
+        try:
+            while (event := await queue.get()) is not None:
+                yield event
+            await future  # raises the errors of the search
+        finally:
+            self.reading_ended.set()
+            self.stop_event.set()
+
+    async def solve(self) -> TangramSolver:
+        """
+        Solves the puzzle in the executor without reading the events
+        :return: the solver, holding the solution or the best partial placement
+        """
+        async for _ in self.solve_steps():
+            pass
+        return self.solver
+
+    def cancel(self) -> None:
+        """
+        Cancels the search, from any thread, the last event given being then "searchEnded" with the "incomplete" status
+        """
+        self.stop_event.set()
+
+
+if __name__ == "__main__":
+    pass
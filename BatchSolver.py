@@ -0,0 +1,165 @@
+from __future__ import annotations
+import glob
+import json
+import os
+import time
+from functools import partial, lru_cache
+from multiprocessing import Pool
+from ImageProcessor import ImageProcessor
+from StatsHandler import StatsHandler
+from TangramSolver import TangramSolver
+from SolutionIndex import SolutionIndex
+from ResultCache import ResultCache
+import settings
+
+
+@lru_cache(maxsize=None)
+def get_solution_index(solution_index_path: str) -> SolutionIndex:
+    """
+    Loads the solution index once in each worker
+    :param solution_index_path: path of the .npz file of the index
+    :return: the index
+    """
+    return SolutionIndex(solution_index_path)
+
+def solve_puzzle(image_path: str, move_ordering: str = settings.MOVE_ORDERING, engine: str = settings.SOLVER_ENGINE,
+                 solution_index_path: str = None, result_cache_directory: str = None, time_budget: float = settings.SOLVER_TIME_BUDGET,
+                 node_budget: int = settings.SOLVER_NODE_BUDGET) -> dict:
+    """
+    Solves one puzzle, used by the workers of the batch solver
+    :param image_path: path of the image of the puzzle to solve
+    :param move_ordering: name of the order in which the pieces and the corners are tried
+    :param engine: "raster", "exact" or "coarse", see TangramSolver
+    :param solution_index_path: path of the solution index in which the puzzle is looked up before solving it, None to
+                                always solve it
+    :param result_cache_directory: directory of the result cache shared by the workers, None to disable it
+    :param time_budget: maximum duration of the search in seconds, None for no limit
+    :param node_budget: maximum number of nodes expanded by the search, None for no limit
+    :return: the json record of the puzzle, with the stats and the pieces of the solution, or of the best partial
+             placement if the search ran out of budget, or with the error raised if the puzzle could not be solved
+    """
+    try:
+        image_processor = ImageProcessor(image_path)
+        whole_image = image_processor.get_whole_image()
+        stats_handler = StatsHandler(image_path, ResultCache(result_cache_directory) if result_cache_directory is not None else None)
+        record = {
+            "imagePath": image_path,
+            "cacheHit": stats_handler.load_cached_result(whole_image),
+            "indexHit": False,
+        }
+        if not record["cacheHit"]:
+            solution_index = get_solution_index(solution_index_path) if solution_index_path is not None else None
+            start_time = time.time()
+            solver = TangramSolver(image_processor.image, move_ordering=move_ordering, engine=engine, solution_index=solution_index,
+                                   time_budget=time_budget, node_budget=node_budget)
+            used_pieces = image_processor.get_pieces_in_whole_image(solver.partial_node.current_state.used_pieces) if solver.status != "unsolvable" else None
+            stats_handler.set_result(time.time() - start_time, len(image_processor.corners), used_pieces, solver.search_stats, solver.status)
+            stats_handler.cache_result(whole_image)
+            record["indexHit"] = solver.is_index_hit
+        record["solved"] = stats_handler.solved
+        record.update(stats_handler.to_json())
+    except Exception as error:  # an unreadable puzzle must not stop the whole batch
+        return {"imagePath": image_path, "error": f"{type(error).__name__}: {error}"}
+    return record
+
+
+class BatchSolver:
+    """
+    Used to solve a whole set of puzzles on a pool of worker processes, the results being streamed to a jsonl file
+
+    Attributes:
+        image_paths:        paths of the images of the puzzles to solve
+        output_path:        path of the jsonl file in which the results are written, one puzzle per line
+        workers_number:     number of worker processes, the number of cpus by default
+        move_ordering:      name of the order in which the pieces and the corners are tried
+        engine:             "raster", "exact" or "coarse", see TangramSolver
+        solution_index_path:    path of the solution index in which the puzzles are looked up, None to solve them all. The
+                                puzzles solved by the search are added to it once all the workers have ended
+        result_cache_directory: directory of the result cache shared by the workers, None to disable it
+        time_budget:        maximum duration of the search of each puzzle in seconds, None for no limit
+        node_budget:        maximum number of nodes expanded by the search of each puzzle, None for no limit
+        solved_number:      number of puzzles solved during the last run
+        incomplete_number:  number of puzzles whose search ran out of budget during the last run
+        index_hits_number:  number of puzzles found in the solution index during the last run
+        cache_hits_number:  number of puzzles found in the result cache during the last run
+        index_additions_number: number of puzzles added to the solution index at the end of the last run
+        errors_number:      number of puzzles which could not be solved because of an error during the last run, like an
+                            unreadable image
+        duration:           duration of the last run in seconds
+    """
+    def __init__(self, images_pattern: str, output_path: str, workers_number: int = None, move_ordering: str = settings.MOVE_ORDERING,
+                 engine: str = settings.SOLVER_ENGINE, solution_index_path: str = None, result_cache_directory: str = None,
+                 time_budget: float = settings.SOLVER_TIME_BUDGET, node_budget: int = settings.SOLVER_NODE_BUDGET):
+        self.image_paths: list[str] = self.get_image_paths(images_pattern)
+        self.output_path: str = output_path
+        self.workers_number: int = workers_number if workers_number is not None else os.cpu_count()
+        self.move_ordering: str = move_ordering
+        self.engine: str = engine
+        self.solution_index_path: str = solution_index_path
+        self.result_cache_directory: str = result_cache_directory
+        self.time_budget: float = time_budget
+        self.node_budget: int = node_budget
+        self.solved_number: int = 0
+        self.incomplete_number: int = 0
+        self.index_hits_number: int = 0
+        self.cache_hits_number: int = 0
+        self.index_additions_number: int = 0
+        self.errors_number: int = 0
+        self.duration: float = 0
+
+    @staticmethod
+    def get_image_paths(images_pattern: str) -> list[str]:
+        """
+        Gives the paths of the puzzles to solve
+        :param images_pattern: directory containing png images, or glob pattern like user_shapes/*.png
+        :return: the sorted list of the image paths
+        """
+        if os.path.isdir(images_pattern):
+            images_pattern = os.path.join(images_pattern, "*.png")
+        return sorted(glob.glob(images_pattern))
+
+    def run(self) -> None:
+        """
+        Solves all the puzzles and writes each record to the output file as soon as it is available
+        """
+        self.solved_number = 0
+        self.incomplete_number = 0
+        self.index_hits_number = 0
+        self.cache_hits_number = 0
+        self.index_additions_number = 0
+        self.errors_number = 0
+        searched_records = []
+        start_time = time.time()
+        with Pool(self.workers_number) as pool, open(self.output_path, "w") as file:
+            solve = partial(solve_puzzle, move_ordering=self.move_ordering, engine=self.engine, solution_index_path=self.solution_index_path,
+                            result_cache_directory=self.result_cache_directory, time_budget=self.time_budget, node_budget=self.node_budget)
+            for record in pool.imap_unordered(solve, self.image_paths):
+                if "error" in record:
+                    self.errors_number += 1
+                    print(f"{record['imagePath']} not solved: {record['error']}")
+                else:
+                    self.solved_number += record["solved"]
+                    self.incomplete_number += record["status"] == "incomplete"
+                    self.index_hits_number += record["indexHit"]
+                    self.cache_hits_number += record["cacheHit"]
+                    if record["solved"] and not record["indexHit"] and not record["cacheHit"]:
+                        searched_records.append(record)
+                file.write(json.dumps(record) + "\n")
+                file.flush()
+        if self.solution_index_path is not None and len(searched_records) > 0:
+            # each worker only adds its solutions to its own copy of the index, they are saved once from here
+            solution_index = SolutionIndex(self.solution_index_path)
+            self.index_additions_number = sum(solution_index.add_batch_record(record) for record in searched_records)
+            solution_index.save()
+        self.duration = time.time() - start_time
+
+    def get_puzzles_per_second(self) -> float:
+        """
+        Gives the throughput of the last run
+        :return: the number of puzzles processed per second
+        """
+        return len(self.image_paths) / self.duration if self.duration > 0 else 0
+
+
+if __name__ == "__main__":
+    pass
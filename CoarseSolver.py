@@ -0,0 +1,215 @@
+from __future__ import annotations
+import time
+import cv2 as cv
+import numpy as np
+from Node import Node
+from State import State
+from SearchEvent import SearchEvent
+from MoveOrdering import get_move_ordering
+from placements import Placement
+from PieceMaskLibrary import PieceMaskLibrary
+from utils import is_piece_accepted_at_shape_corner, accept_new_piece, get_piece_mask, draw_piece_mask_in_image, PackedImage
+from elements import *
+import settings
+
+
+class CoarseSolver:
+    """
+    Solves the shape on a downscaled copy of it, where the pieces and the image are smaller, then refines the sequence
+    of placements found at full resolution: the pieces are placed in the same order, first at their coarse position and
+    orientation scaled up and slightly moved and rotated to fit the full resolution shape, then on the corners of the
+    full resolution shape close to their coarse positions, and must pass the placement test of the solver. The coarse
+    search goes on after a solution which cannot be refined, until one is refined. When the coarse search fails or
+    none of its solutions can be refined, the full resolution search has to be run.
+
+    Attributes:
+        puzzle_shadow:  black and white image of the shape at full resolution
+        side_length:    side length of the tangram in the coarse search
+        scale:          ratio between the coarse and the full resolution
+        coarse_shadow:  black and white image of the shape at the coarse resolution
+        move_ordering:  name of the order in which the pieces and the corners are tried, see MoveOrdering
+        node_budget:    maximum number of nodes expanded by the coarse search
+        deadline:       time at which the coarse search and the refinement stop, None for no limit
+        stop_event:     event set to cancel the search from another thread, None if it cannot be cancelled
+        coarse_status:  status of the coarse search, see TangramSolver.status, None before it runs
+        expanded_nodes_number:  number of nodes expanded by the coarse search
+        refinement_nodes_number:    number of pieces placed at full resolution while refining the coarse solutions
+        refined_solutions_number:   number of coarse solutions whose refinement was tried
+    """
+    def __init__(self, puzzle_shadow: np.ndarray, side_length: float = settings.COARSE_SIDE_LENGTH, move_ordering: str = settings.MOVE_ORDERING,
+                 node_budget: int = settings.COARSE_NODE_BUDGET, deadline: float = None, stop_event=None):
+        self.puzzle_shadow: np.ndarray = puzzle_shadow
+        self.side_length: float = side_length
+        self.scale: float = side_length / settings.TANGRAM_SIDE_LENGTH
+        self.coarse_shadow: np.ndarray = self.downscale_image(puzzle_shadow, self.scale)
+        self.move_ordering: str = move_ordering
+        self.node_budget: int = node_budget
+        self.deadline: float | None = deadline
+        self.stop_event = stop_event
+        self.coarse_status: str | None = None
+        self.expanded_nodes_number: int = 0
+        self.refinement_nodes_number: int = 0
+        self.refined_solutions_number: int = 0
+
+    @staticmethod
+    def downscale_image(image: np.ndarray, scale: float) -> np.ndarray:
+        """
+        Downscales a black and white image, the pixels more than half black becoming black
+        :param image: black and white image
+        :param scale: ratio of the new size to the size of the image
+        :return: the black and white downscaled image
+        """
+        downscaled_image = cv.resize(image, (round(image.shape[1] * scale), round(image.shape[0] * scale)), interpolation=cv.INTER_AREA)
+        return cv.threshold(downscaled_image, 127, 255, cv.THRESH_BINARY)[1]
+
+    def solve(self) -> Node | None:
+        """
+        Runs the coarse search lazily, refining each of its distinct solutions at full resolution as soon as it is found,
+        until one is refined or the budgets run out
+        :return: the solution node at full resolution, None if the coarse search found no solution which could be refined
+        """
+        from TangramSolver import TangramSolver
+        root_state = State(TangramSolver.get_available_pieces(self.scale), self.coarse_shadow, move_ordering=get_move_ordering(self.move_ordering),
+                           scale=self.scale)
+        coarse_solver = TangramSolver(self.coarse_shadow, root_state=root_state, node_budget=self.node_budget, stop_event=self.stop_event,
+                                      time_budget=self.deadline - time.time() if self.deadline is not None else None, lazy=True,
+                                      enumerate_solutions=True)
+        coarse_steps = coarse_solver.solve_steps()
+        solution_node = None
+        try:
+            for event in coarse_steps:
+                if event.kind != SearchEvent.SOLUTION_FOUND:
+                    continue
+                self.refined_solutions_number += 1
+                solution_node = self.refine(event.pieces)
+                if solution_node is not None or self.refinement_nodes_number >= settings.COARSE_REFINEMENT_NODE_BUDGET or self.is_budget_exhausted():
+                    break
+        finally:
+            coarse_steps.close()
+            self.coarse_status = coarse_solver.status if solution_node is None else "solved"
+            self.expanded_nodes_number = coarse_solver.expanded_nodes_number
+        return solution_node
+
+    def is_budget_exhausted(self) -> bool:
+        """
+        Tells if the search must stop, because it has been cancelled or because its deadline has passed
+        :return: True if the search must stop, False otherwise
+        """
+        return (self.stop_event is not None and self.stop_event.is_set()) or (self.deadline is not None and time.time() >= self.deadline)
+
+    def refine(self, coarse_pieces: list[Piece]) -> Node | None:
+        """
+        Searches the full resolution solution close to the coarse one: the pieces are placed in the same order, each at
+        its coarse pose fitted to the shape, then on the corners of the shape closest to its coarse position
+        :param coarse_pieces: pieces of the solution of the coarse search, in the order they were placed
+        :return: the solution node at full resolution, None if none was found within the refinement budget
+        """
+        from TangramSolver import TangramSolver
+        root_state = State(TangramSolver.get_available_pieces(), self.puzzle_shadow, move_ordering=get_move_ordering(self.move_ordering))
+        return self.refine_state(Node(root_state), coarse_pieces)
+
+    def refine_state(self, node: Node, coarse_pieces: list[Piece]) -> Node | None:
+        """
+        Places the next piece of the coarse solution at full resolution and refines the following ones, backtracking
+        over the placements close to the coarse one
+        :param node: node of the full resolution state where the next piece is placed
+        :param coarse_pieces: pieces of the coarse solution still to place
+        :return: the solution node, None if the coarse solution cannot be refined from this state
+        """
+        if len(coarse_pieces) == 0:
+            return node
+        state = node.current_state
+        for piece_index, piece, image in self.get_accepted_placements(state, coarse_pieces[0]):
+            if self.refinement_nodes_number >= settings.COARSE_REFINEMENT_NODE_BUDGET or self.is_budget_exhausted():
+                return None
+            self.refinement_nodes_number += 1
+            next_state = state.generate_next_state(image, piece, piece_index)
+            if settings.FEASIBILITY_PRUNING and not next_state.is_feasible():
+                continue
+            solution_node = self.refine_state(Node(next_state, node), coarse_pieces[1:])
+            if solution_node is not None:
+                return solution_node
+        return None
+
+    def get_accepted_placements(self, state: State, coarse_piece: Piece):
+        """
+        Gives the full resolution placements of a piece of the coarse solution which pass the placement test, the fitted
+        coarse poses first, then the placements on the corners close to the coarse position
+        :param state: full resolution state where the piece is placed
+        :param coarse_piece: piece placed by the coarse search
+        :return: generator of the index of the piece in the available pieces, the placed piece and the image with it
+        """
+        piece_index = next(index for index, piece in enumerate(state.available_pieces) if piece.name == coarse_piece.name)
+        for piece in self.get_fitted_pieces(state, coarse_piece, piece_index):
+            piece_mask, piece_box = get_piece_mask(piece, state.image.shape)
+            if accept_new_piece(state.image, piece_mask, piece_box, piece.area):
+                yield piece_index, piece, draw_piece_mask_in_image(state.image.copy(), piece_mask, piece_box)
+        for placement in self.get_refinement_placements(state, coarse_piece):
+            piece = state.get_placed_piece(placement)
+            is_piece_accepted, image = is_piece_accepted_at_shape_corner(state.image, piece, state.corners[placement.shape_corner_index], state.corners,
+                                                                         state.search_stats)
+            if is_piece_accepted:
+                yield placement.piece_index, piece, image
+
+    def get_fitted_pieces(self, state: State, coarse_piece: Piece, piece_index: int) -> list[Piece]:
+        """
+        Scales up the pose of a piece of the coarse solution and fits it to the full resolution shape: the piece is
+        rotated by up to COARSE_MAX_ROTATION_ERROR degrees, and for each rotation moved to the closest shift where it
+        covers nearly the most uncovered black pixels, at most COARSE_MAX_SHIFT pixels away. The coarse pixels are too
+        large for the corners of the coarse shape to give the exact position and direction of the full resolution ones.
+        :param state: full resolution state where the piece is placed
+        :param coarse_piece: piece placed by the coarse search
+        :param piece_index: index of the same type of piece in the available pieces of the state
+        :return: the fitted pieces, the ones covering the most black pixels first
+        """
+        max_shift = settings.COARSE_MAX_SHIFT
+        image = state.image.unpack() if isinstance(state.image, PackedImage) else state.image
+        canvas_shape = (image.shape[0] + 2 * max_shift, image.shape[1] + 2 * max_shift)  # padded for the pieces near the borders
+        shape = np.pad((image == 0).astype(np.float32), 2 * max_shift)
+        # the center of a coarse pixel is the center of the block of full resolution pixels it comes from
+        first_point = (coarse_piece.get_points_array()[0] + .5) / self.scale - .5
+        coarse_angle = PieceMaskLibrary.get_first_edge_angle(coarse_piece)
+        placement = Placement(piece_index, coarse_piece.corners_shifts_counter % coarse_piece.max_corners_shifts,
+                              getattr(coarse_piece, "is_flipped", False), -1)
+        fits = []
+        for rotation_error in range(-settings.COARSE_MAX_ROTATION_ERROR, settings.COARSE_MAX_ROTATION_ERROR + 1):
+            piece = state.get_placed_piece(placement)
+            piece.rotate_shape_around_its_pivot_point(PieceMaskLibrary.get_first_edge_angle(piece) - coarse_angle - rotation_error)
+            piece.position_in_image = Point(*(first_point - piece.coordinates[0] + max_shift).tolist())
+            piece_mask, (x, y, w, h) = get_piece_mask(piece, canvas_shape)
+            if w == 0:
+                continue
+            covered_pixels = cv.matchTemplate(shape[y:y + h + 2 * max_shift, x:x + w + 2 * max_shift], piece_mask.astype(np.float32), cv.TM_CCORR)
+            shifts_y, shifts_x = np.nonzero(covered_pixels >= covered_pixels.max() - .001 * piece.area)  # nearly the best shifts
+            closest_shift = np.argmin((shifts_x - max_shift) ** 2 + (shifts_y - max_shift) ** 2)
+            shift_x, shift_y = int(shifts_x[closest_shift]) - 2 * max_shift, int(shifts_y[closest_shift]) - 2 * max_shift
+            piece.position_in_image = piece.position_in_image + Point(shift_x, shift_y)
+            fits.append((float(covered_pixels.max()), piece))
+        return [piece for _, piece in sorted(fits, key=lambda fit: -fit[0])]
+
+    def get_refinement_placements(self, state: State, coarse_piece: Piece):
+        """
+        Gives the placements of a piece of the coarse solution tried at full resolution
+        :param state: full resolution state where the piece is placed
+        :param coarse_piece: piece placed by the coarse search, its position being the corner of the shape it was put on
+        :return: generator of the placements of the same type of piece on the corners close to its coarse position,
+                 closest first, the coarse orientation of the piece being tried first on each corner
+        """
+        piece_index = next(index for index, piece in enumerate(state.available_pieces) if piece.name == coarse_piece.name)
+        corner_shift = coarse_piece.corners_shifts_counter % coarse_piece.max_corners_shifts
+        corner_shifts = [corner_shift] + [shift for shift in range(coarse_piece.max_corners_shifts) if shift != corner_shift]
+        is_flipped = getattr(coarse_piece, "is_flipped", False)
+        flips = [is_flipped, not is_flipped] if hasattr(coarse_piece, "flip") else [False]
+        # the center of a coarse pixel is the center of the block of full resolution pixels it comes from
+        x = (coarse_piece.position_in_image.x + .5) / self.scale - .5
+        y = (coarse_piece.position_in_image.y + .5) / self.scale - .5
+        distances = [(corner.x - x) ** 2 + (corner.y - y) ** 2 for corner in state.corners]
+        for corner_index in sorted(range(len(state.corners)), key=lambda index: distances[index]):
+            if distances[corner_index] > settings.COARSE_MAX_CORNER_DISTANCE ** 2:
+                break
+            for shift in corner_shifts:
+                for flip in flips:
+                    yield Placement(piece_index, shift, flip, corner_index)
+
+if __name__ == "__main__":
+    pass
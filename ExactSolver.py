@@ -0,0 +1,591 @@
+from __future__ import annotations
+from fractions import Fraction
+from math import sqrt, atan2, pi, hypot
+import time
+import cv2 as cv
+import numpy as np
+from Node import Node
+from State import State
+from utils import draw_piece_in_image
+from elements import *
+import settings
+
+SQRT_2 = sqrt(2)
+FLOAT_TOLERANCE = 1e-7  # margin under which a floating point test is redone with exact numbers
+DIRECTIONS = {(1, 0): 0, (1, 1): 1, (0, 1): 2, (-1, 1): 3, (-1, 0): 4, (-1, -1): 5, (0, -1): 6, (1, -1): 7}  # multiples of 45°
+DIRECTION_VECTORS = {index: vector for vector, index in DIRECTIONS.items()}
+
+
+class ExactNumber:
+    """
+    Number of the form a + b√2 with rational a and b. All the coordinates of the tangram pieces rotated by multiples
+    of 45° are such numbers, so the geometry of the lattice is computed without any rounding.
+
+    Attributes:
+        a:  rational part
+        b:  coefficient of √2
+    """
+    __slots__ = ("a", "b")
+
+    def __init__(self, a: int | Fraction = 0, b: int | Fraction = 0):
+        self.a: int | Fraction = a.numerator if isinstance(a, Fraction) and a.denominator == 1 else a
+        self.b: int | Fraction = b.numerator if isinstance(b, Fraction) and b.denominator == 1 else b
+
+    def __repr__(self) -> str:
+        return f"({self.a} + {self.b}√2)"
+
+    def __float__(self) -> float:
+        return self.a + self.b * SQRT_2
+
+    def __add__(self, other: ExactNumber | int) -> ExactNumber:
+        if isinstance(other, ExactNumber):
+            return ExactNumber(self.a + other.a, self.b + other.b)
+        return ExactNumber(self.a + other, self.b)
+
+    def __sub__(self, other: ExactNumber | int) -> ExactNumber:
+        if isinstance(other, ExactNumber):
+            return ExactNumber(self.a - other.a, self.b - other.b)
+        return ExactNumber(self.a - other, self.b)
+
+    def __neg__(self) -> ExactNumber:
+        return ExactNumber(-self.a, -self.b)
+
+    def __mul__(self, other: ExactNumber | int | Fraction) -> ExactNumber:
+        if isinstance(other, ExactNumber):
+            return ExactNumber(self.a * other.a + 2 * self.b * other.b, self.a * other.b + self.b * other.a)
+        return ExactNumber(self.a * other, self.b * other)
+
+    def __truediv__(self, other: ExactNumber) -> ExactNumber:
+        norm = Fraction(other.a * other.a - 2 * other.b * other.b)  # (c + d√2)(c - d√2)
+        return ExactNumber((self.a * other.a - 2 * self.b * other.b) / norm, (self.b * other.a - self.a * other.b) / norm)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ExactNumber):
+            return self.a == other.a and self.b == other.b
+        return self.a == other and self.b == 0
+
+    def __hash__(self) -> int:
+        return hash((self.a, self.b))
+
+    def sign(self) -> int:
+        """
+        Gives the sign of the number, without converting it to a float
+        :return: -1, 0 or 1
+        """
+        a_sign = (self.a > 0) - (self.a < 0)
+        b_sign = (self.b > 0) - (self.b < 0)
+        if a_sign == b_sign or b_sign == 0:
+            return a_sign
+        if a_sign == 0:
+            return b_sign
+        difference = self.a * self.a - 2 * self.b * self.b  # a and b have opposite signs, the largest term wins
+        return a_sign if difference > 0 else -a_sign if difference < 0 else 0
+
+    def __lt__(self, other) -> bool:
+        return (self - other).sign() < 0
+
+    def __le__(self, other) -> bool:
+        return (self - other).sign() <= 0
+
+    def __gt__(self, other) -> bool:
+        return (self - other).sign() > 0
+
+    def __ge__(self, other) -> bool:
+        return (self - other).sign() >= 0
+
+
+HALF_SQRT_2 = ExactNumber(0, Fraction(1, 2))
+
+
+### EXACT GEOMETRY ###
+
+def cross(origin: tuple, a: tuple, b: tuple):
+    """
+    Cross product of the vectors origin->a and origin->b, positive when b is on the left of origin->a
+    :param origin: origin of the two vectors
+    :param a: end of the first vector
+    :param b: end of the second vector
+    :return: the cross product, exact if the points are exact
+    """
+    return (a[0] - origin[0]) * (b[1] - origin[1]) - (a[1] - origin[1]) * (b[0] - origin[0])
+
+def get_polygon_area(points: list[tuple]):
+    """
+    Gives the signed area of a polygon, positive when its vertexes turn from the x axis to the y axis
+    :param points: vertexes of the polygon
+    :return: the signed area, exact if the points are exact
+    """
+    double_area = 0
+    for i in range(len(points)):
+        (x1, y1), (x2, y2) = points[i - 1], points[i]
+        double_area = x1 * y2 - x2 * y1 + double_area
+    return double_area * Fraction(1, 2)
+
+def clip_polygon(subject: list[tuple], convex_clip: list[tuple]) -> list[tuple]:
+    """
+    Sutherland–Hodgman clipping of a polygon by a convex polygon. The result may have degenerated edges but its area is
+    the area of the intersection.
+    :param subject: vertexes of the clipped polygon
+    :param convex_clip: vertexes of the convex polygon, with a positive area
+    :return: the vertexes of the intersection
+    """
+    output = subject
+    for i in range(len(convex_clip)):
+        if len(output) == 0:
+            break
+        a, b = convex_clip[i - 1], convex_clip[i]
+        points, output = output, []
+        start = points[-1]
+        start_side = cross(a, b, start)
+        for end in points:
+            end_side = cross(a, b, end)
+            if (end_side >= 0) != (start_side >= 0):
+                t = start_side / (start_side - end_side)
+                output.append((start[0] + (end[0] - start[0]) * t, start[1] + (end[1] - start[1]) * t))
+            if end_side >= 0:
+                output.append(end)
+            start, start_side = end, end_side
+    return output
+
+def rotate_point_45(point: tuple[ExactNumber, ExactNumber]) -> tuple[ExactNumber, ExactNumber]:
+    """
+    Rotates a point by 45° around the origin, from the x axis to the y axis
+    :param point: the exact point
+    :return: the rotated point
+    """
+    x, y = point
+    return (x - y) * HALF_SQRT_2, (x + y) * HALF_SQRT_2
+
+def get_direction(start: tuple[ExactNumber, ExactNumber], end: tuple[ExactNumber, ExactNumber]) -> int:
+    """
+    Gives the direction of an edge of the lattice
+    :param start: start of the edge
+    :param end: end of the edge
+    :return: the index k of the direction, the edge making an angle of k * 45° with the x axis
+    """
+    return DIRECTIONS[((end[0] - start[0]).sign(), (end[1] - start[1]).sign())]
+
+def get_half_plane_sectors(direction: int) -> frozenset[int]:
+    """
+    Gives the sectors on the left of a direction. The sector s is between the directions s and s + 1, so the
+    neighbourhood of a point of the lattice is made of 8 sectors which are either entirely covered or not.
+    :param direction: index of the direction
+    :return: the indexes of the sectors
+    """
+    return frozenset((direction + i) % 8 for i in range(4))
+
+def get_vertex_sectors(incoming_direction: int, outgoing_direction: int, is_convex: bool) -> frozenset[int]:
+    """
+    Gives the sectors inside a polygon around one of its vertexes
+    :param incoming_direction: direction of the edge ending at the vertex
+    :param outgoing_direction: direction of the edge starting at the vertex
+    :param is_convex: True if the polygon turns to the left at the vertex
+    :return: the indexes of the sectors inside the polygon
+    """
+    if incoming_direction == outgoing_direction:
+        return get_half_plane_sectors(outgoing_direction)
+    if is_convex:
+        return get_half_plane_sectors(incoming_direction) & get_half_plane_sectors(outgoing_direction)
+    return get_half_plane_sectors(incoming_direction) | get_half_plane_sectors(outgoing_direction)
+
+def get_lexicographic_key(point: tuple) -> tuple[float, float]:
+    """
+    Key sorting the points from top to bottom then from left to right. Two different points of the lattice never have
+    the same floating point coordinates.
+    :param point: the point
+    :return: the sort key
+    """
+    return float(point[1]), float(point[0])
+
+
+class ExactPolygon:
+    """
+    Polygon of the lattice with a positive area, stored with exact and floating point coordinates
+
+    Attributes:
+        points:             exact vertexes of the polygon
+        float_points:       floating point vertexes, used to filter the exact computations
+        directions:         direction of the edge starting at each vertex
+        vertexes_sectors:   sectors inside the polygon around each vertex
+        vertexes_indexes:   index of each vertex from its coordinates
+        bounding_box:       floating point bounding box of the polygon (min x, min y, max x, max y)
+        area:               exact area of the polygon
+    """
+    def __init__(self, points: list[tuple[ExactNumber, ExactNumber]]):
+        if get_polygon_area(points).sign() < 0:
+            points = points[::-1]
+        self.points: list[tuple[ExactNumber, ExactNumber]] = points
+        self.float_points: list[tuple[float, float]] = [(float(x), float(y)) for x, y in points]
+        points_number = len(points)
+        self.directions: list[int] = [get_direction(points[i], points[(i + 1) % points_number]) for i in range(points_number)]
+        self.vertexes_sectors: list[frozenset[int]] = [
+            get_vertex_sectors(self.directions[i - 1], self.directions[i], cross(points[i - 1], points[i], points[(i + 1) % points_number]).sign() > 0)
+            for i in range(points_number)
+        ]
+        self.vertexes_indexes: dict[tuple[ExactNumber, ExactNumber], int] = {point: i for i, point in enumerate(points)}
+        xs, ys = [x for x, _ in self.float_points], [y for _, y in self.float_points]
+        self.bounding_box: tuple[float, float, float, float] = (min(xs), min(ys), max(xs), max(ys))
+        self.area: ExactNumber = get_polygon_area(points)
+
+    def translate(self, dx: ExactNumber, dy: ExactNumber) -> ExactPolygon:
+        """
+        Gives the polygon moved by a vector
+        :param dx: x coordinate of the vector
+        :param dy: y coordinate of the vector
+        :return: the moved polygon
+        """
+        return ExactPolygon([(x + dx, y + dy) for x, y in self.points])
+
+    def get_sectors_at(self, point: tuple[ExactNumber, ExactNumber], float_point: tuple[float, float]) -> frozenset[int]:
+        """
+        Gives the sectors around a point of the lattice which are inside the polygon
+        :param point: the exact point
+        :param float_point: the point in floating point coordinates
+        :return: the indexes of the sectors
+        """
+        min_x, min_y, max_x, max_y = self.bounding_box
+        if not (min_x - FLOAT_TOLERANCE <= float_point[0] <= max_x + FLOAT_TOLERANCE and min_y - FLOAT_TOLERANCE <= float_point[1] <= max_y + FLOAT_TOLERANCE):
+            return frozenset()
+        vertex_index = self.vertexes_indexes.get(point)
+        if vertex_index is not None:
+            return self.vertexes_sectors[vertex_index]
+        points_number = len(self.points)
+        crossings = 0
+        for i in range(points_number):
+            a, b = self.points[i], self.points[(i + 1) % points_number]
+            side = cross(a, b, point).sign()
+            if side == 0 and min(a[0], b[0]) <= point[0] <= max(a[0], b[0]) and min(a[1], b[1]) <= point[1] <= max(a[1], b[1]):
+                return get_half_plane_sectors(self.directions[i])  # point inside an edge
+            if (a[1] > point[1]) != (b[1] > point[1]) and (side > 0) == (b[1] > a[1]):  # edge crossing the ray to +x
+                crossings += 1
+        return frozenset(range(8)) if crossings % 2 == 1 else frozenset()
+
+    def get_intersection_area(self, convex_polygon: ExactPolygon) -> ExactNumber:
+        """
+        Gives the exact area of the intersection with a convex polygon, the floating point area being checked first
+        :param convex_polygon: the convex polygon
+        :return: the area of the intersection, exact when it is close to the area of the convex polygon, else approximate
+        """
+        float_area = get_polygon_area(clip_polygon(self.float_points, convex_polygon.float_points))
+        if abs(float_area - float(convex_polygon.area)) > FLOAT_TOLERANCE:
+            return float_area
+        return get_polygon_area(clip_polygon(self.points, convex_polygon.points))
+
+    def overlaps(self, convex_polygon: ExactPolygon) -> bool:
+        """
+        Tells if the interiors of two convex polygons intersect, looking for a separating edge
+        :param convex_polygon: the other convex polygon
+        :return: True if the polygons overlap, False if they only touch or are apart
+        """
+        a_min_x, a_min_y, a_max_x, a_max_y = self.bounding_box
+        b_min_x, b_min_y, b_max_x, b_max_y = convex_polygon.bounding_box
+        if a_max_x <= b_min_x + FLOAT_TOLERANCE or b_max_x <= a_min_x + FLOAT_TOLERANCE or a_max_y <= b_min_y + FLOAT_TOLERANCE or b_max_y <= a_min_y + FLOAT_TOLERANCE:
+            return False
+        for polygon, other in ((self, convex_polygon), (convex_polygon, self)):
+            for i in range(len(polygon.points)):
+                float_a, float_b = polygon.float_points[i - 1], polygon.float_points[i]
+                if max(cross(float_a, float_b, point) for point in other.float_points) > FLOAT_TOLERANCE:
+                    continue
+                a, b = polygon.points[i - 1], polygon.points[i]
+                if all(cross(a, b, point).sign() <= 0 for point in other.points):
+                    return False
+        return True
+
+
+class ExactPiece:
+    """
+    One orientation of a tangram piece on the lattice, placed with its top left vertex on the origin
+
+    Attributes:
+        name:           name of the piece
+        rotation:       rotation of the piece in degrees, a multiple of 45°
+        is_flipped:     True if the piece is mirrored
+        polygon:        polygon of the piece, with its top left vertex on the origin
+        points:         vertexes of the piece in the order of the corresponding Piece
+        sectors:        sectors covered by the piece around its top left vertex
+    """
+    def __init__(self, name: str, rotation: int, is_flipped: bool, points: list[tuple[ExactNumber, ExactNumber]]):
+        top_left_x, top_left_y = min(points, key=get_lexicographic_key)
+        self.name: str = name
+        self.rotation: int = rotation
+        self.is_flipped: bool = is_flipped
+        self.points: list[tuple[ExactNumber, ExactNumber]] = [(x - top_left_x, y - top_left_y) for x, y in points]
+        self.polygon: ExactPolygon = ExactPolygon(self.points)
+        self.sectors: frozenset[int] = self.polygon.vertexes_sectors[self.polygon.vertexes_indexes[(ExactNumber(), ExactNumber())]]
+
+    @staticmethod
+    def get_orientations() -> dict[str, list[ExactPiece]]:
+        """
+        Gives the distinct orientations of the pieces, rotated by multiples of 45° and flipped for the parallelogram.
+        The lengths are in eighths of the side of the tangram, so the coordinates only have integer coefficients.
+        :return: the orientations of each piece, by name
+        """
+        def points(*coordinates):
+            return [(ExactNumber(*x), ExactNumber(*y)) for x, y in coordinates]
+        pieces_points = {
+            "Large Triangle": points(((0, 0), (0, 0)), ((0, 4), (0, 0)), ((0, 4), (0, 4))),
+            "Square": points(((0, 0), (0, 0)), ((0, 2), (0, 0)), ((0, 2), (0, 2)), ((0, 0), (0, 2))),
+            "Medium Triangle": points(((0, 0), (0, 0)), ((4, 0), (0, 0)), ((4, 0), (4, 0))),
+            "Parallelogram": points(((0, 0), (0, 0)), ((4, 0), (0, 0)), ((6, 0), (2, 0)), ((2, 0), (2, 0))),
+            "Small Triangle": points(((0, 0), (0, 0)), ((0, 2), (0, 0)), ((0, 2), (0, 2))),
+        }
+        orientations = {}
+        for name, piece_points in pieces_points.items():
+            orientations[name] = []
+            footprints = set()
+            for is_flipped in ((False, True) if name == "Parallelogram" else (False,)):
+                rotated_points = [(-x, y) for x, y in piece_points] if is_flipped else piece_points
+                for rotation in range(0, 360, 45):
+                    piece = ExactPiece(name, rotation, is_flipped, rotated_points)
+                    footprint = frozenset(piece.points)
+                    if footprint not in footprints:  # symmetric pieces have fewer distinct orientations
+                        footprints.add(footprint)
+                        orientations[name].append(piece)
+                    rotated_points = [rotate_point_45(point) for point in rotated_points]
+        return orientations
+
+
+class ExactSolver:
+    """
+    Solves the puzzle on the lattice of the tangram, with the shadow turned into exact polygons. Each step fills the
+    top left uncovered point of the shape with a piece having this point as its own top left vertex, the placements
+    being checked with exact polygon operations instead of pixels.
+    Only the shapes whose vertexes are all on one lattice can be solved, i.e. built with the pieces stuck edge to edge,
+    vertex on vertex. A piece slid along the edge of another one by any length is off the lattice, which is usual for the
+    shapes drawn by hand, and the solver then raises a ValueError or finds no solution, TangramSolver falling back to the
+    raster search.
+
+    Attributes:
+        puzzle_shadow:      black and white image of the shape to solve
+        unit:               length in pixels of an eighth of the side of the tangram
+        origins:            position in the image of the first vertex of each polygon
+        polygons:           exact polygons of the connected parts of the shape
+        orientations:       distinct orientations of each piece
+        nodes_number:       number of placements tried during the search
+        stop_event:         event set to cancel the search from another thread, None if it cannot be cancelled
+        deadline:           time at which the search stops, None for no limit
+        is_incomplete:      True if the search stopped on a cancellation or on the deadline before exploring the whole tree
+    """
+    def __init__(self, puzzle_shadow: np.ndarray, stop_event=None, deadline: float = None):
+        self.puzzle_shadow: np.ndarray = puzzle_shadow
+        self.stop_event = stop_event
+        self.deadline: float | None = deadline
+        self.is_incomplete: bool = False
+        self.unit: float = sqrt(np.count_nonzero(puzzle_shadow == 0) / 64)  # the tangram is 8 by 8 units
+        self.origins: list[tuple[float, float]] = []
+        self.polygons: list[ExactPolygon] = []
+        self.orientations: dict[str, list[ExactPiece]] = ExactPiece.get_orientations()
+        self.nodes_number: int = 0
+        self.extract_polygons()
+
+    def extract_polygons(self) -> None:
+        """
+        Turns the contours of the shadow into polygons of the lattice, snapping the edges to multiples of 45° and their
+        lengths to numbers a + b√2
+        :raise ValueError: if the shape has holes, or if its contours do not close on the lattice with the area of the tangram
+        """
+        shape = cv.morphologyEx(255 - self.puzzle_shadow, cv.MORPH_CLOSE, np.ones((5, 5), np.uint8))  # fills the cracks between the pieces
+        contours, hierarchy = cv.findContours(shape, cv.RETR_CCOMP, cv.CHAIN_APPROX_NONE)
+        total_area = ExactNumber()
+        for contour, (_, _, _, parent) in zip(contours, hierarchy[0]):
+            if cv.contourArea(contour) < settings.MIN_SUB_PUZZLE_AREA:
+                continue
+            if parent != -1:
+                raise ValueError("The exact engine does not handle shapes with holes")
+            vertexes = self.get_contour_vertexes(contour)
+            polygon = ExactPolygon(self.snap_vertexes(vertexes))
+            self.origins.append((float(vertexes[0][0]), float(vertexes[0][1])))
+            self.polygons.append(polygon)
+            total_area = total_area + polygon.area
+        if total_area != 64:
+            raise ValueError(f"The shape snapped on the lattice has an area of {float(total_area):.2f} units instead of 64")
+
+    def get_contour_vertexes(self, contour: np.ndarray) -> np.ndarray:
+        """
+        Rebuilds the vertexes of a contour as the intersections of its edges. Each edge is a line with a direction
+        multiple of 45° fitted on the middle of its pixels, since the pixels round off the sharp corners, and moved by
+        half a pixel as the contour goes through the centers of the border pixels. The short edges are dropped.
+        :param contour: contour of the shape, with all its points
+        :return: the vertexes in pixels, with a positive area
+        :raise ValueError: if two consecutive edges are parallel
+        """
+        points = contour[:, 0].astype(float)
+        if cv.contourArea(contour.astype(np.float32), oriented=True) < 0:  # same orientation as the exact polygons
+            points = points[::-1]
+        indexes = {tuple(point): i for i, point in enumerate(points)}
+        vertexes_indexes = sorted(indexes[tuple(vertex)] for vertex in cv.approxPolyDP(points.astype(np.float32), settings.EXACT_POLYGON_EPSILON, True)[:, 0].astype(float))
+        lines = []  # (direction, offset along the inward normal, weight) of each edge
+        for start_index, end_index in zip(vertexes_indexes, vertexes_indexes[1:] + [vertexes_indexes[0] + len(points)]):
+            start, end = points[start_index], points[end_index % len(points)]
+            length = float(np.linalg.norm(end - start))
+            if length < settings.EXACT_MIN_EDGE_LENGTH * self.unit:
+                continue
+            direction = round(atan2(end[1] - start[1], end[0] - start[0]) / (pi / 4)) % 8
+            normal = np.array((-DIRECTION_VECTORS[direction][1], DIRECTION_VECTORS[direction][0])) / hypot(*DIRECTION_VECTORS[direction])
+            margin = (end_index - start_index) // 5  # the ends of the edge are rounded off by the corners
+            edge_points = points[np.arange(start_index + margin, end_index - margin + 1) % len(points)]
+            offset = float((edge_points @ normal).mean()) - .5
+            if len(lines) > 0 and lines[-1][0] == direction:  # collinear edges make a single line
+                _, previous_offset, previous_length = lines.pop()
+                offset = (previous_offset * previous_length + offset * length) / (previous_length + length)
+                length += previous_length
+            lines.append((direction, offset, length))
+        if len(lines) > 1 and lines[0][0] == lines[-1][0]:
+            direction, offset, length = lines.pop()
+            lines[0] = (direction, (lines[0][1] * lines[0][2] + offset * length) / (lines[0][2] + length), lines[0][2] + length)
+        vertexes = []
+        for (first_direction, first_offset, _), (second_direction, second_offset, _) in zip(lines[-1:] + lines[:-1], lines):
+            if (first_direction - second_direction) % 4 == 0:
+                raise ValueError("Two consecutive edges of the shape are parallel")
+            normals = np.array([(-DIRECTION_VECTORS[direction][1], DIRECTION_VECTORS[direction][0]) for direction in (first_direction, second_direction)], dtype=float)
+            normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+            vertexes.append(np.linalg.solve(normals, (first_offset, second_offset)))
+        return np.array(vertexes)
+
+    def snap_vertexes(self, vertexes: np.ndarray) -> list[tuple[ExactNumber, ExactNumber]]:
+        """
+        Snaps the vertexes of one contour on the lattice, the first one being the origin
+        :param vertexes: vertexes of the contour in pixels, two consecutive edges never having the same direction
+        :return: the exact vertexes
+        :raise ValueError: if an edge is too far from the lattice, or if the snapped contour does not close
+        """
+        points = [(ExactNumber(), ExactNumber())]
+        for start, end in zip(vertexes, np.roll(vertexes, -1, axis=0)):
+            dx, dy = (end - start) / self.unit
+            direction_x, direction_y = DIRECTION_VECTORS[round(atan2(dy, dx) / (pi / 4)) % 8]
+            length = (dx * direction_x + dy * direction_y) / (direction_x ** 2 + direction_y ** 2)  # projected on an axis
+            component = self.snap_length(length)
+            if abs(float(component) - length) > settings.EXACT_SNAP_TOLERANCE:
+                raise ValueError(f"An edge of {length:.2f} units is not on the lattice")
+            points.append((points[-1][0] + component * direction_x, points[-1][1] + component * direction_y))
+        if points.pop() != points[0]:
+            raise ValueError("The contour of the shape does not close on the lattice")
+        return points
+
+    @staticmethod
+    def snap_length(length: float) -> ExactNumber:
+        """
+        Gives the simplest length a + b√2 of the lattice close enough to a measured length. The edges of the pieces,
+        projected on an axis for the diagonal ones, only have even coefficients in eighths of the side of the tangram,
+        and the edges of the shape are sums and differences of them.
+        :param length: length in units, projected on an axis for the diagonals
+        :return: the exact length, or the closest one if none is within settings.EXACT_SNAP_TOLERANCE
+        """
+        candidates = []
+        max_b = 2 * int(length / SQRT_2 / 2) + 8
+        for b in range(-max_b, max_b + 1, 2):
+            a = 2 * round((length - b * SQRT_2) / 2)
+            candidates.append((abs(a + b * SQRT_2 - length), ExactNumber(a, b)))
+        close_candidates = [candidate for candidate in candidates if candidate[0] <= settings.EXACT_SNAP_TOLERANCE]
+        if len(close_candidates) > 0:
+            return min(close_candidates, key=lambda candidate: (abs(candidate[1].a) + abs(candidate[1].b), candidate[0]))[1]
+        return min(candidates, key=lambda candidate: candidate[0])[1]
+
+    def is_budget_exhausted(self) -> bool:
+        """
+        Tells if the search must stop, because it has been cancelled or because its deadline has passed
+        :return: True if the search must stop, False otherwise
+        """
+        return (self.stop_event is not None and self.stop_event.is_set()) or (self.deadline is not None and time.time() >= self.deadline)
+
+    def solve(self) -> Node | None:
+        """
+        Searches a solution with a depth first search on the exact placements
+        :return: the solution node, if a solution exists, else None, is_incomplete telling if the search was stopped
+        """
+        available_names = [piece.name for piece in self.get_raster_pieces()]
+        placed = self.search([[] for _ in self.polygons], available_names)
+        if placed is None:
+            return None
+        return self.build_solution_node(placed)
+
+    def search(self, placed: list[list[tuple]], available_names: list[str]) -> list | None:
+        """
+        Fills recursively the top left uncovered point of the first polygon which is not full
+        :param placed: pieces placed in each polygon, as (piece, position, translated polygon)
+        :param available_names: names of the pieces still to place
+        :return: the pieces placed in each polygon if the shape is filled, None otherwise
+        """
+        if len(available_names) == 0:
+            return placed
+        polygon_index = next((i for i, polygon in enumerate(self.polygons) if polygon.area != sum((p.area for _, _, p in placed[i]), ExactNumber())), None)
+        if polygon_index is None:
+            return None
+        polygon, polygon_pieces = self.polygons[polygon_index], placed[polygon_index]
+        point, sector = self.get_top_left_uncovered_point(polygon, polygon_pieces)
+        for name in dict.fromkeys(available_names):  # identical pieces give the same subtrees
+            for piece in self.orientations[name]:
+                if sector not in piece.sectors:
+                    continue
+                if self.is_budget_exhausted():
+                    self.is_incomplete = True
+                    return None
+                self.nodes_number += 1
+                piece_polygon = piece.polygon.translate(*point)
+                if polygon.get_intersection_area(piece_polygon) != piece_polygon.area:
+                    continue
+                if any(piece_polygon.overlaps(other) for _, _, other in polygon_pieces):
+                    continue
+                remaining_names = available_names.copy()
+                remaining_names.remove(name)
+                next_placed = placed.copy()
+                next_placed[polygon_index] = polygon_pieces + [(piece, point, piece_polygon)]
+                solution = self.search(next_placed, remaining_names)
+                if solution is not None:
+                    return solution
+        return None
+
+    @staticmethod
+    def get_top_left_uncovered_point(polygon: ExactPolygon, polygon_pieces: list) -> tuple[tuple[ExactNumber, ExactNumber], int]:
+        """
+        Gives the top left point of the uncovered part of a polygon, which is a vertex of the polygon or of a piece
+        :param polygon: the polygon, not entirely covered
+        :param polygon_pieces: pieces placed in the polygon, as (piece, position, translated polygon)
+        :return: the point, with the first of its uncovered sectors
+        """
+        candidates = {point: float_point for piece_polygon in [polygon] + [p for _, _, p in polygon_pieces] for point, float_point in zip(piece_polygon.points, piece_polygon.float_points)}
+        for point in sorted(candidates, key=lambda p: (candidates[p][1], candidates[p][0])):
+            sectors = set(polygon.get_sectors_at(point, candidates[point]))
+            for _, _, piece_polygon in polygon_pieces:
+                sectors -= piece_polygon.get_sectors_at(point, candidates[point])
+            if len(sectors) > 0:
+                return point, min(sectors)
+        raise ValueError("A polygon which is not full has no uncovered vertex")
+
+    def build_solution_node(self, placed: list[list]) -> Node:
+        """
+        Converts the exact pieces to the pieces of the raster solver, in the image coordinates
+        :param placed: pieces placed in each polygon, as (piece, position, translated polygon)
+        :return: the solution node
+        """
+        pieces_by_name = {}
+        for piece in self.get_raster_pieces():
+            pieces_by_name.setdefault(piece.name, []).append(piece)
+        used_pieces = []
+        image = self.puzzle_shadow.copy()
+        for (origin_x, origin_y), polygon_pieces in zip(self.origins, placed):
+            for exact_piece, (x, y), _ in polygon_pieces:
+                piece = pieces_by_name[exact_piece.name].pop(0)
+                points = np.array([[float(x + dx), float(y + dy)] for dx, dy in exact_piece.points]) * self.unit + (origin_x, origin_y)
+                piece.position_in_image = Point(*points[0].tolist())
+                piece.coordinates = points - points[0]
+                piece.compute_edges()
+                piece.rotation = exact_piece.rotation
+                if exact_piece.is_flipped:
+                    piece.is_flipped = True
+                draw_piece_in_image(image, piece)
+                used_pieces.append(piece)
+        return Node(State([], image, used_pieces))
+
+    @staticmethod
+    def get_raster_pieces() -> list[Piece]:
+        """
+        Gives the pieces of the raster solver, used to report the solution
+        :return: the seven pieces with their colors
+        """
+        from TangramSolver import TangramSolver
+        return TangramSolver.get_available_pieces()
+
+
+if __name__ == "__main__":
+    pass
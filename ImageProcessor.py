@@ -6,17 +6,27 @@ import cv2 as cv
 
 class ImageProcessor:
     """
-    Used to process the input image, turns it black and white and makes it the good size
+    Used to process the input image, turns it black and white, crops it around the shape and makes it the good size.
+    The solver works on the cropped image, the whole image being the input image resized the same way: the pieces
+    placed in the cropped image are moved by the crop offset to be given in the whole image, as saved in the stats.
 
     Attributes:
-        corners:    corners of the shape on the image
-        image:      image of the puzzle shadow
+        corners:        corners of the shape on the image
+        image:          image of the puzzle shadow, cropped around the shape
+        resize_ratio:   ratio of the resizing of the input image
+        crop_offset:    position of the top left pixel of the cropped image in the whole resized image
+        whole_shape:    shape (height, width) of the whole resized image
     """
-    def __init__(self, path_to_image: str = None) -> None:
+    def __init__(self, path_to_image: str = None, image: np.ndarray = None) -> None:
         self.corners = []
         self.image = None
+        self.resize_ratio: float = 1
+        self.crop_offset: Point = Point(0, 0)
+        self.whole_shape: tuple[int, int] = (0, 0)
         if path_to_image is not None:
             self.image = self.load_image(path_to_image)
+        elif image is not None:
+            self.image = self.process_image(image)
 
     def load_image(self, path_to_image: str) -> np.ndarray:
         """
@@ -24,28 +34,69 @@ class ImageProcessor:
         into black and white again
         :param path_to_image: path of the image_processor
         :return: a 2d numpy array of the resized b&w image_processor
+        :raise ValueError: if the file cannot be read as an image
         """
         image = cv.imread(path_to_image, cv.IMREAD_GRAYSCALE)
+        if image is None:
+            raise ValueError(f"the image {path_to_image} cannot be read")
+        return self.process_image(image)
 
+    def process_image(self, image: np.ndarray) -> np.ndarray:
+        """
+        turns an image already loaded into the 2d np array of the puzzle, the same way as load_image, used when the image
+        does not come from a file
+        :param image: grayscale image, or BGR image which is turned to grayscale first
+        :return: a 2d numpy array of the resized b&w image_processor
+        :raise ValueError: if the image has no black pixel, i.e. no shape to solve
+        """
+        if image.ndim == 3:
+            image = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
         black_and_white_image = self.image_to_black_and_white(image)
-        resized_image = self.resize_image(black_and_white_image)  # resizes the image_processor for the tangram pieces to be the good size
+        if not (black_and_white_image == 0).any():
+            raise ValueError("the image has no black pixel, there is no shape to solve")
+        self.resize_ratio = self.get_resize_ratio(black_and_white_image)
+        self.whole_shape = (int(self.resize_ratio * image.shape[0]), int(self.resize_ratio * image.shape[1]))
+        cropped_image = self.crop_image(black_and_white_image)  # the white area around the shape is not carried through the search
+        resized_image = self.resize_image(cropped_image)  # resizes the image_processor for the tangram pieces to be the good size
         resized_black_and_white_image = self.image_to_black_and_white(resized_image)  # to b&w to eliminate gray pixels
         self.corners = get_corners(resized_black_and_white_image)
         return resized_black_and_white_image
 
+    @staticmethod
+    def get_resize_ratio(image: np.ndarray) -> float:
+        """
+        Gives the ratio of resizing for the area of the drawing to match the area of all the tangram pieces, which is 280*280
+        :param image: black and white image of the drawing
+        :return: the ratio, rounded up to one decimal
+        """
+        black_pixels = (image == 0).sum()
+        return ceil(sqrt(pow(settings.TANGRAM_SIDE_LENGTH, 2) / black_pixels) * 10) / 10
+
+    def crop_image(self, image: np.ndarray) -> np.ndarray:
+        """
+        Crops the black and white image around the shape, with a margin, and records the offset of the crop in the whole
+        resized image. The crop starts on multiples of 10 pixels: the resize ratio having one decimal, the crop then
+        starts on a whole pixel of the resized image, whose pixels are the same as in the whole resized image
+        :param image: black and white image to crop, before it is resized
+        :return: the cropped image
+        """
+        ys, xs = np.nonzero(image == 0)
+        if len(xs) == 0:
+            return image
+        margin = ceil(settings.CROP_MARGIN / self.resize_ratio)
+        x, y = max(xs.min() - margin, 0) // 10 * 10, max(ys.min() - margin, 0) // 10 * 10
+        self.crop_offset = Point(round(x * self.resize_ratio), round(y * self.resize_ratio))
+        return image[y:ys.max() + 1 + margin, x:xs.max() + 1 + margin]
+
     def resize_image(self, image: np.ndarray) -> np.ndarray:
         """
-        resizes the image_processor for the area of the drawing to match the area of all the tangram pieces, which is 280*280
+        resizes the image_processor by the resize ratio, see get_resize_ratio
         :param image: image_processor we want to resize
         :return: the np array of the black and white resized image_processor
         """
-        resized_image = image.copy()
-        (h, w) = image.shape[:2]
-        black_pixels = (image == 0).sum()
-        resize_ratio = ceil(sqrt(pow(settings.TANGRAM_SIDE_LENGTH, 2) / black_pixels) * 10) / 10
-        (new_h, new_w) = (int(resize_ratio * h), int(resize_ratio * w))
-        resized_image = cv.resize(resized_image, (new_w, new_h), interpolation=cv.INTER_CUBIC)
-        self.resize_corners(resize_ratio)
+        # the ratio is given rather than the new size, for the pixels of a crop to be mapped as in the whole image
+        resized_image = cv.resize(image, None, fx=self.resize_ratio, fy=self.resize_ratio, interpolation=cv.INTER_CUBIC)
+        self.resize_corners(self.resize_ratio)
         return resized_image
 
     def resize_corners(self, resize_ratio: float) -> None:
@@ -58,6 +109,48 @@ class ImageProcessor:
             resized_corners.append(Point(floor(self.corners[i][0] * resize_ratio), floor(self.corners[i][1] * resize_ratio)))
         self.corners = resized_corners
 
+    def get_whole_image(self) -> np.ndarray:
+        """
+        Gives the whole resized image, the cropped image being put back in a white image of the whole size
+        :return: the black and white image, in which the pieces given by get_pieces_in_whole_image are placed
+        """
+        whole_image = np.full(self.whole_shape, 255, dtype=np.uint8)
+        x, y = self.crop_offset.x, self.crop_offset.y
+        height, width = whole_image[y:y + self.image.shape[0], x:x + self.image.shape[1]].shape
+        whole_image[y:y + height, x:x + width] = self.image[:height, :width]
+        return whole_image
+
+    def get_pieces_in_whole_image(self, pieces: list[Piece]) -> list[Piece]:
+        """
+        Moves the pieces placed by the solver in the cropped image to the whole resized image
+        :param pieces: pieces placed in the cropped image
+        :return: copies of the pieces placed in the whole image
+        """
+        return self.move_pieces(pieces, self.crop_offset)
+
+    def get_pieces_in_cropped_image(self, pieces: list[Piece]) -> list[Piece]:
+        """
+        Moves pieces placed in the whole resized image, like the ones of a saved solution, to the cropped image
+        :param pieces: pieces placed in the whole image
+        :return: copies of the pieces placed in the cropped image
+        """
+        return self.move_pieces(pieces, Point(-self.crop_offset.x, -self.crop_offset.y))
+
+    @staticmethod
+    def move_pieces(pieces: list[Piece], offset: Point) -> list[Piece]:
+        """
+        Moves pieces by an offset
+        :param pieces: pieces to move
+        :param offset: offset added to the position of the pieces
+        :return: the moved copies of the pieces
+        """
+        moved_pieces = []
+        for piece in pieces:
+            moved_piece = piece.copy()
+            moved_piece.position_in_image = piece.position_in_image + offset
+            moved_pieces.append(moved_piece)
+        return moved_pieces
+
     @staticmethod
     def image_to_black_and_white(image: np.ndarray) -> np.ndarray:
         """
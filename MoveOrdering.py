@@ -0,0 +1,102 @@
+from __future__ import annotations
+from utils import approx_eq
+from elements import *
+
+
+class MoveOrdering:
+    """
+    Decides in which order the search tries the pieces and the corners of the shape from a state. This base ordering
+    keeps the pieces in the order of the available pieces and the corners in the order of the contours.
+
+    Attributes:
+        name:   name of the ordering, used to choose it from the command line
+    """
+    name: str = "contour"
+
+    def order_pieces(self, state) -> list[int]:
+        """
+        Gives the order in which the available pieces are tried
+        :param state: state from which the pieces are placed
+        :return: the indexes of the available pieces, in the order in which they are tried
+        """
+        return list(range(len(state.available_pieces)))
+
+    def order_corners(self, state) -> list[int]:
+        """
+        Gives the order in which the corners of the shape are tried
+        :param state: state from which the pieces are placed
+        :return: the indexes of the corners of the state, in the order in which they are tried
+        """
+        return list(range(len(state.corners)))
+
+    @staticmethod
+    def count_matching_corners(piece: Piece, shape_corner: Corner) -> int:
+        """
+        Counts the distinct corners of a piece having the angle of a corner of the shape, i.e. the number of ways
+        the piece may be put on this corner before checking its coverage
+        :param piece: the piece
+        :param shape_corner: the corner of the shape
+        :return: the number of matching corners, the flipped ones included
+        """
+        flips_number = 2 if piece.name == "Parallelogram" else 1
+        return flips_number * sum(
+            approx_eq(abs(shape_corner.angle_between_edges), abs(piece.corners_angles[corner_shift]))
+            for corner_shift in range(piece.distinct_corners_shifts)
+        )
+
+
+class SharpestCornerOrdering(MoveOrdering):
+    """
+    Tries the sharpest corners of the shape first, which only few pieces can fill
+    """
+    name: str = "sharpest"
+
+    def order_corners(self, state) -> list[int]:
+        return sorted(range(len(state.corners)), key=lambda i: abs(state.corners[i].angle_between_edges))
+
+
+class MostConstrainedCornerOrdering(MoveOrdering):
+    """
+    Tries first the corners of the shape which can be filled by the fewest corners of the remaining pieces, so the
+    dead ends are found as early as possible. The ties keep the order of the contours, so the pieces are still placed
+    next to each other.
+    """
+    name: str = "constrained"
+
+    def order_corners(self, state) -> list[int]:
+        distinct_pieces = list({piece.name: piece for piece in state.available_pieces}.values())
+        matching_corners_numbers = [
+            sum(self.count_matching_corners(piece, shape_corner) for piece in distinct_pieces)
+            for shape_corner in state.corners
+        ]
+        return sorted(range(len(state.corners)), key=lambda i: matching_corners_numbers[i])
+
+
+class LargestPieceOrdering(MoveOrdering):
+    """
+    Tries the largest remaining pieces first, the small ones being easier to fit in the remaining space
+    """
+    name: str = "largest"
+
+    def order_pieces(self, state) -> list[int]:
+        return sorted(range(len(state.available_pieces)), key=lambda i: -state.available_pieces[i].area)
+
+
+MOVE_ORDERINGS: dict[str, type[MoveOrdering]] = {
+    ordering.name: ordering
+    for ordering in (MostConstrainedCornerOrdering, SharpestCornerOrdering, LargestPieceOrdering, MoveOrdering)
+}
+
+def get_move_ordering(name: str) -> MoveOrdering:
+    """
+    Gives a move ordering from its name
+    :param name: name of the ordering, one of the keys of MOVE_ORDERINGS
+    :return: the move ordering
+    """
+    if name not in MOVE_ORDERINGS:
+        raise ValueError(f"Unknown move ordering {name}, expected one of {', '.join(MOVE_ORDERINGS)}")
+    return MOVE_ORDERINGS[name]()
+
+
+if __name__ == "__main__":
+    pass
@@ -8,7 +8,18 @@ class Node:
     Attributes:
         current_state:  current state of the puzzle
         previous_node:  node containing the previous state of the puzzle
+        has_solution:   True if a solution was found below this node, when all the solutions are enumerated
     """
     def __init__(self, current_state, previous_node: Node = None):
         self.current_state = current_state
         self.previous_node = previous_node
+        self.has_solution = False
+
+    def mark_solution(self) -> None:
+        """
+        Marks this node and its ancestors as having a solution below them, so that they are not recorded as dead
+        """
+        ancestor = self
+        while ancestor is not None and not ancestor.has_solution:
+            ancestor.has_solution = True
+            ancestor = ancestor.previous_node
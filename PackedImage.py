@@ -0,0 +1,84 @@
+from __future__ import annotations
+import numpy as np
+
+# number of bits set in each possible byte, used to count the pixels of packed images
+POPCOUNT_TABLE = np.array([bin(byte).count("1") for byte in range(256)], np.uint8)
+
+
+class PackedImage:
+    """
+    Black and white image storing 8 pixels per byte, a set bit being a white pixel. Used for the images of the search
+    states, which are 8 times smaller and faster to copy. Pieces are counted and drawn directly on the packed bytes, the
+    image is only unpacked to extract contours or to output it.
+
+    Attributes:
+        bits:   packed rows of the image, as given by np.packbits
+        shape:  shape (height, width) of the unpacked image
+    """
+    def __init__(self, bits: np.ndarray, shape: tuple[int, int]):
+        self.bits: np.ndarray = bits
+        self.shape: tuple[int, int] = shape
+
+    @staticmethod
+    def from_image(image: np.ndarray) -> PackedImage:
+        """
+        Packs a black (0) and white (255) image
+        :param image: image to pack
+        :return: the packed image
+        """
+        return PackedImage(np.packbits(image == 255, axis=1), image.shape)
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def tobytes(self) -> bytes:
+        return self.bits.tobytes()
+
+    def copy(self) -> PackedImage:
+        return PackedImage(self.bits.copy(), self.shape)
+
+    def unpack(self, box: tuple[int, int, int, int] = None) -> np.ndarray:
+        """
+        Unpacks the image, or only a part of it
+        :param box: part of the image to unpack (x, y, width, height), the whole image by default
+        :return: the black (0) and white (255) image
+        """
+        x, y, w, h = box if box is not None else (0, 0, self.shape[1], self.shape[0])
+        first_byte, last_byte = x // 8, (x + w + 7) // 8
+        pixels = np.unpackbits(self.bits[y:y + h, first_byte:last_byte], axis=1)
+        return pixels[:, x - 8 * first_byte:x - 8 * first_byte + w] * np.uint8(255)
+
+    @staticmethod
+    def pack_mask(piece_mask: np.ndarray, x: int) -> np.ndarray:
+        """
+        Packs a mask so that its bits are aligned with the bytes of the image
+        :param piece_mask: boolean mask of the piece
+        :param x: horizontal position of the mask in the image
+        :return: the packed mask, starting at the byte containing the column x
+        """
+        return np.packbits(np.pad(piece_mask, ((0, 0), (x % 8, 0))), axis=1)
+
+    def count_covered_black_pixels(self, piece_mask: np.ndarray, piece_box: tuple[int, int, int, int]) -> int:
+        """
+        Counts the black pixels of the image under a mask
+        :param piece_mask: boolean mask of the piece
+        :param piece_box: bounding box of the mask in the image (x, y, width, height)
+        :return: the number of black pixels covered by the mask
+        """
+        x, y, w, h = piece_box
+        packed_mask = self.pack_mask(piece_mask, x)
+        region = self.bits[y:y + h, x // 8:x // 8 + packed_mask.shape[1]]
+        return int(POPCOUNT_TABLE[packed_mask & ~region].sum())
+
+    def draw_mask(self, piece_mask: np.ndarray, piece_box: tuple[int, int, int, int]) -> PackedImage:
+        """
+        Draws a mask in white on the image
+        :param piece_mask: boolean mask of the piece
+        :param piece_box: bounding box of the mask in the image (x, y, width, height)
+        :return: the image with the mask drawn in it
+        """
+        x, y, w, h = piece_box
+        packed_mask = self.pack_mask(piece_mask, x)
+        self.bits[y:y + h, x // 8:x // 8 + packed_mask.shape[1]] |= packed_mask
+        return self
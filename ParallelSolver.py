@@ -0,0 +1,267 @@
+from __future__ import annotations
+import time
+import queue
+from multiprocessing import Pool, Event, Queue, TimeoutError
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from State import State
+from MoveOrdering import MoveOrdering
+from Node import Node
+from SearchEvent import SearchEvent
+from utils import draw_pieces_masks_in_image, get_image_region
+from elements import *
+import settings
+
+_worker_root_image: np.ndarray = None
+_worker_shared_memory: SharedMemory = None
+_worker_stop_event = None
+_worker_deadline: float | None = None
+_worker_node_budget: int | None = None
+_worker_events_queue = None
+_worker_max_solutions_number: int | None = None
+_worker_collect_stats: bool = False
+
+
+def init_worker(shared_memory_name: str, image_shape: tuple[int, int], stop_event, deadline: float | None, node_budget: int | None,
+                events_queue=None, max_solutions_number: int = None, collect_stats: bool = False) -> None:
+    """
+    Attaches a worker process to the root image stored in shared memory
+    :param shared_memory_name: name of the shared memory block holding the root image
+    :param image_shape: shape of the root image
+    :param stop_event: event set as soon as a solution has been found, or once enough solutions have been enumerated
+    :param deadline: time at which the workers stop searching, None for no limit
+    :param node_budget: maximum number of nodes expanded in each subtree, None for no limit
+    :param events_queue: queue in which the solutions are sent as soon as they are found when enumerating them, None
+                         otherwise
+    :param max_solutions_number: number of solutions after which the enumeration of a subtree stops, None for no limit
+    :param collect_stats: True to measure the searches of the subtrees with their search_measures, see TangramSolver
+    """
+    global _worker_root_image, _worker_shared_memory, _worker_stop_event, _worker_deadline, _worker_node_budget, _worker_events_queue, \
+        _worker_max_solutions_number, _worker_collect_stats
+    _worker_shared_memory = SharedMemory(name=shared_memory_name)
+    _worker_root_image = np.ndarray(image_shape, dtype=np.uint8, buffer=_worker_shared_memory.buf)
+    _worker_stop_event = stop_event
+    _worker_deadline = deadline
+    _worker_node_budget = node_budget
+    _worker_events_queue = events_queue
+    _worker_max_solutions_number = max_solutions_number
+    _worker_collect_stats = collect_stats
+
+
+def explore_subtree(subtree: tuple[list[Piece], list[Piece], MoveOrdering]) -> tuple[str, list[Piece], dict | None]:
+    """
+    Explores one subtree of the search in a worker process
+    :param subtree: pieces still available and pieces already placed at the root of the subtree, and move ordering
+    :return: the status of the search of the subtree (see TangramSolver.status), the pieces of the solution if one
+             has been found, of the best partial placement otherwise, and the counters of the search of the subtree,
+             None if it was not searched
+    """
+    from TangramSolver import TangramSolver
+    available_pieces, used_pieces, move_ordering = subtree
+    if _worker_stop_event.is_set() or (_worker_deadline is not None and time.time() >= _worker_deadline):
+        return "incomplete", used_pieces, None
+    image = draw_pieces_masks_in_image(_worker_root_image.copy(), used_pieces)
+    solver = TangramSolver(image, root_state=State(available_pieces, image, used_pieces, move_ordering=move_ordering), stop_event=_worker_stop_event,
+                           time_budget=_worker_deadline - time.time() if _worker_deadline is not None else None, node_budget=_worker_node_budget,
+                           collect_stats=_worker_collect_stats)
+    return solver.status, solver.partial_node.current_state.used_pieces, solver.search_stats
+
+
+def enumerate_subtree(subtree: tuple[list[Piece], list[Piece], MoveOrdering]) -> None:
+    """
+    Enumerates the solutions of one subtree in a worker process, sending to the events queue a "solutionFound" event as
+    soon as a distinct solution is found, then a "searchEnded" event with the best partial placement and the counters of
+    the search once the subtree has been explored, its status being "incomplete" if it was not fully explored
+    :param subtree: pieces still available and pieces already placed at the root of the subtree, and move ordering
+    """
+    from TangramSolver import TangramSolver
+    available_pieces, used_pieces, move_ordering = subtree
+    status, partial_pieces, search_stats = "incomplete", used_pieces, None
+    try:
+        if _worker_stop_event.is_set() or (_worker_deadline is not None and time.time() >= _worker_deadline):
+            return
+        image = draw_pieces_masks_in_image(_worker_root_image.copy(), used_pieces)
+        solver = TangramSolver(image, root_state=State(available_pieces, image, used_pieces, move_ordering=move_ordering), stop_event=_worker_stop_event,
+                               time_budget=_worker_deadline - time.time() if _worker_deadline is not None else None, node_budget=_worker_node_budget,
+                               lazy=True, enumerate_solutions=True, max_solutions_number=_worker_max_solutions_number,
+                               collect_stats=_worker_collect_stats)
+        for event in solver.solve_steps():
+            if event.kind == SearchEvent.SOLUTION_FOUND:
+                _worker_events_queue.put(event)
+        status = "incomplete" if solver.is_incomplete else solver.status
+        partial_pieces = solver.partial_node.current_state.used_pieces
+        search_stats = solver.search_stats
+    finally:  # the main process counts the ended subtrees, even if the search failed
+        _worker_events_queue.put(SearchEvent(SearchEvent.SEARCH_ENDED, partial_pieces, status=status, search_stats=search_stats))
+
+
+class ParallelSolver:
+    """
+    Used to split the search tree of one puzzle into independent subtrees explored by a pool of worker processes.
+    The first levels of the tree are expanded in the main process, then the root image is shared with the workers
+    through shared memory so only the placed pieces are sent with each subtree.
+
+    Attributes:
+        puzzle_shadow:  black and white image of the shape to solve
+        workers_number: number of worker processes
+        split_depth:    maximum number of tree levels expanded before handing the subtrees to the workers
+        deadline:       time at which the workers stop searching, None for no limit
+        stop_event:     event set to cancel the search from another thread, None if it cannot be cancelled
+        node_budget:    maximum number of nodes expanded in all the subtrees, shared evenly between them, None for no limit
+        max_solutions_number:   number of solutions after which the enumeration of each subtree stops, None for no limit
+        collect_stats:  True to measure the searches of the subtrees, see TangramSolver.collect_stats
+        is_incomplete:  True if a subtree was not fully explored because of the budgets
+        partial_node:   node of the partial placement with the highest coverage found by the workers
+        split_nodes_number:     number of nodes expanded in the main process to split the tree
+        subtrees_search_stats:  counters of the searches of the subtrees whose worker ended, see TangramSolver.search_stats
+    """
+    def __init__(self, puzzle_shadow: np.ndarray, workers_number: int, split_depth: int = settings.PARALLEL_SPLIT_DEPTH, deadline: float = None,
+                 node_budget: int = None, max_solutions_number: int = None, stop_event=None, collect_stats: bool = False):
+        self.puzzle_shadow = puzzle_shadow
+        self.workers_number = workers_number
+        self.split_depth = split_depth
+        self.deadline = deadline
+        self.stop_event = stop_event
+        self.node_budget = node_budget
+        self.max_solutions_number = max_solutions_number
+        self.collect_stats = collect_stats
+        self.is_incomplete = False
+        self.partial_node = None
+        self.split_nodes_number = 0
+        self.subtrees_search_stats: list[dict] = []
+
+    def split_tree(self, root_state: State) -> list[State]:
+        """
+        Expands the first levels of the search tree, until there are enough subtrees to keep all the workers busy
+        :param root_state: state at the root of the tree
+        :return: the states at the roots of the subtrees, in the order of the depth first search
+        """
+        subtree_roots = [root_state]
+        for _ in range(self.split_depth):
+            if len(subtree_roots) >= 4 * self.workers_number:
+                break
+            next_level = []
+            for state in subtree_roots:
+                if len(state.available_pieces) == 0:
+                    next_level.append(state)
+                    continue
+                next_state = state.get_next_state()
+                while next_state is not None:
+                    next_level.append(next_state)
+                    self.split_nodes_number += 1
+                    next_state = state.get_next_state()
+            subtree_roots = next_level
+        return subtree_roots
+
+    def is_budget_exhausted(self) -> bool:
+        """
+        Tells if the workers must stop, because the search has been cancelled or because its time budget ran out
+        :return: True if the search must stop, False otherwise
+        """
+        return (self.stop_event is not None and self.stop_event.is_set()) or (self.deadline is not None and time.time() >= self.deadline)
+
+    def solve(self, root_state: State) -> Node | None:
+        """
+        Explores the subtrees in parallel, the first solution found cancels the other workers, as a cancellation or the
+        end of the time budget does
+        :param root_state: state at the root of the tree
+        :return: the solution node, if a solution exists, else None
+        """
+        subtrees = [(state.available_pieces, state.used_pieces, state.move_ordering) for state in self.split_tree(root_state)]
+        root_image = get_image_region(root_state.image)
+        shared_memory = SharedMemory(create=True, size=root_image.nbytes)
+        shared_image = np.ndarray(root_image.shape, dtype=np.uint8, buffer=shared_memory.buf)
+        shared_image[:] = root_image
+        subtree_node_budget = -(-self.node_budget // len(subtrees)) if self.node_budget is not None and len(subtrees) > 0 else None
+        partial_pieces = root_state.used_pieces
+        try:
+            stop_event = Event()
+            initargs = (shared_memory.name, root_image.shape, stop_event, self.deadline, subtree_node_budget, None, None, self.collect_stats)
+            with Pool(self.workers_number, initializer=init_worker, initargs=initargs) as pool:
+                results = pool.imap_unordered(explore_subtree, subtrees)
+                while True:
+                    try:
+                        status, used_pieces, search_stats = results.next(timeout=1)
+                    except StopIteration:
+                        break
+                    except TimeoutError:  # no subtree ended meanwhile, the search may have been stopped from outside
+                        if self.is_budget_exhausted():
+                            stop_event.set()
+                            self.is_incomplete = True
+                            return None
+                        continue
+                    if search_stats is not None:
+                        self.subtrees_search_stats.append(search_stats)
+                    if status == "solved":
+                        stop_event.set()
+                        pool.terminate()
+                        return self.build_solution_node(root_image, used_pieces)
+                    self.is_incomplete |= status == "incomplete"
+                    if sum(piece.area for piece in used_pieces) > sum(piece.area for piece in partial_pieces):
+                        partial_pieces = used_pieces
+            return None
+        finally:
+            self.partial_node = self.build_solution_node(root_image, partial_pieces)
+            del shared_image
+            shared_memory.close()
+            shared_memory.unlink()
+
+    def enumerate_solutions(self, root_state: State):
+        """
+        Explores all the subtrees in parallel, the workers sending the solutions through a queue as soon as they find
+        them. Closing the generator, cancelling the search or the end of the time budget stops the workers.
+        :param root_state: state at the root of the tree
+        :return: generator of the solution nodes in the order they are found, the solutions of different subtrees being
+                 possibly the same, see TangramSolver.enumerate_in_parallel
+        """
+        subtrees = [(state.available_pieces, state.used_pieces, state.move_ordering) for state in self.split_tree(root_state)]
+        root_image = get_image_region(root_state.image)
+        shared_memory = SharedMemory(create=True, size=root_image.nbytes)
+        shared_image = np.ndarray(root_image.shape, dtype=np.uint8, buffer=shared_memory.buf)
+        shared_image[:] = root_image
+        subtree_node_budget = -(-self.node_budget // len(subtrees)) if self.node_budget is not None and len(subtrees) > 0 else None
+        partial_pieces = root_state.used_pieces
+        stop_event = Event()
+        try:
+            events_queue = Queue()
+            initargs = (shared_memory.name, root_image.shape, stop_event, self.deadline, subtree_node_budget, events_queue, self.max_solutions_number,
+                        self.collect_stats)
+            with Pool(self.workers_number, initializer=init_worker, initargs=initargs) as pool:
+                result = pool.map_async(enumerate_subtree, subtrees)
+                ended_subtrees_number = 0
+                while ended_subtrees_number < len(subtrees):
+                    try:
+                        event = events_queue.get(timeout=1)
+                    except queue.Empty:
+                        if result.ready() and not result.successful():
+                            result.get()  # raises the error of the worker
+                        if self.is_budget_exhausted():
+                            self.is_incomplete = True
+                            break
+                        continue
+                    if event.kind == SearchEvent.SOLUTION_FOUND:
+                        yield self.build_solution_node(root_image, event.pieces)
+                        continue
+                    ended_subtrees_number += 1
+                    if event.search_stats is not None:
+                        self.subtrees_search_stats.append(event.search_stats)
+                    self.is_incomplete |= event.status == "incomplete"
+                    if sum(piece.area for piece in event.pieces) > sum(piece.area for piece in partial_pieces):
+                        partial_pieces = event.pieces
+        finally:
+            stop_event.set()
+            self.partial_node = self.build_solution_node(root_image, partial_pieces)
+            del shared_image
+            shared_memory.close()
+            shared_memory.unlink()
+
+    @staticmethod
+    def build_solution_node(root_image: np.ndarray, used_pieces: list[Piece]) -> Node:
+        """
+        Rebuilds the solution node in the main process from the pieces found by a worker, or of a partial placement
+        :param root_image: image at the root of the search
+        :param used_pieces: pieces of the solution
+        :return: the solution node
+        """
+        image = draw_pieces_masks_in_image(root_image.copy(), used_pieces)
+        return Node(State([], image, used_pieces))
@@ -0,0 +1,216 @@
+from __future__ import annotations
+import math
+from collections import OrderedDict
+import os
+import time
+import numpy as np
+import cv2 as cv
+from elements import *
+import settings
+
+
+class PieceMaskLibrary:
+    """
+    Library of the rasterized pieces, keyed by piece type, shifted corner, flip and rotation angle rounded to
+    PIECE_MASK_ANGLE_STEP. The rotations multiple of PIECE_ROTATION are built at start, the other orientations met
+    during the search are added the first time they are rasterized, in a bounded LRU cache. Placing a piece then becomes
+    a lookup of its mask instead of a rasterization of its polygon.
+
+    Attributes:
+        masks:              binary mask of each built orientation and the offset of its top left pixel from the pivot point
+        added_masks:        masks of the other orientations met during the search, the least recently used first
+        max_bytes:          maximum memory taken by the added masks, the least recently used ones are evicted first
+        added_bytes:        memory taken by the added masks
+        build_duration:     time taken to build or load the library, in seconds
+        hits:               number of masks found in the library
+        misses:             number of masks rasterized because they were not in the library
+        evictions:          number of added masks evicted to respect the maximum memory
+    """
+    PIECE_TYPES = (LargeTriangle, MediumTriangle, SmallTriangle, Square, Parallelogram)
+
+    def __init__(self, max_bytes: int = settings.PIECE_MASK_LIBRARY_MAX_BYTES):
+        self.masks: dict[tuple[str, int, bool, int], tuple[np.ndarray, tuple[int, int]]] = {}
+        self.added_masks: OrderedDict[tuple[str, int, bool, int], tuple[np.ndarray, tuple[int, int]]] = OrderedDict()
+        self.max_bytes: int = max_bytes
+        self.added_bytes: int = 0
+        self.build_duration: float = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def is_built(self) -> bool:
+        """
+        Tells if the library contains the masks
+        :return: True if it has been built or loaded, False otherwise
+        """
+        return len(self.masks) > 0
+
+    def build(self) -> None:
+        """
+        Rasterizes all the orientations of all the pieces
+        """
+        start_time = time.time()
+        self.masks = {}
+        self.clear_added_masks()
+        for piece_type in self.PIECE_TYPES:
+            for is_flipped in ((False, True) if piece_type is Parallelogram else (False,)):
+                piece = piece_type()
+                if is_flipped:
+                    piece.flip()
+                for _ in range(piece.max_corners_shifts):
+                    for rotation in range(0, 360, settings.PIECE_ROTATION):
+                        piece.rotate_shape_around_its_pivot_point(self.get_first_edge_angle(piece) - rotation)
+                        self.masks[self.get_key(piece)] = self.rasterize(piece)
+                    piece.shift_corners()
+        self.build_duration = time.time() - start_time
+
+    def load(self, path: str) -> None:
+        """
+        Loads a library previously saved
+        :param path: path of the .npz file
+        :raise ValueError: if the library was built with other settings of the size or of the rotations of the pieces
+        """
+        start_time = time.time()
+        with np.load(path) as data:
+            if "sideLength" not in data.files or "angleStep" not in data.files \
+                    or data["sideLength"] != settings.TANGRAM_SIDE_LENGTH or data["angleStep"] != settings.PIECE_MASK_ANGLE_STEP:
+                raise ValueError(f"the piece mask library {path} was not built with the current TANGRAM_SIDE_LENGTH and PIECE_MASK_ANGLE_STEP")
+            self.masks = {}
+            self.clear_added_masks()
+            for name in data.files:
+                if not name.endswith("_mask"):
+                    continue
+                key = name[:-len("_mask")]
+                piece_name, shift, is_flipped, rotation = key.split("|")
+                offset = data[key + "_offset"]
+                self.masks[(piece_name, int(shift), is_flipped == "True", int(rotation))] = (data[name], (int(offset[0]), int(offset[1])))
+        self.build_duration = time.time() - start_time
+
+    def save(self, path: str) -> None:
+        """
+        Saves the library, to avoid building it at each start
+        :param path: path of the .npz file
+        """
+        arrays = {"sideLength": np.array(settings.TANGRAM_SIDE_LENGTH), "angleStep": np.array(settings.PIECE_MASK_ANGLE_STEP)}
+        for key, (mask, offset) in self.masks.items():
+            name = "|".join(str(value) for value in key)
+            arrays[name + "_mask"] = mask
+            arrays[name + "_offset"] = np.array(offset)
+        np.savez_compressed(path, **arrays)
+
+    def load_or_build(self, path: str = settings.PIECE_MASK_LIBRARY_PATH) -> None:
+        """
+        Loads the library from the disk if it has been saved with the current settings, builds it otherwise
+        :param path: path of the .npz file, None to always build it
+        """
+        if path is not None and os.path.exists(path):
+            try:
+                self.load(path)
+                return
+            except ValueError:  # saved with other settings, its masks would not match the pieces
+                pass
+        self.build()
+
+    def clear_added_masks(self) -> None:
+        """
+        Removes the masks added during the search
+        """
+        self.added_masks = OrderedDict()
+        self.added_bytes = 0
+
+    def get_memory_footprint(self) -> int:
+        """
+        Gives the memory taken by the masks
+        :return: the number of bytes of all the masks, built and added
+        """
+        return sum(mask.nbytes for mask, _ in self.masks.values()) + self.added_bytes
+
+    def get_stats(self) -> dict:
+        """
+        Gives the size of the library and the time it took to build
+        :return: the number of masks, their memory footprint in bytes, the build duration in seconds, the lookups and the
+                 evictions
+        """
+        return {
+            "masks": len(self.masks) + len(self.added_masks),
+            "addedMasks": len(self.added_masks),
+            "bytes": self.get_memory_footprint(),
+            "buildDuration": self.build_duration,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    def get_mask(self, piece: Piece) -> tuple[np.ndarray, tuple[int, int]]:
+        """
+        Gives the mask of a piece in its current orientation, rasterizes it if it is not in the library or if it is scaled
+        :param piece: piece of which we want the mask
+        :return: the mask and the offset of its top left pixel from the pivot point of the piece
+        """
+        if piece.scale != 1:  # the pieces of the coarse search are small and quickly rasterized, they are not stored
+            self.misses += 1
+            return self.rasterize(piece)
+        key = self.get_key(piece)
+        if key in self.masks:
+            self.hits += 1
+            return self.masks[key]
+        if key in self.added_masks:
+            self.added_masks.move_to_end(key)
+            self.hits += 1
+            return self.added_masks[key]
+        self.misses += 1
+        mask = self.rasterize(piece)
+        if self.max_bytes > 0:
+            self.added_masks[key] = mask
+            self.added_bytes += mask[0].nbytes
+            while self.added_bytes > self.max_bytes:
+                _, (evicted_mask, _) = self.added_masks.popitem(last=False)
+                self.added_bytes -= evicted_mask.nbytes
+                self.evictions += 1
+        return mask
+
+    @staticmethod
+    def get_key(piece: Piece) -> tuple[str, int, bool, int]:
+        """
+        Gives the key of the current orientation of a piece in the library
+        :param piece: the piece
+        :return: the key of the orientation, with the rotation as a number of PIECE_MASK_ANGLE_STEP
+        """
+        shift = piece.corners_shifts_counter % piece.max_corners_shifts
+        steps_number = round(360 / settings.PIECE_MASK_ANGLE_STEP)
+        rotation = round(PieceMaskLibrary.get_first_edge_angle(piece) / settings.PIECE_MASK_ANGLE_STEP) % steps_number
+        return piece.name, shift, getattr(piece, "is_flipped", False), rotation
+
+    @staticmethod
+    def get_first_edge_angle(piece: Piece) -> float:
+        """
+        Gives the direction of the edge going from the first corner of the piece to the second one
+        :param piece: the piece
+        :return: the angle of the edge with the horizontal axis, in degrees
+        """
+        dx, dy = (piece.coordinates[1] - piece.coordinates[0]).tolist()
+        return math.degrees(math.atan2(dy, dx))
+
+    @staticmethod
+    def rasterize(piece: Piece) -> tuple[np.ndarray, tuple[int, int]]:
+        """
+        Rasterizes a piece around its pivot point
+        :param piece: piece to rasterize
+        :return: the boolean mask of the piece and the offset of its top left pixel from the pivot point
+        """
+        points = np.floor(np.round(piece.coordinates - (piece.pivot_point.x, piece.pivot_point.y), 6)).astype(np.int32)
+        min_x, min_y = points.min(axis=0)
+        max_x, max_y = points.max(axis=0) + 1
+        mask = np.zeros((max_y - min_y, max_x - min_x), np.uint8)
+        cv.fillPoly(mask, [(points - (min_x, min_y)).reshape((-1, 1, 2))], 1)
+        return mask.astype(bool), (int(min_x), int(min_y))
+
+
+PIECE_MASK_LIBRARY = PieceMaskLibrary()
+
+
+if __name__ == "__main__":
+    library = PieceMaskLibrary()
+    library.build()
+    library.save(settings.PIECE_MASK_LIBRARY_PATH)
+    print(library.get_stats())
@@ -0,0 +1,132 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+import settings
+
+
+class ResultCache:
+    """
+    Cache of the results of the solver, one json file per processed image named after the hash of its pixels, so that a
+    byte-identical puzzle is never solved twice whatever its path. The files are written in a temporary file renamed
+    at once, and reading a file touches it: the least recently used results are removed when the cache grows over its
+    size limit. The size is counted incrementally from the results written, the directory being only scanned when it
+    goes over the limit, and the eviction goes down to a ratio of the limit so that the next scan is far away. Several
+    processes can share the same directory, the results written by the other ones being counted at the next scan.
+
+    Attributes:
+        directory:  directory of the json files of the results
+        max_size:   maximum size in bytes of all the results
+        size:       size in bytes of the results counted since the last scan of the directory, None before the first one
+        hits:       number of results found in the cache
+        misses:     number of results not found in the cache
+    """
+    def __init__(self, directory: str = settings.RESULT_CACHE_DIRECTORY, max_size: int = settings.RESULT_CACHE_MAX_SIZE):
+        self.directory: str = directory
+        self.max_size: int = max_size
+        self.size: int | None = None
+        self.hits: int = 0
+        self.misses: int = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def get_key(image: np.ndarray) -> str:
+        """
+        Gives the key of a processed image
+        :param image: black and white image of the puzzle, the whole image given by the ImageProcessor, whose solutions are placed in it
+        :return: the sha256 hash of the size and of the pixels of the image
+        """
+        image_hash = hashlib.sha256(str(image.shape).encode())
+        image_hash.update(np.ascontiguousarray(image).tobytes())
+        return image_hash.hexdigest()
+
+    def get_path(self, key: str) -> str:
+        """
+        Gives the path of the file of a result
+        :param key: key of the image
+        :return: the path of the json file
+        """
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key: str) -> dict | None:
+        """
+        Gives a result stored in the cache, and marks it as recently used
+        :param key: key of the image
+        :return: the result, None if it is not in the cache
+        """
+        path = self.get_path(key)
+        try:
+            with open(path) as file:
+                result = json.load(file)
+            os.utime(path)
+        except (OSError, ValueError):  # not in the cache, or evicted by another process meanwhile
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key: str, result: dict) -> None:
+        """
+        Stores a result in the cache, then evicts the least recently used results if it is too large
+        :param key: key of the image
+        :param result: json dictionary of the result
+        """
+        path = self.get_path(key)
+        try:
+            replaced_size = os.stat(path).st_size
+        except OSError:
+            replaced_size = 0
+        data = json.dumps(result).encode()
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                file.write(data)
+            os.replace(temporary_path, path)  # atomic, the other processes never read a partial file
+        except OSError:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        if self.size is not None:
+            self.size += len(data) - replaced_size
+        if self.size is None or self.size > self.max_size:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Scans the directory and removes the least recently used results until the size of the cache is below
+        RESULT_CACHE_EVICTION_RATIO of its limit
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.stat().st_size, entry.path))
+                except OSError:  # removed by another process
+                    pass
+        size = sum(entry_size for _, entry_size, _ in entries)
+        if size > self.max_size:
+            for _, entry_size, path in sorted(entries):
+                if size <= settings.RESULT_CACHE_EVICTION_RATIO * self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                size -= entry_size
+        self.size = size
+
+    def get_stats(self) -> dict:
+        """
+        Gives the results of the lookups in the cache
+        :return: the hits and the misses
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,53 @@
+from __future__ import annotations
+from elements import Piece
+
+
+class SearchEvent:
+    """
+    Step of the search of the solver, given by TangramSolver.solve_steps as the search goes, used to show the progress of
+    the search and to cancel it early
+
+    Attributes:
+        kind:   one of KINDS: "piecePlaced" when a piece is added to the placement, "backtrack" when the last piece is
+                removed because no more piece fits after it, "solutionFound" once all the pieces are placed, for each
+                distinct solution when all of them are enumerated, and "searchEnded" as the last event of the search,
+                with its status
+        pieces: pieces placed after the event
+        piece:  piece placed or removed by the event, None for the other events
+        status: status of the solver for a "searchEnded" event, see TangramSolver.status, None otherwise
+        search_stats:   counters of the search for a "searchEnded" event, see TangramSolver.search_stats, None otherwise
+    """
+    PIECE_PLACED = "piecePlaced"
+    BACKTRACK = "backtrack"
+    SOLUTION_FOUND = "solutionFound"
+    SEARCH_ENDED = "searchEnded"
+    KINDS = (PIECE_PLACED, BACKTRACK, SOLUTION_FOUND, SEARCH_ENDED)
+
+    def __init__(self, kind: str, pieces: list[Piece], piece: Piece = None, status: str = None, search_stats: dict = None):
+        self.kind: str = kind
+        self.pieces: list[Piece] = pieces
+        self.piece: Piece | None = piece
+        self.status: str | None = status
+        self.search_stats: dict | None = search_stats
+
+    def to_json(self) -> dict:
+        """
+        Gives the event as sent to the clients showing the search
+        :return: the json dictionary of the event
+        """
+        event_json = {
+            "kind": self.kind,
+            "pieces": [{"type": piece.name, "points": piece.get_points_array().tolist()} for piece in self.pieces]
+        }
+        if self.piece is not None:
+            event_json["piece"] = self.piece.name
+        if self.status is not None:
+            event_json["status"] = self.status
+        return event_json
+
+    def __repr__(self) -> str:
+        return f"SearchEvent({self.kind}, {len(self.pieces)} pieces{', ' + self.status if self.status is not None else ''})"
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,98 @@
+from __future__ import annotations
+from time import perf_counter
+
+
+class SearchStats:
+    """
+    Counters and timers of the search, filled by the states, the placement filters and the placement tests while it is
+    enabled. When it is disabled each call returns at once, so the instrumentation costs a few attribute lookups. Each
+    solver owns its stats and hands them to its states, so that solvers running at the same time do not mix their counts.
+
+    Attributes:
+        enabled:                True while the search is measured
+        candidates_by_piece:    number of placements tested on the image, by piece type
+        rejections:             number of placements rejected, by reason: "angleMismatch" when the angles of the
+                                corners differ, "largeTriangleCorners" when a large triangle does not touch two corners
+                                of the shape, "coverageRatio" when the piece does not cover enough black pixels
+        timers:                 cumulative time in seconds spent in "getCorners" (corners of the regions of each state),
+                                "rasterization" (masks of the pieces) and "acceptNewPiece" (coverage test)
+    """
+    REJECTION_REASONS = ("angleMismatch", "largeTriangleCorners", "coverageRatio")
+    TIMERS = ("getCorners", "rasterization", "acceptNewPiece")
+
+    def __init__(self):
+        self.enabled: bool = False
+        self.candidates_by_piece: dict[str, int] = {}
+        self.rejections: dict[str, int] = {}
+        self.timers: dict[str, float] = {}
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Sets all the counters and timers back to zero
+        """
+        self.candidates_by_piece = {}
+        self.rejections = {reason: 0 for reason in self.REJECTION_REASONS}
+        self.timers = {timer: 0. for timer in self.TIMERS}
+
+    def count_candidate(self, piece_name: str) -> None:
+        """
+        Counts a placement tested on the image
+        :param piece_name: name of the piece placed
+        """
+        if self.enabled:
+            self.candidates_by_piece[piece_name] = self.candidates_by_piece.get(piece_name, 0) + 1
+
+    def count_rejection(self, reason: str) -> None:
+        """
+        Counts a placement rejected
+        :param reason: one of REJECTION_REASONS
+        """
+        if self.enabled:
+            self.rejections[reason] += 1
+
+    def start_timer(self) -> float:
+        """
+        Starts measuring a step of the search
+        :return: the start time, to give to stop_timer
+        """
+        return perf_counter() if self.enabled else 0
+
+    def stop_timer(self, timer: str, start_time: float) -> None:
+        """
+        Adds the time spent since start_timer to a timer
+        :param timer: one of TIMERS
+        :param start_time: time given by start_timer
+        """
+        if self.enabled:
+            self.timers[timer] += perf_counter() - start_time
+
+    def add(self, stats: dict) -> None:
+        """
+        Adds the counters and timers of another search, like the search of a subtree in a worker process
+        :param stats: json dictionary of the stats of the other search, see to_json
+        """
+        for piece_name, candidates_number in stats["candidatesByPiece"].items():
+            self.candidates_by_piece[piece_name] = self.candidates_by_piece.get(piece_name, 0) + candidates_number
+        for reason, rejections_number in stats["rejections"].items():
+            self.rejections[reason] += rejections_number
+        for timer, duration in stats["timers"].items():
+            self.timers[timer] += duration
+
+    def to_json(self) -> dict:
+        """
+        Gives the counters and timers
+        :return: the json dictionary of the stats
+        """
+        return {
+            "candidatesByPiece": dict(self.candidates_by_piece),
+            "rejections": dict(self.rejections),
+            "timers": dict(self.timers)
+        }
+
+
+DISABLED_SEARCH_STATS = SearchStats()  # never enabled, given to the states built outside of a measured search
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,351 @@
+from __future__ import annotations
+import json
+import os
+import numpy as np
+import cv2 as cv
+from ImageProcessor import ImageProcessor
+from StatsHandler import StatsHandler
+from utils import get_piece_mask, draw_piece_mask_in_image
+from elements import *
+import settings
+
+
+class SolutionIndex:
+    """
+    Index of solved shapes, used to give back the solution of a shape already solved, whatever its position, its size or
+    its rotation in the image. A shape is described by two angular profiles taken around its center of mass: the distance
+    of its farthest black pixel and its number of black pixels in each direction, divided by the size of the shape. A
+    rotation of the shape only shifts the profiles, so the magnitudes of their Fourier coefficients are the signature of
+    the shape, and the shift of the profiles of a shape found in the index gives the rotation between the two shapes.
+
+    Attributes:
+        path:           path of the .npz file of the index, None if it is only kept in memory
+        names:          name of the puzzle of each entry
+        profiles:       angular profiles of each entry (2, SOLUTION_INDEX_ANGLES_NUMBER)
+        centers:        center of mass (x, y) of the shape of each entry
+        sizes:          square root of the area of the shape of each entry, in pixels
+        solutions:      pieces of the solution of each entry, as (piece name, points of the piece in the image)
+        signatures:     matrix of the signatures of the entries, rebuilt after the entries change
+        is_updated:     True if entries have been added since the index was loaded
+        hits:           number of lookups which found a solution
+        misses:         number of lookups which did not find a solution
+    """
+    PIECE_NAMES = ("Large Triangle", "Medium Triangle", "Small Triangle", "Square", "Parallelogram")
+
+    def __init__(self, path: str = None):
+        self.path: str = path
+        self.names: list[str] = []
+        self.profiles: list[np.ndarray] = []
+        self.centers: list[np.ndarray] = []
+        self.sizes: list[float] = []
+        self.solutions: list[list[tuple[str, np.ndarray]]] = []
+        self.signatures: np.ndarray | None = None
+        self.is_updated: bool = False
+        self.hits: int = 0
+        self.misses: int = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @staticmethod
+    def get_profiles(image: np.ndarray) -> (np.ndarray, np.ndarray, float):
+        """
+        Describes the shape of a processed image, see the class docstring
+        :param image: black and white image of the shape, as given by the ImageProcessor
+        :return: the two angular profiles of the shape, its center of mass (x, y) and the square root of its area
+        """
+        ys, xs = np.nonzero(image == 0)
+        center = np.array([xs.mean(), ys.mean()])
+        size = float(np.sqrt(len(xs)))
+        dx, dy = xs - center[0], ys - center[1]
+        angles_number = settings.SOLUTION_INDEX_ANGLES_NUMBER
+        angle_indexes = (np.floor((np.arctan2(dy, dx) + np.pi) / (2 * np.pi) * angles_number).astype(int)) % angles_number
+        profiles = np.zeros((2, angles_number))
+        np.maximum.at(profiles[0], angle_indexes, np.sqrt(dx ** 2 + dy ** 2) / size)
+        profiles[1] = np.bincount(angle_indexes, minlength=angles_number) / len(xs) * angles_number
+        return profiles, center, size
+
+    @staticmethod
+    def get_signature(profiles: np.ndarray) -> np.ndarray:
+        """
+        Gives the signature of a shape, which does not change with its rotation
+        :param profiles: angular profiles of the shape
+        :return: the magnitudes of the first Fourier coefficients of the two profiles
+        """
+        coefficients = np.abs(np.fft.rfft(profiles, axis=1))[:, :settings.SOLUTION_INDEX_COEFFICIENTS_NUMBER]
+        return (coefficients / profiles.shape[1]).ravel()
+
+    @staticmethod
+    def get_rotation(profiles: np.ndarray, entry_profiles: np.ndarray) -> float:
+        """
+        Gives the rotation from a shape of the index to a new shape, as the shift maximizing the circular correlation of
+        their profiles, refined between two angles by a parabola
+        :param profiles: angular profiles of the new shape
+        :param entry_profiles: angular profiles of the shape in the index
+        :return: the rotation angle in radians, counterclockwise in the image coordinates (y downwards)
+        """
+        centered = profiles - profiles.mean(axis=1, keepdims=True)
+        entry_centered = entry_profiles - entry_profiles.mean(axis=1, keepdims=True)
+        correlation = np.fft.irfft(np.fft.rfft(centered, axis=1) * np.conj(np.fft.rfft(entry_centered, axis=1)), n=profiles.shape[1], axis=1)
+        correlation = (correlation / np.maximum(np.linalg.norm(centered, axis=1) * np.linalg.norm(entry_centered, axis=1), 1e-9)[:, None]).sum(axis=0)
+        shift = int(np.argmax(correlation))
+        before, peak, after = correlation[shift - 1], correlation[shift], correlation[(shift + 1) % len(correlation)]
+        curvature = before - 2 * peak + after
+        refined_shift = shift + (.5 * (before - after) / curvature if curvature < 0 else 0)
+        return refined_shift * 2 * np.pi / len(correlation)
+
+    def get_signatures(self) -> np.ndarray:
+        """
+        Gives the signatures of all the entries, computed once after each change of the entries
+        :return: the matrix of the signatures, one row per entry
+        """
+        if self.signatures is None:
+            self.signatures = np.array([self.get_signature(profiles) for profiles in self.profiles]).reshape((len(self), -1))
+        return self.signatures
+
+    def add(self, image: np.ndarray, used_pieces: list[Piece], name: str = "") -> None:
+        """
+        Adds a solved shape to the index
+        :param image: black and white image of the shape, as given by the ImageProcessor
+        :param used_pieces: pieces of the solution, placed in the image
+        :param name: name of the puzzle
+        """
+        profiles, center, size = self.get_profiles(image)
+        self.names.append(name)
+        self.profiles.append(profiles)
+        self.centers.append(center)
+        self.sizes.append(size)
+        self.solutions.append([(piece.name, piece.get_points_array()) for piece in used_pieces])
+        self.signatures = None
+        self.is_updated = True
+
+    def lookup(self, image: np.ndarray) -> list[Piece] | None:
+        """
+        Looks for the solution of a shape: the closest signatures of the index are tried one after the other, their
+        pieces being moved into the new image and kept if they still cover the shape
+        :param image: black and white image of the shape, as given by the ImageProcessor
+        :return: the pieces of the solution placed in the image, None if the shape is not in the index
+        """
+        return self.lookup_many([image])[0]
+
+    def lookup_many(self, images: list[np.ndarray]) -> list[list[Piece] | None]:
+        """
+        Looks for the solutions of several shapes at once: the signatures of all the shapes are compared with the ones
+        of the index in a single distance matrix, then the closest entries of each shape are tried as in lookup
+        :param images: black and white images of the shapes, as given by the ImageProcessor
+        :return: the pieces of the solution of each shape, None for the shapes which are not in the index
+        """
+        if len(self) == 0 or len(images) == 0:
+            self.misses += len(images)
+            return [None] * len(images)
+        descriptions = [self.get_profiles(image) for image in images]
+        signatures = np.array([self.get_signature(profiles) for profiles, _, _ in descriptions])
+        entry_signatures = self.get_signatures()
+        squared_distances = (signatures ** 2).sum(axis=1)[:, None] + (entry_signatures ** 2).sum(axis=1)[None, :] - 2 * signatures @ entry_signatures.T
+        distances = np.sqrt(np.maximum(squared_distances, 0))  # (shapes, entries), without the (shapes, entries, signature) differences
+        return [self.find_solution(image, profiles, center, size, shape_distances)
+                for image, (profiles, center, size), shape_distances in zip(images, descriptions, distances)]
+
+    def find_solution(self, image: np.ndarray, profiles: np.ndarray, center: np.ndarray, size: float, distances: np.ndarray) -> list[Piece] | None:
+        """
+        Tries the entries closest to a shape one after the other, their pieces being moved into the image of the shape
+        and kept if they still cover it
+        :param image: black and white image of the shape, as given by the ImageProcessor
+        :param profiles: angular profiles of the shape
+        :param center: center of mass of the shape
+        :param size: square root of the area of the shape
+        :param distances: distances between the signature of the shape and the signatures of the entries
+        :return: the pieces of the solution placed in the image, None if the shape is not in the index
+        """
+        for entry in np.argsort(distances)[:settings.SOLUTION_INDEX_CANDIDATES_NUMBER]:
+            if distances[entry] > settings.SOLUTION_INDEX_MAX_DISTANCE:
+                break
+            rotation = (self.get_rotation(profiles, self.profiles[entry]) + np.pi) % (2 * np.pi) - np.pi
+            scale = size / self.sizes[entry]
+            if abs(rotation) < np.pi / settings.SOLUTION_INDEX_ANGLES_NUMBER and abs(scale - 1) < .01:
+                # same shape in the same orientation: the stored placement is only moved by whole pixels, its masks
+                # being then exactly the ones accepted by the solver
+                rotation, scale = 0, 1
+                center = self.centers[entry] + np.round(center - self.centers[entry])
+            for rotation_error in self.get_rotation_errors():
+                pieces = self.transform_solution(self.solutions[entry], rotation + rotation_error, self.centers[entry], center, scale)
+                if self.fit_pieces(image, pieces):
+                    self.hits += 1
+                    return pieces
+        self.misses += 1
+        return None
+
+    @staticmethod
+    def get_rotation_errors() -> list[float]:
+        """
+        Gives the corrections of the rotation found between two shapes which are tried, the profiles giving it with an
+        error of about one of their directions
+        :return: the corrections in radians, by half directions up to SOLUTION_INDEX_MAX_ROTATION_ERROR, smallest first
+        """
+        step = np.pi / settings.SOLUTION_INDEX_ANGLES_NUMBER
+        steps_number = int(round(np.radians(settings.SOLUTION_INDEX_MAX_ROTATION_ERROR) / step))
+        return [0.] + [sign * i * step for i in range(1, steps_number + 1) for sign in (-1, 1)]
+
+    @staticmethod
+    def transform_solution(solution: list[tuple[str, np.ndarray]], rotation: float, entry_center: np.ndarray, center: np.ndarray, scale: float) -> list[Piece]:
+        """
+        Moves the pieces of a solution into the frame of a new shape. The pieces keep their size: only the positions of
+        their centers follow the scale between the two shapes, so that they stay inside the shape as the pieces of the
+        solver do when the size of the image does not match the area of the tangram exactly
+        :param solution: pieces of the solution in the index, as (piece name, points)
+        :param rotation: rotation from the shape of the index to the new shape, in radians
+        :param entry_center: center of mass of the shape of the index
+        :param center: center of mass of the new shape
+        :param scale: ratio between the size of the new shape and the size of the shape of the index
+        :return: the pieces placed in the new shape
+        """
+        cos, sin = np.cos(rotation), np.sin(rotation)
+        rotation_matrix = np.array([[cos, sin], [-sin, cos]])  # applied to the row vectors (x, y)
+        moved_solution = []
+        for name, points in solution:
+            piece_center = points.mean(axis=0)
+            new_piece_center = center + scale * (piece_center - entry_center) @ rotation_matrix
+            moved_solution.append((name, new_piece_center + (points - piece_center) @ rotation_matrix))
+        return StatsHandler.build_pieces(moved_solution)
+
+    @staticmethod
+    def fit_pieces(image: np.ndarray, pieces: list[Piece]) -> bool:
+        """
+        Checks that pieces moved from the index solve a shape, with the masks of the solver: all the pieces together must
+        cover uncovered black pixels with the acceptance ratio of the solver, the pixels covered twice or outside of the
+        shape counting as uncovered. The small errors of the position between the two shapes are corrected by moving
+        the whole placement to the closest shift where it covers nearly the most black pixels, at most
+        SOLUTION_INDEX_MAX_SHIFT pixels away
+        :param image: black and white image of the shape
+        :param pieces: pieces placed in the image, moved by the shift found
+        :return: True if the placement is accepted, False otherwise
+        """
+        max_shift = settings.SOLUTION_INDEX_MAX_SHIFT
+        placement = np.zeros((image.shape[0] + 2 * max_shift, image.shape[1] + 2 * max_shift), np.uint8)  # padded for the pieces near the borders
+        for piece in pieces:
+            padded_piece = piece.copy()
+            padded_piece.position_in_image = piece.position_in_image + Point(max_shift, max_shift)
+            piece_mask, piece_box = get_piece_mask(padded_piece, placement.shape)
+            draw_piece_mask_in_image(placement, piece_mask, piece_box, 1)
+        shape = np.pad((image == 0).astype(np.float32), 2 * max_shift)
+        covered_pixels = cv.matchTemplate(shape, placement.astype(np.float32), cv.TM_CCORR)  # covered black pixels for each shift
+        pieces_area = sum(piece.area for piece in pieces)
+        if covered_pixels.max() < settings.SOLUTION_INDEX_MIN_COVERAGE * pieces_area:
+            return False
+        shifts_y, shifts_x = np.nonzero(covered_pixels >= covered_pixels.max() - .001 * pieces_area)  # nearly the best shifts
+        closest_shift = np.argmin((shifts_x - max_shift) ** 2 + (shifts_y - max_shift) ** 2)
+        shift = Point(int(shifts_x[closest_shift]) - max_shift, int(shifts_y[closest_shift]) - max_shift)
+        for piece in pieces:
+            piece.position_in_image = piece.position_in_image + shift
+        return True
+
+    def add_batch_results(self, batch_results_path: str) -> int:
+        """
+        Builds the index from the records of the batch solver, the images of the solved puzzles being processed again to
+        get their signatures
+        :param batch_results_path: path of the jsonl file written by the batch solver
+        :return: the number of entries added
+        """
+        added_number = 0
+        with open(batch_results_path) as file:
+            for line in file:
+                added_number += self.add_batch_record(json.loads(line))
+        return added_number
+
+    def add_batch_record(self, record: dict) -> bool:
+        """
+        Adds the puzzle of a record of the batch solver to the index, its image being processed again to get its signature
+        :param record: json record of the puzzle, see BatchSolver
+        :return: True if the puzzle has been added, False if it was not solved or its image is missing
+        """
+        if not record.get("solved", False) or not os.path.exists(record["imagePath"]):
+            return False
+        image_processor = ImageProcessor(record["imagePath"])
+        pieces = StatsHandler.build_pieces(StatsHandler.get_solution_from_json(record["pieces"]))  # saved in the whole image
+        self.add(image_processor.image, image_processor.get_pieces_in_cropped_image(pieces), StatsHandler(record["imagePath"]).puzzle_name)
+        return True
+
+    def get_hit_rate(self) -> float:
+        """
+        Gives the ratio of lookups which found a solution
+        :return: the hit rate, 0 if there was no lookup
+        """
+        lookups_number = self.hits + self.misses
+        return self.hits / lookups_number if lookups_number > 0 else 0
+
+    def get_stats(self) -> dict:
+        """
+        Gives the size of the index and the results of its lookups
+        :return: the number of entries, the hits, the misses and the hit rate
+        """
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.get_hit_rate()
+        }
+
+    def load(self, path: str) -> None:
+        """
+        Loads an index previously saved
+        :param path: path of the .npz file
+        """
+        with np.load(path) as data:
+            self.names = data["names"].tolist()
+            self.profiles = list(data["profiles"].astype(float))
+            self.centers = list(data["centers"].astype(float))
+            self.sizes = data["sizes"].astype(float).tolist()
+            self.solutions = [
+                [(self.PIECE_NAMES[piece_type], points[~np.isnan(points[:, 0])].astype(float)) for piece_type, points in zip(pieces_types, pieces_points) if piece_type >= 0]
+                for pieces_types, pieces_points in zip(data["piecesTypes"], data["piecesPoints"])
+            ]
+        self.signatures = None
+        self.is_updated = False
+
+    def save(self, path: str = None) -> None:
+        """
+        Saves the index in a compressed .npz file: the profiles and the points of the pieces as float32 arrays, the
+        points of the triangles being padded with nan
+        :param path: path of the .npz file, the path of the index by default
+        """
+        path = path if path is not None else self.path
+        pieces_number = max((len(solution) for solution in self.solutions), default=0)
+        pieces_types = np.full((len(self), pieces_number), -1, dtype=np.int8)
+        pieces_points = np.full((len(self), pieces_number, 4, 2), np.nan, dtype=np.float32)
+        for i, solution in enumerate(self.solutions):
+            for j, (name, points) in enumerate(solution):
+                pieces_types[i, j] = self.PIECE_NAMES.index(name)
+                pieces_points[i, j, :len(points)] = points
+        np.savez_compressed(
+            path,
+            names=np.array(self.names, dtype=str),
+            profiles=np.array(self.profiles, dtype=np.float32).reshape((len(self), 2, settings.SOLUTION_INDEX_ANGLES_NUMBER)),
+            centers=np.array(self.centers, dtype=np.float32).reshape((len(self), 2)),
+            sizes=np.array(self.sizes, dtype=np.float32),
+            piecesTypes=pieces_types,
+            piecesPoints=pieces_points
+        )
+        self.is_updated = False
+
+
+if __name__ == "__main__":
+    import argparse
+    import glob
+
+    parser = argparse.ArgumentParser(description='Builds the solution index and looks up puzzles in it')
+    parser.add_argument('--index', type=str, default=settings.SOLUTION_INDEX_PATH, help='Path of the .npz file of the index')
+    parser.add_argument('--batchResults', type=str, default=None, help='jsonl file of the batch solver from which the solved puzzles are added to the index')
+    parser.add_argument('--lookup', type=str, default=None, help='Glob pattern of puzzles to look up in the index')
+    args = parser.parse_args()
+
+    index = SolutionIndex(args.index)
+    if args.batchResults is not None:
+        print(f"Added {index.add_batch_results(args.batchResults)} puzzles to the index")
+        index.save(args.index)
+    if args.lookup is not None:
+        image_paths = sorted(glob.glob(args.lookup))
+        for image_path, pieces in zip(image_paths, index.lookup_many([ImageProcessor(image_path).image for image_path in image_paths])):
+            print(image_path, "hit" if pieces is not None else "miss")
+    print(index.get_stats())
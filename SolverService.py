@@ -0,0 +1,361 @@
+from __future__ import annotations
+import argparse
+import io
+import json
+import math
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from multiprocessing import Pool, TimeoutError
+import cv2 as cv
+import numpy as np
+from ImageProcessor import ImageProcessor
+from StatsHandler import StatsHandler
+from TangramSolver import TangramSolver
+from ResultCache import ResultCache
+from PieceMaskLibrary import PIECE_MASK_LIBRARY
+import settings
+
+
+PNG_CONTENT_TYPE = "image/png"
+NPY_CONTENT_TYPE = "application/x-npy"
+
+_worker_result_cache: ResultCache | None = None
+
+
+def init_worker(result_cache_directory: str | None) -> None:
+    """
+    Warms a worker process up before it receives any request: loads the library of piece masks and builds the pieces
+    once, so that the first request is as fast as the next ones
+    :param result_cache_directory: directory of the result cache shared by the workers, None to disable it
+    """
+    global _worker_result_cache
+    if not PIECE_MASK_LIBRARY.is_built():
+        PIECE_MASK_LIBRARY.load_or_build()
+    TangramSolver.get_available_pieces()
+    _worker_result_cache = ResultCache(result_cache_directory) if result_cache_directory is not None else None
+
+def decode_image(body: bytes, content_type: str) -> np.ndarray:
+    """
+    Reads the image of a request
+    :param body: bytes of the image, encoded as a png (or any format read by opencv) or as a .npy array
+    :param content_type: NPY_CONTENT_TYPE for a .npy array, an image format otherwise
+    :return: the grayscale or BGR image
+    """
+    if content_type == NPY_CONTENT_TYPE:
+        image = np.load(io.BytesIO(body), allow_pickle=False)
+        if image.ndim not in (2, 3):
+            raise ValueError(f"the array must have 2 or 3 dimensions, not {image.ndim}")
+        return np.clip(image, 0, 255).astype(np.uint8)
+    image = cv.imdecode(np.frombuffer(body, dtype=np.uint8), cv.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError("the image cannot be decoded")
+    return image
+
+def solve_request(body: bytes, content_type: str, time_budget: float) -> dict:
+    """
+    Solves the puzzle of a request, in a worker process
+    :param body: bytes of the image of the puzzle
+    :param content_type: format of the image, see decode_image
+    :param time_budget: maximum duration of the search in seconds, the best partial placement being given afterwards
+    :return: the json dictionary of the result, as saved by the StatsHandler in the infos.json file
+    """
+    image_processor = ImageProcessor(image=decode_image(body, content_type))
+    whole_image = image_processor.get_whole_image()
+    stats_handler = StatsHandler("request", _worker_result_cache)
+    if not stats_handler.load_cached_result(whole_image):
+        start_time = time.time()
+        solver = TangramSolver(image_processor.image, time_budget=time_budget)
+        used_pieces = image_processor.get_pieces_in_whole_image(solver.partial_node.current_state.used_pieces) if solver.status != "unsolvable" else None
+        stats_handler.set_result(time.time() - start_time, len(image_processor.corners), used_pieces, solver.search_stats, solver.status)
+        stats_handler.cache_result(whole_image)
+    return stats_handler.to_json()
+
+
+class SolverService:
+    """
+    Local HTTP service solving the puzzles sent to it on a pool of worker processes kept warm between the requests.
+    POST /solve takes a png image (or a .npy array with the application/x-npy content type) and gives the json of the
+    result, GET /metrics gives the counters of the service and GET /health tells if it is up. The requests beyond the
+    workers wait in a bounded queue, and are refused with a 503 status once it is full.
+
+    Attributes:
+        host:               address the service listens on
+        port:               port the service listens on
+        workers_number:     number of worker processes solving the puzzles, the number of cpus by default
+        max_queue_size:     maximum number of requests waiting for a worker
+        timeout:            maximum duration of a search in seconds, after which the best partial placement is given
+        result_cache_directory: directory of the result cache shared by the workers, None to disable it
+        pool:               pool of the worker processes
+        server:             http server, running once start is called
+        lock:               lock of the counters, shared by the threads of the requests
+        pending_number:     number of requests being solved or waiting for a worker, a request answered with a 504
+                            status being counted until its worker ends
+        requests_number:    number of requests received
+        completed_number:   number of requests answered with a result
+        rejected_number:    number of requests refused because the queue was full
+        timeouts_number:    number of requests whose worker did not answer in time
+        errors_number:      number of requests answered with an error
+        latencies:          durations in seconds of the last requests answered with a result
+    """
+    def __init__(self, host: str = settings.SERVICE_HOST, port: int = settings.SERVICE_PORT, workers_number: int = settings.SERVICE_WORKERS_NUMBER,
+                 max_queue_size: int = settings.SERVICE_MAX_QUEUE_SIZE, timeout: float = settings.SERVICE_TIMEOUT, result_cache_directory: str = None):
+        self.host: str = host
+        self.port: int = port
+        self.workers_number: int = workers_number if workers_number is not None else os.cpu_count()
+        self.max_queue_size: int = max_queue_size
+        self.timeout: float = timeout
+        self.result_cache_directory: str | None = result_cache_directory
+        self.pool = None
+        self.server: ThreadingHTTPServer | None = None
+        self.lock: threading.Lock = threading.Lock()
+        self.pending_number: int = 0
+        self.requests_number: int = 0
+        self.completed_number: int = 0
+        self.rejected_number: int = 0
+        self.timeouts_number: int = 0
+        self.errors_number: int = 0
+        self.latencies: deque[float] = deque(maxlen=settings.SERVICE_LATENCY_WINDOW)
+
+    def start(self) -> None:
+        """
+        Starts the worker processes, which warm up before taking any request, then opens the http server
+        """
+        self.pool = Pool(self.workers_number, initializer=init_worker, initargs=(self.result_cache_directory,))
+        self.server = ThreadingHTTPServer((self.host, self.port), self.get_handler_class())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+    def serve_forever(self) -> None:
+        """
+        Answers the requests until the service is stopped
+        """
+        self.server.serve_forever()
+
+    def stop(self) -> None:
+        """
+        Closes the http server and stops the worker processes
+        """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+
+    def solve(self, body: bytes, content_type: str, timeout: float) -> tuple[int, dict]:
+        """
+        Solves the puzzle of a request on the pool, if the queue is not full
+        :param body: bytes of the image of the puzzle
+        :param content_type: format of the image, see decode_image
+        :param timeout: maximum duration of the search in seconds
+        :return: the http status and the json dictionary of the response
+        """
+        with self.lock:
+            self.requests_number += 1
+            if self.pending_number >= self.workers_number + self.max_queue_size:
+                self.rejected_number += 1
+                return 503, {"error": "the queue of the service is full"}
+            self.pending_number += 1
+        start_time = time.time()
+        # the slot is freed when the worker ends, not when the request is answered, so that the workers still busy
+        # with timed out requests keep counting in the queue
+        async_result = self.pool.apply_async(solve_request, (body, content_type, timeout), callback=self.release_slot, error_callback=self.release_slot)
+        try:
+            # the search stops by itself after its time budget, the grace period covers the image processing and the queue
+            result = async_result.get(timeout + settings.SERVICE_TIMEOUT_GRACE)
+        except TimeoutError:
+            with self.lock:
+                self.timeouts_number += 1
+            return 504, {"error": f"no result after {timeout + settings.SERVICE_TIMEOUT_GRACE}s"}
+        except (ValueError, cv.error) as error:  # image which cannot be read, or without any shape
+            with self.lock:
+                self.errors_number += 1
+            return 400, {"error": str(error)}
+        except Exception as error:  # any other failure of the worker still gets an answer
+            with self.lock:
+                self.errors_number += 1
+            return 500, {"error": f"{type(error).__name__}: {error}"}
+        with self.lock:
+            self.completed_number += 1
+            self.latencies.append(time.time() - start_time)
+        return 200, result
+
+    def release_slot(self, _) -> None:
+        """
+        Frees the slot of a request once its worker has ended, called by the pool with the result or the error
+        """
+        with self.lock:
+            self.pending_number -= 1
+
+    def get_metrics(self) -> dict:
+        """
+        Gives the counters of the service and the latency of the last requests
+        :return: the json dictionary of the metrics
+        """
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return {
+                "requests": self.requests_number,
+                "completed": self.completed_number,
+                "rejected": self.rejected_number,
+                "timeouts": self.timeouts_number,
+                "errors": self.errors_number,
+                "inFlight": min(self.pending_number, self.workers_number),
+                "queueDepth": max(self.pending_number - self.workers_number, 0),
+                "maxQueueSize": self.max_queue_size,
+                "workers": self.workers_number,
+                "latency": {
+                    "count": len(latencies),
+                    "mean": sum(latencies) / len(latencies) if latencies else None,
+                    "p50": latencies[len(latencies) // 2] if latencies else None,
+                    "p95": latencies[min(int(len(latencies) * .95), len(latencies) - 1)] if latencies else None,
+                    "max": latencies[-1] if latencies else None
+                }
+            }
+
+    def get_handler_class(self) -> type:
+        """
+        Gives the class handling the http requests of this service
+        :return: the request handler class
+        """
+        service = self
+
+        class SolverRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                path = urllib.parse.urlparse(self.path).path
+                if path == "/metrics":
+                    self.send_json(200, service.get_metrics())
+                elif path == "/health":
+                    self.send_json(200, {"status": "ok"})
+                else:
+                    self.send_json(404, {"error": f"unknown path {path}"})
+
+            def do_POST(self) -> None:
+                url = urllib.parse.urlparse(self.path)
+                if url.path != "/solve":
+                    self.send_json(404, {"error": f"unknown path {url.path}"})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                if length == 0 or length > settings.SERVICE_MAX_REQUEST_SIZE:
+                    self.send_json(413 if length > 0 else 400, {"error": f"the body must hold an image of at most {settings.SERVICE_MAX_REQUEST_SIZE} bytes"})
+                    return
+                body = self.rfile.read(length)
+                query = urllib.parse.parse_qs(url.query)
+                try:
+                    timeout = float(query["timeout"][0]) if "timeout" in query else service.timeout
+                except ValueError:
+                    timeout = math.nan
+                if not math.isfinite(timeout) or timeout <= 0:
+                    self.send_json(400, {"error": "the timeout must be a positive number of seconds"})
+                    return
+                timeout = min(timeout, service.timeout)
+                status, response = service.solve(body, self.headers.get("Content-Type", PNG_CONTENT_TYPE), timeout)
+                self.send_json(status, response)
+
+            def send_json(self, status: int, response: dict) -> None:
+                data = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 503:
+                    self.send_header("Retry-After", "1")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args) -> None:
+                pass  # the metrics replace the log of each request
+
+        return SolverRequestHandler
+
+
+class SolverClient:
+    """
+    Client of a SolverService running locally
+
+    Attributes:
+        url:        base url of the service, like http://127.0.0.1:8765
+        timeout:    maximum duration in seconds of a request
+    """
+    def __init__(self, url: str = f"http://{settings.SERVICE_HOST}:{settings.SERVICE_PORT}", timeout: float = settings.SERVICE_TIMEOUT + 2 * settings.SERVICE_TIMEOUT_GRACE):
+        self.url: str = url.rstrip("/")
+        self.timeout: float = timeout
+
+    def request(self, path: str, body: bytes = None, content_type: str = None) -> tuple[int, dict]:
+        """
+        Sends a request to the service
+        :param path: path of the endpoint, with its query
+        :param body: body of a POST request, None for a GET request
+        :param content_type: content type of the body
+        :return: the http status and the json dictionary of the response
+        """
+        http_request = urllib.request.Request(self.url + path, data=body, headers={"Content-Type": content_type} if content_type is not None else {})
+        try:
+            with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as error:
+            return error.code, json.load(error)
+
+    def solve_image_path(self, image_path: str, timeout: float = None) -> tuple[int, dict]:
+        """
+        Solves the puzzle of an image file
+        :param image_path: path of the image of the puzzle
+        :param timeout: maximum duration of the search in seconds, the timeout of the service by default
+        :return: the http status and the json dictionary of the result
+        """
+        with open(image_path, "rb") as file:
+            return self.solve_bytes(file.read(), PNG_CONTENT_TYPE, timeout)
+
+    def solve_array(self, image: np.ndarray, timeout: float = None) -> tuple[int, dict]:
+        """
+        Solves the puzzle of an image already loaded
+        :param image: grayscale or BGR image of the puzzle
+        :param timeout: maximum duration of the search in seconds, the timeout of the service by default
+        :return: the http status and the json dictionary of the result
+        """
+        buffer = io.BytesIO()
+        np.save(buffer, image, allow_pickle=False)
+        return self.solve_bytes(buffer.getvalue(), NPY_CONTENT_TYPE, timeout)
+
+    def solve_bytes(self, body: bytes, content_type: str, timeout: float = None) -> tuple[int, dict]:
+        """
+        Solves the puzzle of an encoded image
+        :param body: bytes of the image
+        :param content_type: PNG_CONTENT_TYPE for any image format, NPY_CONTENT_TYPE for a .npy array
+        :param timeout: maximum duration of the search in seconds, the timeout of the service by default
+        :return: the http status and the json dictionary of the result
+        """
+        return self.request("/solve" + (f"?timeout={timeout}" if timeout is not None else ""), body, content_type)
+
+    def get_metrics(self) -> dict:
+        """
+        Gives the metrics of the service
+        :return: the json dictionary of the metrics, see SolverService.get_metrics
+        """
+        return self.request("/metrics")[1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local service solving the tangram puzzles sent over http')
+    parser.add_argument('--host', type=str, default=settings.SERVICE_HOST, help='Address the service listens on')
+    parser.add_argument('--port', type=int, default=settings.SERVICE_PORT, help='Port the service listens on')
+    parser.add_argument('--workers', type=int, default=settings.SERVICE_WORKERS_NUMBER, help='Number of worker processes solving the puzzles')
+    parser.add_argument('--maxQueueSize', type=int, default=settings.SERVICE_MAX_QUEUE_SIZE, help='Maximum number of requests waiting for a worker, the next ones are refused')
+    parser.add_argument('--timeout', type=float, default=settings.SERVICE_TIMEOUT, help='Maximum duration of a search in seconds, the best partial placement being given afterwards')
+    parser.add_argument('--resultCache', type=str, default=None, help='Directory of the result cache shared by the workers')
+    args = parser.parse_args()
+
+    service = SolverService(args.host, args.port, args.workers, args.maxQueueSize, args.timeout, args.resultCache)
+    service.start()
+    print(f"Solver service listening on http://{service.host}:{service.port} with {service.workers_number} workers")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
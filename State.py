@@ -1,6 +1,9 @@
 from __future__ import annotations
-from copy import deepcopy
+from hashlib import blake2b
+from typing import Iterator
 from utils import *
+from placements import Placement, get_candidate_placements
+from MoveOrdering import MoveOrdering, get_move_ordering
 
 
 class State:
@@ -9,73 +12,150 @@ class State:
 
     Attributes:
         available_pieces:            All the pieces remaining to complete the puzzle
-        working_pieces:              Used to store the pieces that we move, so the available_pieces one stay at the origin
         used_pieces:                 Pieces already placed in this configuration, used to reconstruct the solution
-        current_working_piece_index: Index of the piece we are currently trying to place of the puzzle
-        current_corner_index:        Index of the corner on which we are trying to place the current working piece
-        image:                       Image of the current puzzle configuration
-        corners:                     List of the corners of the image_processor
+        candidate_placements:        Lazy generator of the placements still to try from this state
+        move_ordering:               Order in which the pieces and the corners are tried, shared with the next states
+        image:                       Image of the current puzzle configuration, packed if PACKED_STATE_IMAGES is set
+        sub_puzzles:                 Regions of the image_processor still to be filled
+        corners:                     List of the corners of the image_processor, computed once per state
+        configuration_key:           Hash of the remaining pieces and of the image, computed on demand
+        arrangement_key:             Hash of the configuration and of the placements of the used pieces, computed on demand
+        scale:                       Scale of the pieces, see Piece.scale, below 1 in the coarse search
+        search_stats:                Counters and timers of the solver searching this state, shared with the next states
     """
-    def __init__(self, available_pieces, image, used_pieces=None):
+    def __init__(self, available_pieces, image, used_pieces=None, parent_sub_puzzles=None, changed_box=None, move_ordering=None, scale=1,
+                 search_stats=None):
         self.available_pieces: list[Piece] = available_pieces
-        self.working_pieces: list[Piece] = deepcopy(available_pieces)
+        self.search_stats: SearchStats = search_stats if search_stats is not None else DISABLED_SEARCH_STATS
+        self.scale: float = scale
         self.used_pieces: list[Piece] = used_pieces if used_pieces is not None else []
-        self.current_working_piece_index: int = 0
-        self.current_corner_index: int = 0
-        self.image: np.ndarray = image
-        self.corners: list[Corner] = get_corners(self.image)
+        self.candidate_placements: Iterator[Placement] | None = None
+        self.move_ordering: MoveOrdering = move_ordering if move_ordering is not None else get_move_ordering(MOVE_ORDERING)
+        if PACKED_STATE_IMAGES and not isinstance(image, PackedImage):
+            image = PackedImage.from_image(image)
+        self.image: np.ndarray | PackedImage = image
+        start_time = self.search_stats.start_timer()
+        if parent_sub_puzzles is None:
+            self.sub_puzzles: list[SubPuzzle] = get_sub_puzzles(get_image_region(self.image), scale=scale)
+        else:  # only the regions around the last piece placed changed since the parent state
+            self.sub_puzzles: list[SubPuzzle] = update_sub_puzzles(self.image, parent_sub_puzzles, changed_box, scale)
+        self.search_stats.stop_timer("getCorners", start_time)
+        self.corners: list[Corner] = [corner for sub_puzzle in self.sub_puzzles for corner in sub_puzzle.corners]
+        self.configuration_key: bytes | None = None
+        self.arrangement_key: bytes | None = None
 
     def get_next_state(self) -> State:
         """
         Gets the next state of the current puzzle by placing a new piece on the image_processor.
         :return: a new State if another piece can be placed on the current puzzle configuration, None otherwise
         """
-        next_state = None
-
         if len(self.corners) == 0:
             return None
 
-        while next_state is None and self.current_working_piece_index < len(self.working_pieces):
-            working_piece = self.working_pieces[self.current_working_piece_index]
-            shape_corner = self.corners[self.current_corner_index]
+        if self.candidate_placements is None:
+            self.candidate_placements = get_candidate_placements(self)
 
-            if approx_eq(abs(shape_corner.angle_between_edges), abs(working_piece.corners[0].angle_between_edges)):
-                is_piece_accepted, candidate_image = is_piece_accepted_at_shape_corner(self.image.copy(), working_piece, shape_corner)
+        for placement in self.candidate_placements:
+            piece = self.get_placed_piece(placement)
+            self.search_stats.count_candidate(piece.name)
+            is_piece_accepted, candidate_image = is_piece_accepted_at_shape_corner(self.image, piece, self.corners[placement.shape_corner_index], self.corners,
+                                                                                   self.search_stats)
+            if is_piece_accepted:
+                return self.generate_next_state(candidate_image, piece, placement.piece_index)
+        return None
 
-                if is_piece_accepted:
-                    next_state = self.generate_next_state(candidate_image, working_piece)
+    def get_placed_piece(self, placement: Placement) -> Piece:
+        """
+        Gives the piece oriented as described by a placement, before it is rotated and placed on the shape
+        :param placement: the placement
+        :return: a copy of the piece with the corner of the placement as first corner
+        """
+        piece = self.available_pieces[placement.piece_index].copy()
+        if placement.is_flipped:
+            piece.flip()
+        for _ in range(placement.corner_shift):
+            piece.shift_corners()
+        return piece
 
-            working_piece.shift_corners()
+    def is_feasible(self) -> bool:
+        """
+        Tells if the uncovered regions of the shape may still be filled by the remaining pieces, looking at their areas.
+        The slivers too small to be sub puzzles are looked for around the last piece placed, where they appear.
+        :return: False if the configuration cannot lead to a solution, True otherwise
+        """
+        boxes = [sub_puzzle.bounding_box for sub_puzzle in self.sub_puzzles]
+        if len(self.used_pieces) > 0:
+            boxes.append(self.used_pieces[-1].get_bounding_box())
+        if len(boxes) == 0:
+            return True
+        boxes = np.array(boxes)
+        x, y = max(int(boxes[:, 0].min()), 0), max(int(boxes[:, 1].min()), 0)
+        right = min(int((boxes[:, 0] + boxes[:, 2]).max()), self.image.shape[1])
+        bottom = min(int((boxes[:, 1] + boxes[:, 3]).max()), self.image.shape[0])
+        return can_pieces_fill_areas(get_uncovered_areas(self.image, (x, y, right - x, bottom - y)), self.available_pieces)
 
-            if working_piece.corners_shifts_counter % working_piece.max_corners_shifts == 0:
-                if working_piece.name == "Parallelogram" and not working_piece.is_flipped:
-                    working_piece.flip()
-                else:
-                    if working_piece.name == "Parallelogram" and working_piece.is_flipped:
-                        working_piece.flip()
-                    self.current_corner_index += 1
+    def get_configuration_key(self) -> bytes:
+        """
+        Gives a key identifying the configuration of the puzzle, whatever the order in which the pieces were placed
+        :return: the hash of the multiset of the remaining pieces and of the image
+        """
+        if self.configuration_key is None:
+            key = blake2b(digest_size=16)
+            key.update(",".join(sorted(piece.name for piece in self.available_pieces)).encode())
+            key.update(str(self.image.shape).encode())
+            key.update(self.image.tobytes())
+            self.configuration_key = key.digest()
+        return self.configuration_key
 
-            if self.current_corner_index >= len(self.corners):
-                self.current_corner_index = 0
-                self.current_working_piece_index += 1
+    def get_arrangement_key(self) -> bytes:
+        """
+        Gives a key identifying the configuration of the puzzle and the way its pieces were placed, whatever their order,
+        the swaps of identical pieces and their symmetries. The vertexes are snapped to cells whose diagonal is below
+        SAME_PLACEMENT_MAX_DISTANCE, so that two states of the same key lead to the same solutions, see are_same_solutions
+        :return: the hash of the configuration key and of the multiset of the placed pieces
+        """
+        if self.arrangement_key is None:
+            cell_size = SAME_PLACEMENT_MAX_DISTANCE / 2
+            placements = sorted(
+                (piece.name, sorted(tuple(cell) for cell in np.floor(piece.get_points_array() / cell_size).astype(int).tolist()))
+                for piece in self.used_pieces
+            )
+            key = blake2b(self.get_configuration_key(), digest_size=16)
+            key.update(repr(placements).encode())
+            self.arrangement_key = key.digest()
+        return self.arrangement_key
 
-        return next_state
+    def is_piece_already_tried(self, piece_index: int) -> bool:
+        """
+        Tells if a piece of the same type comes before this one in the available pieces, in which case all its
+        placements have already been tried from this state
+        :param piece_index: index of the piece in the available pieces
+        :return: True if an identical piece has already been tried, False otherwise
+        """
+        piece_name = self.available_pieces[piece_index].name
+        return any(piece.name == piece_name for piece in self.available_pieces[:piece_index])
 
-    def generate_next_state(self, image: np.ndarray, piece_placed: Piece) -> State:
+    def generate_next_state(self, image: np.ndarray | PackedImage, piece_placed: Piece, piece_index: int) -> State:
         """
         Used to pass by value the new state attributes
         :param image: image_processor with the new piece placed
         :param piece_placed: piece placed
+        :param piece_index: index of the piece placed in the available pieces
         :return: the new State
         """
         new_available_pieces = self.available_pieces.copy()
-        new_available_pieces.pop(self.current_working_piece_index)
+        new_available_pieces.pop(piece_index)
         new_used_pieces = self.used_pieces.copy()
-        new_used_pieces.append(deepcopy(piece_placed))
+        new_used_pieces.append(piece_placed.copy())
         return State(
             available_pieces=new_available_pieces,
             image=image,
-            used_pieces=new_used_pieces
+            used_pieces=new_used_pieces,
+            parent_sub_puzzles=self.sub_puzzles,
+            changed_box=piece_placed.get_bounding_box(),
+            move_ordering=self.move_ordering,
+            scale=self.scale,
+            search_stats=self.search_stats
         )
 
 
@@ -1,6 +1,8 @@
+from __future__ import annotations
 import json
-from utils import draw_piece_in_image
+from utils import draw_piece_in_image, get_signed_area
 from elements import *
+from ResultCache import ResultCache
 import cv2 as cv
 import os
 
@@ -14,8 +16,15 @@ class StatsHandler:
         puzzle_name:    name of the image file, used to store all
         stats:          statistics about solving time and number of corners
         solution_pieces:       pieces of the solution and the
+        solved:         True if the puzzle has been solved
+        status:         "solved", "incomplete" if the solver ran out of budget, the pieces being then the best partial
+                        placement, or "unsolvable", see TangramSolver.status
+        search_stats:   counters and timers of the search given by the solver, None if not collected
+        all_solutions:  pieces of all the distinct solutions, as saved for the solution, when the solver enumerated them
+        result_cache:   cache of the results of the solver in which the result is looked up and stored, None to disable it
+        cache_key:      key of the puzzle image in the result cache
     """
-    def __init__(self, image_path: str):
+    def __init__(self, image_path: str, result_cache: ResultCache = None):
         self.image_path: str = image_path
         self.puzzle_name: str = image_path.split("/")[-1].split('.')[0] if "/" in image_path else image_path.split("\\")[-1].split('.')[0]
         self.stats: dict[str, int] = {
@@ -23,42 +32,181 @@ class StatsHandler:
             "cornersNumber": 0
         }
         self.solution_pieces: list[dict] =  []
+        self.solved: bool = False
+        self.status: str = "unsolvable"
+        self.search_stats: dict | None = None
+        self.all_solutions: list[list[dict]] = []
+        self.result_cache: ResultCache | None = result_cache
+        self.cache_key: str | None = None
 
-    def save_data(self, solve_duration: float, corners_number: int, used_pieces: list[Piece], puzzle_image: np.ndarray) -> None:
+    def save_data(self, solve_duration: float, corners_number: int, used_pieces: list[Piece], puzzle_image: np.ndarray,
+                  search_stats: dict = None, status: str = None) -> None:
         """
         Saves all the data of the solving process
         :param solve_duration: time that the program took to solve the puzzle
         :param corners_number: number of corners of the original tangram shadow
-        :param used_pieces: list of all the pieces used in the solution
+        :param used_pieces: list of all the pieces used in the solution, or in the best partial placement if incomplete
         :param puzzle_image: origin image of the puzzle shadow
+        :param search_stats: counters and timers of the search, see TangramSolver.search_stats
+        :param status: status of the solver, see set_result
         """
-        self.stats["time"] = solve_duration
-        self.stats["cornersNumber"] = corners_number
-        self.parse_pieces_solution(used_pieces)
+        self.set_result(solve_duration, corners_number, used_pieces, search_stats, status)
         self.save_stats()
         self.save_solution_steps(used_pieces, puzzle_image)
 
+    def set_result(self, solve_duration: float, corners_number: int, used_pieces: list[Piece] | None, search_stats: dict = None,
+                   status: str = None) -> None:
+        """
+        Stores the result of the solver
+        :param solve_duration: time that the program took to solve the puzzle
+        :param corners_number: number of corners of the original tangram shadow
+        :param used_pieces: list of all the pieces used in the solution, or in the best partial placement if incomplete,
+                            None if the puzzle has no solution
+        :param search_stats: counters and timers of the search, see TangramSolver.search_stats
+        :param status: status of the solver, see TangramSolver.status, "solved" if pieces are given and "unsolvable"
+                       otherwise by default
+        """
+        self.search_stats = search_stats
+        self.stats["time"] = solve_duration
+        self.stats["cornersNumber"] = corners_number
+        self.status = status if status is not None else "solved" if used_pieces is not None else "unsolvable"
+        self.solved = self.status == "solved"
+        self.parse_pieces_solution(used_pieces if used_pieces is not None else [])
+
+    def load_cached_result(self, puzzle_image: np.ndarray) -> bool:
+        """
+        Looks up the result of the puzzle in the result cache, to skip the solver if the same image was already solved
+        :param puzzle_image: whole image of the puzzle, see ImageProcessor.get_whole_image
+        :return: True if the result was in the cache and has been loaded, False otherwise
+        """
+        if self.result_cache is None:
+            return False
+        self.cache_key = ResultCache.get_key(puzzle_image)
+        result = self.result_cache.get(self.cache_key)
+        if result is None:
+            return False
+        self.solved = result["solved"]
+        self.status = result.get("status", "solved" if self.solved else "unsolvable")
+        self.stats = result["stats"]
+        self.solution_pieces = result["pieces"]
+        self.search_stats = result.get("search")
+        return True
+
+    def cache_result(self, puzzle_image: np.ndarray) -> None:
+        """
+        Stores the result of the solver in the result cache, except an incomplete result which depends on the budget
+        :param puzzle_image: whole image of the puzzle, see ImageProcessor.get_whole_image
+        """
+        if self.result_cache is None or self.status == "incomplete":
+            return
+        if self.cache_key is None:
+            self.cache_key = ResultCache.get_key(puzzle_image)
+        result = {"solved": self.solved}
+        result.update(self.to_json())
+        self.result_cache.put(self.cache_key, result)
+
+    def get_used_pieces(self) -> list[Piece] | None:
+        """
+        Gives the pieces of the solution stored, used when the result comes from the cache
+        :return: the pieces of the solution, None if the puzzle has no solution
+        """
+        return self.build_pieces(self.get_solution_from_json(self.solution_pieces)) if self.solved else None
+
+    def set_all_solutions(self, solutions: list[list[Piece]]) -> None:
+        """
+        Stores all the distinct solutions enumerated by the solver, saved with the solution
+        :param solutions: pieces of each solution, see TangramSolver.solutions
+        """
+        self.all_solutions = [self.get_pieces_json(pieces) for pieces in solutions]
+
     def parse_pieces_solution(self, used_pieces: list[Piece]) -> None:
         """
         Parses all the information of the pieces in order to store them as json
         :param used_pieces: list of the pieces used in the solution
         """
-        for piece in used_pieces:
-            self.solution_pieces.append({
+        self.solution_pieces = self.get_pieces_json(used_pieces)
+
+    @staticmethod
+    def get_pieces_json(pieces: list[Piece]) -> list[dict]:
+        """
+        Gives the json of pieces, read by get_solution_from_json
+        :param pieces: list of pieces
+        :return: the json dictionary of each piece
+        """
+        pieces_json = []
+        for piece in pieces:
+            pieces_json.append({
                 "type": piece.name,
                 "color": piece.color,
                 "points": [str(point) for point in piece.get_points_in_image()],
                 "rotation": piece.rotation
             })
+        return pieces_json
 
-    def save_stats(self) -> None:
+    @staticmethod
+    def get_solution_from_json(pieces_json: list[dict]) -> list[tuple[str, np.ndarray]]:
         """
-        Saves the solution of the puzzle with some statistics
+        Reads the pieces saved by parse_pieces_solution, used to reuse a solution saved in an infos.json file or in the
+        results of the batch solver
+        :param pieces_json: list of the pieces as saved in the json
+        :return: the name of each piece and its points in the image, one row (x, y) per corner
+        """
+        solution = []
+        for piece_json in pieces_json:
+            points = [[float(coordinate.split(":")[1]) for coordinate in point.split(", ")] for point in piece_json["points"]]
+            solution.append((piece_json["type"], np.array(points)))
+        return solution
+
+    @staticmethod
+    def build_pieces(solution: list[tuple[str, np.ndarray]]) -> list[Piece]:
         """
-        final_json = {
+        Builds the pieces of a solution from their points, with the colors of the pieces of the solver, used to reuse a
+        solution read by get_solution_from_json or moved by the solution index
+        :param solution: pieces of the solution, as (piece name, points of the piece in the image)
+        :return: the pieces, in the same order
+        """
+        from TangramSolver import TangramSolver
+        available_pieces = TangramSolver.get_available_pieces()
+        pieces = []
+        for name, points in solution:
+            piece = next(available_piece for available_piece in available_pieces if available_piece.name == name)
+            available_pieces.remove(piece)
+            if isinstance(piece, Parallelogram) and np.sign(get_signed_area(points)) != np.sign(get_signed_area(piece.coordinates)):
+                piece.flip()
+            edges_lengths = np.linalg.norm(np.roll(points, -1, axis=0) - points, axis=1)
+            for _ in range(piece.max_corners_shifts):  # the points may start from another corner, the masks depend on it
+                if np.allclose(np.linalg.norm(np.roll(piece.coordinates, -1, axis=0) - piece.coordinates, axis=1), edges_lengths, rtol=.05):
+                    break
+                piece.shift_corners()
+            piece.position_in_image = Point(*points[0].tolist())
+            piece.coordinates = points - points[0]
+            piece.compute_edges()
+            first_edge = piece.coordinates[1]
+            piece.rotation = float(np.degrees(np.arctan2(first_edge[1], first_edge[0])))
+            pieces.append(piece)
+        return pieces
+
+    def to_json(self) -> dict:
+        """
+        Gives the solution of the puzzle with some statistics, as saved in the infos.json file
+        :return: the json dictionary of the solution
+        """
+        solution_json = {
+            "status": self.status,
             "stats": self.stats,
             "pieces": self.solution_pieces
         }
+        if self.search_stats is not None:
+            solution_json["search"] = self.search_stats
+        if len(self.all_solutions) > 0:
+            solution_json["solutions"] = self.all_solutions
+        return solution_json
+
+    def save_stats(self) -> None:
+        """
+        Saves the solution of the puzzle with some statistics
+        """
+        final_json = self.to_json()
         os.makedirs(os.path.dirname(self.puzzle_name + "/infos.json"), exist_ok=True)
         with open(self.puzzle_name + "/infos.json", "w") as file:
             json.dump(final_json, file, indent=4)
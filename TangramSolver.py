@@ -1,7 +1,15 @@
+import time
 import numpy as np
 from State import State
+from MoveOrdering import get_move_ordering
 from Node import Node
+from TranspositionTable import TranspositionTable
+from PieceMaskLibrary import PIECE_MASK_LIBRARY
 from elements import *
+from utils import draw_pieces_masks_in_image, are_same_solutions
+from SearchStats import SearchStats
+from SearchEvent import SearchEvent
+import settings
 
 
 class TangramSolver:
@@ -10,36 +18,358 @@ class TangramSolver:
 
     Attributes:
         puzzle_shadow:  black and white image of the shape to solve
-        solution_node:  solution of the puzzle
+        workers_number: number of processes exploring the search tree, 1 for a single-threaded search
+        stop_event:     event which cancels the search once set, by another thread or when several solvers explore the
+                        same tree, the search then stops as incomplete
+        time_budget:    maximum duration of the search in seconds, None for no limit
+        node_budget:    maximum number of nodes expanded by the search, None for no limit
+        deadline:       time at which the time budget runs out, None for no limit
+        move_ordering:  name of the order in which the pieces and the corners are tried, see MoveOrdering
+        engine:         "raster" to place the pieces on the pixels of the image, "exact" to use the exact geometry of
+                        the lattice, "coarse" to search on a downscaled image first and refine its solution, see
+                        CoarseSolver, the raster search being used when these engines find no solution
+        solution_index: index of the shapes already solved, see SolutionIndex, the search only runs when the shape is not
+                        found in it and its solution is then added to it
+        is_index_hit:   True if the solution was found in the solution index
+        engine_fallback:    reason why the raster search was run instead of the exact or the coarse engine, None if it was not
+        transposition_table:    configurations proven dead during the search, and arrangements fully explored when the
+                                solutions are enumerated, with its hits/misses/evictions counters
+        pruned_states_number:   number of states pruned because their regions cannot be filled by the remaining pieces
+        expanded_nodes_number:  number of nodes added to the search tree, the coarse search and its refinement or the
+                                placements tried by the exact engine included
+        backtracked_nodes_number:   number of nodes left because no more piece could be placed from them
+        max_depth:      largest number of pieces placed in a node of the search
+        collect_stats:  True to measure the search with search_measures
+        search_measures:    counters and timers of this search, filled by its states if collect_stats, see SearchStats
+        search_stats:   counters of the search, completed with the counters and timers of search_measures if collected
+        solution_node:  solution of the puzzle, the first one found when all the solutions are enumerated
+        enumerate_solutions:    True to go on searching after the first solution, until all the distinct solutions
+                                are found, see are_same_solutions. The raster search is then always used
+        max_solutions_number:   number of distinct solutions after which the enumeration stops, None for no limit
+        solutions:      pieces of the distinct solutions found, in the order they were found
+        status:         "solved", "incomplete" if the search stopped on a budget or a cancellation before exploring
+                        the whole tree, "unsolvable" if the whole tree was explored without finding a solution
+        is_incomplete:  True if the search stopped on a budget or a cancellation, or on the maximum number of solutions
+                        when enumerating them, some solutions being then possibly missing
+        partial_node:   node with the highest coverage (area of the pieces placed) found so far, the best partial
+                        placement when the search is incomplete
+        partial_coverage:   area of the pieces placed in the partial node
+        root_state:     state from which the search starts, the empty puzzle if None
+
+    The puzzle is solved by the constructor, unless lazy is True: the search then only runs while the events of
+    solve_steps are read.
     """
-    def __init__(self, puzzle_shadow: np.ndarray):
+    def __init__(self, puzzle_shadow: np.ndarray, workers_number: int = 1, root_state: State = None, stop_event=None,
+                 move_ordering: str = settings.MOVE_ORDERING, engine: str = settings.SOLVER_ENGINE, solution_index=None,
+                 collect_stats: bool = settings.COLLECT_SEARCH_STATS, time_budget: float = settings.SOLVER_TIME_BUDGET,
+                 node_budget: int = settings.SOLVER_NODE_BUDGET, lazy: bool = False, enumerate_solutions: bool = False,
+                 max_solutions_number: int = settings.MAX_SOLUTIONS_NUMBER):
         self.puzzle_shadow = puzzle_shadow
-        self.solution_node = self.solve_tangram()
+        self.workers_number = workers_number
+        self.stop_event = stop_event
+        self.time_budget = time_budget
+        self.node_budget = node_budget
+        self.deadline = time.time() + time_budget if time_budget is not None else None
+        self.move_ordering = move_ordering
+        self.engine = engine
+        self.solution_index = solution_index
+        self.is_index_hit = False
+        self.engine_fallback: str | None = None
+        self.transposition_table = TranspositionTable()
+        self.pruned_states_number = 0
+        self.expanded_nodes_number = 0
+        self.backtracked_nodes_number = 0
+        self.max_depth = 0
+        self.collect_stats = collect_stats
+        self.search_measures = SearchStats()
+        self.is_incomplete = False
+        self.partial_node = None
+        self.partial_coverage = -1
+        self.root_state = root_state
+        self.solution_node = None
+        self.enumerate_solutions = enumerate_solutions
+        self.max_solutions_number = max_solutions_number
+        self.solutions: list[list[Piece]] = []
+        self.status: str | None = None
+        self.search_stats: dict = {}
+        if not PIECE_MASK_LIBRARY.is_built():
+            PIECE_MASK_LIBRARY.load_or_build()
+        if not lazy:
+            for _ in self.solve_steps():
+                pass
 
-    def solve_tangram(self):
+    def solve_steps(self):
         """
-        Solves the tangram puzzle using backtracking
-        :return: the solution node, if a solution exists, else None
-        """
-        available_pieces = [
-            LargeTriangle((8, 189, 100)),
-            LargeTriangle((255, 200, 3)),
-            Square((255, 74, 74)),
-            MediumTriangle((142, 207, 33)),
-            Parallelogram((96, 107, 217)),
-            SmallTriangle((44, 174, 242)),
-            SmallTriangle((251, 140, 50)),
+        Solves the puzzle step by step, the search only going on while the events are read. Closing the generator
+        cancels the search, which then ends as incomplete. The steps of a search split between worker processes are
+        not given, only its end.
+        :return: generator of the events of the search, see SearchEvent, the last one being "searchEnded"
+        """
+        if self.collect_stats:
+            self.search_measures.reset()
+            self.search_measures.enabled = True
+        try:
+            self.solution_node = yield from self.solve_tangram(self.root_state)
+        except GeneratorExit:
+            self.is_incomplete = True
+            raise
+        finally:
+            if self.collect_stats:
+                self.search_measures.enabled = False
+            self.search_stats = self.get_search_stats()
+            if self.solution_node is not None:
+                self.status = "incomplete" if self.enumerate_solutions and self.is_incomplete else "solved"
+                self.partial_node = self.solution_node
+            else:
+                self.status = "incomplete" if self.is_incomplete else "unsolvable"
+        yield SearchEvent(SearchEvent.SEARCH_ENDED, self.partial_node.current_state.used_pieces if self.partial_node is not None else [],
+                          status=self.status, search_stats=self.search_stats)
+
+    def is_budget_exhausted(self) -> bool:
+        """
+        Tells if the search must stop, because it has been cancelled or because its time budget ran out
+        :return: True if the search must stop, False otherwise
+        """
+        return (self.stop_event is not None and self.stop_event.is_set()) or (self.deadline is not None and time.time() >= self.deadline)
+
+    def update_partial_node(self, node: Node) -> None:
+        """
+        Keeps the node if it covers more of the shape than the best partial placement found so far
+        :param node: node just added to the search tree
+        """
+        coverage = sum(piece.area for piece in node.current_state.used_pieces)
+        if coverage > self.partial_coverage:
+            self.partial_coverage = coverage
+            self.partial_node = node
+
+    def add_search_stats(self, search_stats: dict) -> None:
+        """
+        Adds the counters of the search of a subtree by another solver, like the one of a worker process
+        :param search_stats: counters of the other search, see get_search_stats
+        """
+        self.expanded_nodes_number += search_stats["expandedNodes"]
+        self.backtracked_nodes_number += search_stats["backtrackedNodes"]
+        self.max_depth = max(self.max_depth, search_stats["maxDepth"])
+        self.pruned_states_number += search_stats["prunedStates"]
+        if self.collect_stats and "rejections" in search_stats:
+            self.search_measures.add(search_stats)
+
+    def add_solution(self, pieces: list[Piece]) -> bool:
+        """
+        Keeps a solution found while enumerating the solutions, unless the same one was already found
+        :param pieces: pieces of the solution
+        :return: True if the solution is new, False otherwise
+        """
+        if any(are_same_solutions(pieces, solution) for solution in self.solutions):
+            return False
+        self.solutions.append(pieces)
+        return True
+
+    def is_solutions_limit_reached(self) -> bool:
+        """
+        Tells if the enumeration of the solutions must stop, because the maximum number of solutions has been found
+        :return: True if the enumeration must stop, False otherwise
+        """
+        return self.max_solutions_number is not None and len(self.solutions) >= self.max_solutions_number
+
+    def get_search_stats(self) -> dict:
+        """
+        Gives the counters of the search, with the counters and timers of search_measures if they were collected
+        :return: the json dictionary of the stats
+        """
+        search_stats = {
+            "expandedNodes": self.expanded_nodes_number,
+            "backtrackedNodes": self.backtracked_nodes_number,
+            "maxDepth": self.max_depth,
+            "prunedStates": self.pruned_states_number,
+            "transpositionTable": self.transposition_table.get_stats()
+        }
+        if self.enumerate_solutions:
+            search_stats["solutionsNumber"] = len(self.solutions)
+        if self.engine_fallback is not None:
+            search_stats["engineFallback"] = self.engine_fallback
+        if self.collect_stats:
+            search_stats.update(self.search_measures.to_json())
+        return search_stats
+
+    @staticmethod
+    def get_available_pieces(scale: float = 1) -> list[Piece]:
+        """
+        Gives the seven pieces of the tangram, in the order in which the solver tries them
+        :param scale: scale of the pieces, see Piece.scale
+        :return: the list of the pieces
+        """
+        return [
+            LargeTriangle((8, 189, 100), scale),
+            LargeTriangle((255, 200, 3), scale),
+            Square((255, 74, 74), scale),
+            MediumTriangle((142, 207, 33), scale),
+            Parallelogram((96, 107, 217), scale),
+            SmallTriangle((44, 174, 242), scale),
+            SmallTriangle((251, 140, 50), scale),
         ]
-        root_state = State(available_pieces, self.puzzle_shadow)
+
+    def solve_tangram(self, root_state: State = None):
+        """
+        Solves the tangram puzzle, from the solution index if the shape is in it, using backtracking otherwise
+        :param root_state: state from which the search starts, the empty puzzle by default
+        :return: generator of the events of the search, returning the solution node if a solution exists, else None
+        """
+        if self.solution_index is None or root_state is not None or self.enumerate_solutions:
+            return (yield from self.search_tangram(root_state))
+        pieces = self.solution_index.lookup(self.puzzle_shadow)
+        if pieces is not None:
+            self.is_index_hit = True
+            image = draw_pieces_masks_in_image(self.puzzle_shadow.copy(), pieces)
+            yield SearchEvent(SearchEvent.SOLUTION_FOUND, pieces)
+            return Node(State([], image, pieces))
+        solution_node = yield from self.search_tangram()
+        if solution_node is not None:
+            self.solution_index.add(self.puzzle_shadow, solution_node.current_state.used_pieces)
+        return solution_node
+
+    def search_tangram(self, root_state: State = None):
+        """
+        Solves the tangram puzzle using backtracking
+        :param root_state: state from which the search starts, the empty puzzle by default
+        :return: generator of the events of the search, returning the solution node if a solution exists, else None
+        """
+        if self.engine == "exact" and root_state is None and not self.enumerate_solutions:
+            from ExactSolver import ExactSolver
+            try:
+                exact_solver = ExactSolver(self.puzzle_shadow, stop_event=self.stop_event, deadline=self.deadline)
+                solution_node = exact_solver.solve()
+                self.expanded_nodes_number += exact_solver.nodes_number
+                if solution_node is not None:
+                    yield SearchEvent(SearchEvent.SOLUTION_FOUND, solution_node.current_state.used_pieces)
+                    return solution_node
+                if exact_solver.is_incomplete:  # stopped before placing any piece at full resolution
+                    self.is_incomplete = True
+                    self.update_partial_node(Node(State(self.get_available_pieces(), self.puzzle_shadow, move_ordering=get_move_ordering(self.move_ordering))))
+                    return None
+                self.engine_fallback = "No solution on the lattice, the pieces of the shape are not all on the same lattice"
+            except ValueError as error:
+                self.engine_fallback = f"Exact engine not available for this shape ({error})"
+        if self.engine == "coarse" and root_state is None and not self.enumerate_solutions:
+            from CoarseSolver import CoarseSolver
+            coarse_solver = CoarseSolver(self.puzzle_shadow, move_ordering=self.move_ordering, deadline=self.deadline, stop_event=self.stop_event)
+            solution_node = coarse_solver.solve()
+            self.expanded_nodes_number += coarse_solver.expanded_nodes_number + coarse_solver.refinement_nodes_number
+            if solution_node is not None:
+                yield SearchEvent(SearchEvent.SOLUTION_FOUND, solution_node.current_state.used_pieces)
+                return solution_node
+            if coarse_solver.refined_solutions_number > 0:
+                self.engine_fallback = f"None of the {coarse_solver.refined_solutions_number} coarse solutions could be refined at full resolution"
+            else:
+                self.engine_fallback = f"No solution from the coarse search ({coarse_solver.coarse_status})"
+        if root_state is None:
+            root_state = State(self.get_available_pieces(), self.puzzle_shadow, move_ordering=get_move_ordering(self.move_ordering),
+                               search_stats=self.search_measures)
+        if self.workers_number > 1:
+            from ParallelSolver import ParallelSolver
+            parallel_solver = ParallelSolver(self.puzzle_shadow, self.workers_number, deadline=self.deadline, node_budget=self.node_budget,
+                                             max_solutions_number=self.max_solutions_number, stop_event=self.stop_event,
+                                             collect_stats=self.collect_stats)
+            try:
+                if self.enumerate_solutions:
+                    solution_node = yield from self.enumerate_in_parallel(parallel_solver, root_state)
+                else:
+                    solution_node = parallel_solver.solve(root_state)
+            finally:
+                self.expanded_nodes_number += parallel_solver.split_nodes_number
+                for search_stats in parallel_solver.subtrees_search_stats:
+                    self.add_search_stats(search_stats)
+            self.is_incomplete |= parallel_solver.is_incomplete
+            self.update_partial_node(parallel_solver.partial_node)
+            if solution_node is not None and not self.enumerate_solutions:
+                yield SearchEvent(SearchEvent.SOLUTION_FOUND, solution_node.current_state.used_pieces)
+            return solution_node
+        return (yield from self.search(root_state))
+
+    def enumerate_in_parallel(self, parallel_solver, root_state: State):
+        """
+        Enumerates the solutions with the worker processes of the parallel solver, the solutions found in several
+        subtrees being only given once
+        :param parallel_solver: parallel solver exploring the subtrees, see ParallelSolver.enumerate_solutions
+        :param root_state: state at the root of the tree
+        :return: generator of the events of the distinct solutions, returning the node of the first one, None if there
+                 is no solution
+        """
+        first_solution_node = None
+        solution_nodes = parallel_solver.enumerate_solutions(root_state)
+        try:
+            for solution_node in solution_nodes:
+                if not self.add_solution(solution_node.current_state.used_pieces):
+                    continue
+                first_solution_node = first_solution_node if first_solution_node is not None else solution_node
+                yield SearchEvent(SearchEvent.SOLUTION_FOUND, solution_node.current_state.used_pieces)
+                if self.is_solutions_limit_reached():
+                    self.is_incomplete = True
+                    break
+        finally:
+            solution_nodes.close()  # stops the workers
+        return first_solution_node
+
+    def search(self, root_state: State):
+        """
+        Explores the search tree below a state with a depth first search. When the solutions are enumerated, the search
+        goes on after each solution: the configurations whose subtree has no solution are stored in the transposition
+        table as dead, the other ones by the arrangement of their pieces, their solutions having already been given.
+        :param root_state: state at the root of the explored tree, the search never backtracks above it
+        :return: generator of the events of the search, returning the solution node if a solution exists in this tree,
+                 the first one found when enumerating the solutions, else None
+        """
+        if len(root_state.available_pieces) == 0:
+            if self.enumerate_solutions:
+                self.add_solution(root_state.used_pieces)
+            yield SearchEvent(SearchEvent.SOLUTION_FOUND, root_state.used_pieces)
+            return Node(root_state)
+        root_state.search_stats = self.search_measures  # the states below it are counted in the stats of this solver
         node = Node(root_state)
+        self.update_partial_node(node)
+        solution_node = None
         while node.current_state is not None:
+            if self.is_budget_exhausted():  # a few microseconds, against a placement test or more for each iteration
+                self.is_incomplete = True
+                return solution_node
             next_state = node.current_state.get_next_state()
             if next_state is None:  # the program cannot place any more piece with this configuration
+                if node.has_solution:
+                    self.transposition_table.add_explored(node.current_state)
+                else:
+                    self.transposition_table.add_dead(node.current_state)
+                self.backtracked_nodes_number += 1
+                if node.previous_node is not None:
+                    yield SearchEvent(SearchEvent.BACKTRACK, node.previous_node.current_state.used_pieces, node.current_state.used_pieces[-1])
                 node = node.previous_node
+            elif self.transposition_table.is_dead(next_state):  # same configuration already explored
+                continue
+            elif self.enumerate_solutions and self.transposition_table.is_explored(next_state):  # solutions already given
+                node.mark_solution()
+                continue
+            elif settings.FEASIBILITY_PRUNING and not next_state.is_feasible():  # pruned before trying any of its pieces
+                self.pruned_states_number += 1
+                continue
             else:
                 node = Node(current_state=next_state, previous_node=node)
+                self.expanded_nodes_number += 1
+                self.max_depth = max(self.max_depth, len(next_state.used_pieces))
+                self.update_partial_node(node)
+                yield SearchEvent(SearchEvent.PIECE_PLACED, next_state.used_pieces, next_state.used_pieces[-1])
             if node is None:
-                return None
+                return solution_node
             if len(node.current_state.available_pieces) == 0:
-                return node
-        return None
\ No newline at end of file
+                if not self.enumerate_solutions:
+                    yield SearchEvent(SearchEvent.SOLUTION_FOUND, node.current_state.used_pieces)
+                    return node
+                solution_node = solution_node if solution_node is not None else node
+                node.mark_solution()
+                if self.add_solution(node.current_state.used_pieces):
+                    yield SearchEvent(SearchEvent.SOLUTION_FOUND, node.current_state.used_pieces)
+                    if self.is_solutions_limit_reached():
+                        self.is_incomplete = True
+                        return solution_node
+            if self.node_budget is not None and self.expanded_nodes_number >= self.node_budget:
+                self.is_incomplete = True
+                return solution_node
+        return solution_node
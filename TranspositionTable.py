@@ -0,0 +1,96 @@
+from __future__ import annotations
+from collections import OrderedDict
+import settings
+
+
+class TranspositionTable:
+    """
+    Bounded LRU table of the puzzle configurations proven dead, i.e. from which no solution can be reached. The same
+    configuration can be reached by placing the same pieces in a different order, the table avoids exploring it again.
+    When the solver enumerates all the solutions, the configurations whose subtree holds solutions are stored apart,
+    keyed by the arrangement of their placed pieces too: reaching the same image with other placements leads to other
+    solutions, only the same arrangement can be skipped, its solutions having already been given.
+
+    Attributes:
+        max_size:   maximum number of configurations stored, the least recently used ones are evicted first
+        hits:       number of lookups of a configuration already known to be dead or explored
+        misses:     number of lookups of an unknown configuration
+        evictions:  number of configurations evicted to respect the maximum size
+    """
+    def __init__(self, max_size: int = settings.TRANSPOSITION_TABLE_SIZE):
+        self.max_size: int = max_size
+        self.dead_configurations: OrderedDict[bytes, None] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self.dead_configurations)
+
+    def is_dead(self, state) -> bool:
+        """
+        Tells if the configuration of a state is already known to be dead
+        :param state: state to look up
+        :return: True if no solution can be reached from this configuration, False if it is unknown
+        """
+        key = state.get_configuration_key()
+        if key in self.dead_configurations:
+            self.dead_configurations.move_to_end(key)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add_dead(self, state) -> None:
+        """
+        Records the configuration of a state whose whole subtree has been explored without finding a solution
+        :param state: dead state
+        """
+        self.add_key(state.get_configuration_key())
+
+    def add_key(self, key: bytes) -> None:
+        """
+        Stores a key in the table, evicting the least recently used ones beyond the maximum size
+        :param key: configuration or arrangement key
+        """
+        if self.max_size <= 0:
+            return
+        self.dead_configurations[key] = None
+        self.dead_configurations.move_to_end(key)
+        while len(self.dead_configurations) > self.max_size:
+            self.dead_configurations.popitem(last=False)
+            self.evictions += 1
+
+    def is_explored(self, state) -> bool:
+        """
+        Tells if the arrangement of a state has already been fully explored, its solutions being already given
+        :param state: state to look up
+        :return: True if the subtree of this arrangement has been explored, False if it is unknown
+        """
+        key = state.get_arrangement_key()
+        if key in self.dead_configurations:
+            self.dead_configurations.move_to_end(key)
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add_explored(self, state) -> None:
+        """
+        Records the arrangement of a state whose whole subtree has been explored, some solutions having been found in it
+        :param state: explored state
+        """
+        self.add_key(state.get_arrangement_key())
+
+    def get_stats(self) -> dict[str, int]:
+        """
+        Gives the counters of the table, used to size it
+        :return: the size, hits, misses and evictions of the table
+        """
+        return {
+            "size": len(self),
+            "maxSize": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
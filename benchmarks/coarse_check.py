@@ -0,0 +1,68 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Pool, TimeoutError
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIRECTORY)
+
+import numpy as np
+from ImageProcessor import ImageProcessor
+from TangramSolver import TangramSolver
+from solver_benchmark import get_corpus
+
+
+def solve(image_path: str, engine: str) -> dict:
+    """
+    Solves a puzzle with one engine
+    :param image_path: path of the puzzle
+    :param engine: "raster" or "coarse"
+    :return: the status of the solver, its duration, the ratio of the black pixels covered by the solution and the
+             reason why the coarse engine fell back to the raster search
+    """
+    image = ImageProcessor(image_path).image
+    start_time = time.perf_counter()
+    solver = TangramSolver(image, engine=engine)
+    result = {"status": solver.status, "time": time.perf_counter() - start_time, "fallback": solver.engine_fallback}
+    if solver.solution_node is not None:
+        uncovered_pixels = np.count_nonzero(np.asarray(solver.solution_node.current_state.image) == 0)
+        result["coverage"] = 1 - uncovered_pixels / np.count_nonzero(image == 0)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Checks that the coarse engine solves at least the puzzles of the benchmark corpus solved by the raster search')
+    parser.add_argument('--userShapes', type=str, default=os.path.join(ROOT_DIRECTORY, 'user_shapes', '*.png'), help='Glob pattern of the user shapes of the corpus')
+    parser.add_argument('--assetTiles', type=str, default=os.path.join(ROOT_DIRECTORY, 'assets', 'resolution_*.png'), help='Glob pattern of the solution images whose shapes are added to the corpus')
+    parser.add_argument('--timeout', type=float, default=120, help='Maximum duration of one solve in seconds')
+    args = parser.parse_args()
+
+    temporary_directory = tempfile.TemporaryDirectory()
+    corpus = get_corpus(args.userShapes, args.assetTiles, temporary_directory.name)
+    regressions, refined_number = [], 0
+    pool = Pool(1)  # the solves run in a worker process to be stopped after the timeout
+    for name, image_path in corpus.items():
+        results = {}
+        for engine in ("raster", "coarse"):
+            try:
+                results[engine] = pool.apply_async(solve, (image_path, engine)).get(args.timeout)
+            except TimeoutError:
+                pool.terminate()
+                pool = Pool(1)
+                results[engine] = {"status": "timeout", "fallback": None}
+        if results["raster"]["status"] == "solved" and results["coarse"]["status"] != "solved":
+            regressions.append(name)
+        refined_number += results["coarse"]["status"] == "solved" and results["coarse"]["fallback"] is None
+        print(name, " | ".join(
+            f"{engine}: {result['status']}" + (f" in {result['time']:.2f}s" if "time" in result else "")
+            + (f", {result['coverage']:.2%} covered" if "coverage" in result else "")
+            + (f", fell back: {result['fallback']}" if result["fallback"] is not None else "")
+            for engine, result in results.items()
+        ))
+    pool.terminate()
+    temporary_directory.cleanup()
+    print(f"The coarse engine refined its own solution for {refined_number}/{len(corpus)} puzzles")
+    if len(regressions) > 0:
+        sys.exit(f"Solved by the raster search but not by the coarse engine: {', '.join(regressions)}")
@@ -0,0 +1,164 @@
+import argparse
+import glob
+import os
+import random
+import sys
+import tempfile
+import time
+from multiprocessing import Pool, TimeoutError
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIRECTORY)
+
+import cv2 as cv
+import numpy as np
+from ImageProcessor import ImageProcessor
+from TangramSolver import TangramSolver
+from ExactSolver import ExactSolver, ExactPiece, cross
+from utils import draw_piece_in_image
+import settings
+
+
+def share_an_edge(polygon, other) -> bool:
+    """
+    Tells if two polygons of the lattice have collinear edges overlapping on a positive length
+    :param polygon: first polygon
+    :param other: second polygon
+    :return: True if the polygons touch along an edge
+    """
+    for i in range(len(polygon.points)):
+        p, q = polygon.points[i - 1], polygon.points[i]
+        float_p, float_q = np.array(polygon.float_points[i - 1]), np.array(polygon.float_points[i])
+        direction = (float_q - float_p) / np.linalg.norm(float_q - float_p)
+        for j in range(len(other.points)):
+            r, s = other.points[j - 1], other.points[j]
+            if cross(p, q, r).sign() != 0 or cross(p, q, s).sign() != 0:
+                continue
+            projections = [float(np.dot(np.array(point) - float_p, direction)) for point in (other.float_points[j - 1], other.float_points[j])]
+            if min(max(projections), float(np.linalg.norm(float_q - float_p))) - max(min(projections), 0) > 1e-6:
+                return True
+    return False
+
+def generate_lattice_shape(rng: random.Random) -> list:
+    """
+    Builds a random shape by sticking the pieces edge to edge on the lattice, vertex on vertex
+    :param rng: random generator
+    :return: the placed polygons, in eighths of the side of the tangram
+    """
+    orientations = ExactPiece.get_orientations()
+    names = [piece.name for piece in TangramSolver.get_available_pieces()]
+    rng.shuffle(names)
+    placed = [rng.choice(orientations[names[0]]).polygon]
+    for name in names[1:]:
+        for _ in range(1000):
+            polygon = rng.choice(orientations[name]).polygon
+            anchor = rng.choice([point for other in placed for point in other.points])
+            vertex = rng.choice(polygon.points)
+            candidate = polygon.translate(anchor[0] - vertex[0], anchor[1] - vertex[1])
+            if not any(candidate.overlaps(other) for other in placed) and any(share_an_edge(candidate, other) for other in placed):
+                placed.append(candidate)
+                break
+        else:
+            return generate_lattice_shape(rng)
+    return placed
+
+def render_lattice_shape(polygons: list, path: str) -> bool:
+    """
+    Draws a lattice shape in the middle of the canvas
+    :param polygons: polygons of the pieces
+    :param path: path of the png image written
+    :return: False if the shape does not fit in the canvas or has holes, True otherwise
+    """
+    unit = settings.TANGRAM_SIDE_LENGTH / 8
+    points = [np.array(polygon.float_points) * unit for polygon in polygons]
+    all_points = np.concatenate(points)
+    offset = (np.array(settings.MENU_RES) - all_points.max(axis=0) - all_points.min(axis=0)) / 2
+    if (all_points.max(axis=0) - all_points.min(axis=0) > np.array(settings.MENU_RES) - 20).any():
+        return False
+    image = np.full((settings.MENU_HEIGHT, settings.MENU_WIDTH), 255, dtype=np.uint8)
+    for polygon_points in points:
+        cv.fillPoly(image, [np.round((polygon_points + offset) * 16).astype(np.int32)], 0, cv.LINE_8, 4)
+    hierarchy = cv.findContours(255 - image, cv.RETR_CCOMP, cv.CHAIN_APPROX_SIMPLE)[1]
+    if (hierarchy[0][:, 3] != -1).any():
+        return False
+    cv.imwrite(path, image)
+    return True
+
+def get_solution_errors(image: np.ndarray, pieces: list) -> (int, int):
+    """
+    Measures how well a solution covers the shape
+    :param image: image of the shape
+    :param pieces: pieces of the solution
+    :return: the number of black pixels left uncovered and the number of pixels covered twice, apart from the borders
+             of the pieces which touch each other
+    """
+    coverage = np.zeros(image.shape, dtype=np.uint16)
+    interiors_coverage = np.zeros(image.shape, dtype=np.uint16)
+    for piece in pieces:
+        piece_image = np.zeros(image.shape, dtype=np.uint8)
+        draw_piece_in_image(piece_image, piece, 1)
+        coverage += piece_image
+        interiors_coverage += cv.erode(piece_image, np.ones((3, 3), np.uint8))
+    return int(np.count_nonzero((image == 0) & (coverage == 0))), int(np.count_nonzero(interiors_coverage > 1))
+
+def solve(image_path: str, engine: str) -> dict:
+    """
+    Solves a puzzle with one engine
+    :param image_path: path of the puzzle
+    :param engine: "raster" or "exact"
+    :return: the result of the engine
+    """
+    image = ImageProcessor(image_path).image
+    start_time = time.perf_counter()
+    if engine == "exact":
+        try:
+            solution_node = ExactSolver(image).solve()
+        except ValueError as error:
+            return {"status": "off lattice", "error": str(error)}
+    else:
+        solution_node = TangramSolver(image).solution_node
+    result = {"status": "solved" if solution_node is not None else "unsolved", "time": time.perf_counter() - start_time}
+    if solution_node is not None:
+        result["uncovered"], result["overlapping"] = get_solution_errors(image, solution_node.current_state.used_pieces)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compares the exact engine with the raster solver')
+    parser.add_argument('--imagePaths', type=str, default=os.path.join(ROOT_DIRECTORY, 'user_shapes', '*.png'), help='Glob pattern of the puzzles to compare')
+    parser.add_argument('--latticeShapes', type=int, default=5, help='Number of random shapes built on the lattice added to the puzzles')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random lattice shapes')
+    parser.add_argument('--timeout', type=float, default=60, help='Maximum duration of one solve in seconds')
+    args = parser.parse_args()
+
+    image_paths = sorted(glob.glob(args.imagePaths))
+    drawn_shapes_number = len(image_paths)
+    temporary_directory = tempfile.TemporaryDirectory()
+    rng = random.Random(args.seed)
+    while len(image_paths) < drawn_shapes_number + args.latticeShapes:
+        path = os.path.join(temporary_directory.name, f"lattice_{len(image_paths)}.png")
+        if render_lattice_shape(generate_lattice_shape(rng), path):
+            image_paths.append(path)
+
+    agreements, lattice_agreements = 0, 0
+    pool = Pool(1)  # the solves run in a worker process to be stopped after the timeout
+    for i, image_path in enumerate(image_paths):
+        results = {}
+        for engine in ("raster", "exact"):
+            try:
+                results[engine] = pool.apply_async(solve, (image_path, engine)).get(args.timeout)
+            except TimeoutError:
+                pool.terminate()
+                pool = Pool(1)
+                results[engine] = {"status": "timeout"}
+        agreements += results["raster"]["status"] == results["exact"]["status"]
+        lattice_agreements += i >= drawn_shapes_number and results["raster"]["status"] == results["exact"]["status"]
+        print(os.path.basename(image_path), " | ".join(
+            f"{engine}: {result['status']}" + (f" in {result['time']:.2f}s" if "time" in result else "")
+            + (f", {result['uncovered']} px uncovered, {result['overlapping']} px overlapping" if "uncovered" in result else "")
+            for engine, result in results.items()
+        ))
+    pool.terminate()
+    print(f"Same status for {agreements}/{len(image_paths)} puzzles, {lattice_agreements}/{len(image_paths) - drawn_shapes_number} of the lattice shapes")
+    print("The drawn shapes are usually off the lattice, the pieces being slid freely, and are then solved by the raster search")
+    temporary_directory.cleanup()
@@ -0,0 +1,64 @@
+import argparse
+import glob
+import os
+import sys
+import tempfile
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIRECTORY)
+
+import cv2 as cv
+import numpy as np
+from ImageProcessor import ImageProcessor
+from TangramSolver import TangramSolver
+from SolutionIndex import SolutionIndex
+
+
+def rotate_image(image_path: str, angle: float, path: str) -> None:
+    """
+    Rotates a puzzle around the center of its image, the canvas being enlarged so that the shape is never cut
+    :param image_path: path of the puzzle
+    :param angle: rotation angle in degrees, counterclockwise
+    :param path: path of the png image written
+    """
+    image = cv.imread(image_path, cv.IMREAD_GRAYSCALE)
+    side = int(np.hypot(*image.shape)) + 20
+    canvas = np.full((side, side), 255, dtype=np.uint8)
+    y, x = (side - image.shape[0]) // 2, (side - image.shape[1]) // 2
+    canvas[y:y + image.shape[0], x:x + image.shape[1]] = image
+    rotation_matrix = cv.getRotationMatrix2D((side / 2, side / 2), angle, 1)
+    cv.imwrite(path, cv.warpAffine(canvas, rotation_matrix, (side, side), flags=cv.INTER_LINEAR, borderValue=255))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Checks that the solution index finds the shapes it contains, as they are and rotated')
+    parser.add_argument('--imagePaths', type=str, default=os.path.join(ROOT_DIRECTORY, 'user_shapes', '*.png'), help='Glob pattern of the puzzles indexed')
+    parser.add_argument('--angles', type=float, nargs='*', default=[90, 200], help='Rotations in degrees of the puzzles looked up')
+    args = parser.parse_args()
+
+    image_paths = sorted(glob.glob(args.imagePaths))
+    if len(image_paths) == 0:
+        sys.exit(f"No puzzle matches {args.imagePaths}")
+    index = SolutionIndex()
+    for image_path in image_paths:
+        image = ImageProcessor(image_path).image
+        solver = TangramSolver(image)
+        if solver.solution_node is not None:
+            index.add(image, solver.solution_node.current_state.used_pieces, image_path)
+
+    misses = []
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        for image_path in image_paths:
+            queries = [("exact", image_path)]
+            for angle in args.angles:
+                query_path = os.path.join(temporary_directory, f"{angle:g}_{os.path.basename(image_path)}")
+                rotate_image(image_path, angle, query_path)
+                queries.append((f"{angle:g}°", query_path))
+            for name, query_path in queries:
+                is_hit = index.lookup(ImageProcessor(query_path).image) is not None
+                print(os.path.basename(image_path), name, "hit" if is_hit else "miss")
+                if not is_hit:
+                    misses.append((image_path, name))
+    print(index.get_stats())
+    if len(misses) > 0:
+        sys.exit(f"{len(misses)} lookups missed a shape of the index")
@@ -0,0 +1,170 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from multiprocessing import Pool, TimeoutError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2 as cv
+import numpy as np
+from ImageProcessor import ImageProcessor
+from TangramSolver import TangramSolver
+from PieceMaskLibrary import PIECE_MASK_LIBRARY
+import settings
+
+
+def get_corpus(user_shapes_pattern: str, asset_tiles_pattern: str, directory: str) -> dict[str, str]:
+    """
+    Gives the puzzles of the benchmark: the user shapes, and the shapes of the solution images of the assets, which are
+    first tile of the grid of their solving steps, drawn over a white background
+    :param user_shapes_pattern: glob pattern of the user shapes
+    :param asset_tiles_pattern: glob pattern of the solution images of the assets
+    :param directory: directory in which the shapes of the assets are written
+    :return: the path of each puzzle, by name
+    """
+    corpus = {os.path.splitext(os.path.basename(path))[0]: path for path in sorted(glob.glob(user_shapes_pattern))}
+    for path in sorted(glob.glob(asset_tiles_pattern)):
+        name = os.path.splitext(os.path.basename(path))[0]
+        corpus[name] = os.path.join(directory, name + ".png")
+        tile = cv.imread(path, cv.IMREAD_UNCHANGED)[:settings.MENU_HEIGHT, :settings.MENU_WIDTH]
+        opacity = tile[:, :, 3:] / 255
+        cv.imwrite(corpus[name], (tile[:, :, :3] * opacity + 255 * (1 - opacity)).astype(np.uint8))
+    return corpus
+
+def measure_solve(image_path: str, trace_memory: bool = False) -> dict:
+    """
+    Solves a puzzle and measures the search, in the worker process
+    :param image_path: path of the puzzle
+    :param trace_memory: True to measure the peak of the memory allocated during the solve, which slows the solve down
+                         a lot, so the time of such a solve is not kept
+    :return: the wall time in seconds, the nodes expanded, the candidate placements rasterized, if the puzzle was solved,
+             and the peak of the memory in bytes if traced
+    """
+    if not PIECE_MASK_LIBRARY.is_built():
+        PIECE_MASK_LIBRARY.load_or_build()
+    image = ImageProcessor(image_path).image
+    lookups_number = PIECE_MASK_LIBRARY.hits + PIECE_MASK_LIBRARY.misses
+    if trace_memory:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    solver = TangramSolver(image)
+    measure = {
+        "time": time.perf_counter() - start_time,
+        "expandedNodes": solver.search_stats["expandedNodes"],
+        "backtrackedNodes": solver.search_stats["backtrackedNodes"],
+        "maxDepth": solver.search_stats["maxDepth"],
+        "rasterizedCandidates": PIECE_MASK_LIBRARY.hits + PIECE_MASK_LIBRARY.misses - lookups_number,
+        "solved": solver.solution_node is not None
+    }
+    if trace_memory:
+        measure["peakMemory"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return measure
+
+def run_benchmark(corpus: dict[str, str], repeats: int, timeout: float, measure_memory: bool) -> dict:
+    """
+    Measures all the puzzles of the corpus, each solve running in a new worker process stopped after the timeout, so
+    that the masks added to the library by a solve do not change the next ones
+    :param corpus: path of each puzzle, by name
+    :param repeats: number of timed solves of each puzzle, the median time being kept
+    :param timeout: maximum duration of one solve in seconds
+    :param measure_memory: True to add a solve of each puzzle measuring the peak of the memory
+    :return: the json dictionary of the results
+    """
+    results = {}
+    pool = Pool(1, maxtasksperchild=1)
+    for name, image_path in corpus.items():
+        measures = []
+        for trace_memory in [False] * repeats + [True] * measure_memory:
+            try:
+                measures.append(pool.apply_async(measure_solve, (image_path, trace_memory)).get(timeout))
+            except TimeoutError:
+                pool.terminate()
+                pool = Pool(1, maxtasksperchild=1)
+                if not trace_memory:
+                    measures = [{"time": timeout, "expandedNodes": None, "backtrackedNodes": None, "maxDepth": None, "rasterizedCandidates": None,
+                                 "solved": False, "timeout": True}]
+                break
+        result = dict(measures[0])
+        result["time"] = statistics.median(measure["time"] for measure in measures[:repeats])
+        result["peakMemory"] = measures[-1].get("peakMemory")
+        results[name] = result
+        print(f"{name}: {'solved' if result['solved'] else 'timeout' if result.get('timeout') else 'not solved'} in {result['time']:.3f}s, "
+              f"{result['expandedNodes']} nodes, {result['rasterizedCandidates']} candidates, {result['peakMemory']} bytes")
+    pool.terminate()
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "moveOrdering": settings.MOVE_ORDERING,
+            "engine": settings.SOLVER_ENGINE,
+            "repeats": repeats
+        },
+        "puzzles": results,
+        "total": {
+            "time": sum(result["time"] for result in results.values()),
+            "solved": sum(result["solved"] for result in results.values()),
+            "puzzles": len(results)
+        }
+    }
+
+def get_regressions(results: dict, baseline: dict, threshold: float, min_time_difference: float) -> list[str]:
+    """
+    Compares the results with a baseline, on the puzzles measured in both
+    :param results: json dictionary of the results
+    :param baseline: json dictionary of the baseline results
+    :param threshold: relative increase of the time, the nodes, the candidates or the memory considered a regression
+    :param min_time_difference: time differences below this duration in seconds are considered noise
+    :return: the description of each regression
+    """
+    regressions = []
+    for name, result in results["puzzles"].items():
+        if name not in baseline["puzzles"]:
+            continue
+        baseline_result = baseline["puzzles"][name]
+        if baseline_result["solved"] and not result["solved"]:
+            regressions.append(f"{name}: not solved anymore")
+            continue
+        if result["time"] > baseline_result["time"] * (1 + threshold) and result["time"] - baseline_result["time"] > min_time_difference:
+            regressions.append(f"{name}: time {baseline_result['time']:.3f}s -> {result['time']:.3f}s")
+        for key in ("expandedNodes", "rasterizedCandidates", "peakMemory"):
+            if result[key] is not None and baseline_result[key] is not None and result[key] > baseline_result[key] * (1 + threshold):
+                regressions.append(f"{name}: {key} {baseline_result[key]} -> {result[key]}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark of the solver on a corpus of puzzles, compared with a baseline')
+    parser.add_argument('--userShapes', type=str, default='user_shapes/*.png', help='Glob pattern of the user shapes of the corpus')
+    parser.add_argument('--assetTiles', type=str, default='assets/resolution_*.png', help='Glob pattern of the solution images whose shapes are added to the corpus')
+    parser.add_argument('--repeats', type=int, default=1, help='Number of solves of each puzzle, the median time being kept')
+    parser.add_argument('--measureMemory', action=argparse.BooleanOptionalAction, default=True, help='Adds a solve of each puzzle measuring the peak of the memory allocated, slower than the timed solves (--no-measureMemory to skip it)')
+    parser.add_argument('--timeout', type=float, default=600, help='Maximum duration of one solve in seconds')
+    parser.add_argument('--output', type=str, default='benchmark_results.json', help='Path of the json file in which the results are written')
+    parser.add_argument('--baseline', type=str, default=None, help='json file of previous results to compare with')
+    parser.add_argument('--threshold', type=float, default=.1, help='Relative increase considered a regression')
+    parser.add_argument('--minTimeDifference', type=float, default=.05, help='Time differences in seconds below which the time is not compared')
+    args = parser.parse_args()
+
+    temporary_directory = tempfile.TemporaryDirectory()
+    results = run_benchmark(get_corpus(args.userShapes, args.assetTiles, temporary_directory.name), args.repeats, args.timeout, args.measureMemory)
+    temporary_directory.cleanup()
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=4)
+    print(f"Solved {results['total']['solved']}/{results['total']['puzzles']} puzzles in {results['total']['time']:.2f}s, results written to {args.output}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = get_regressions(results, json.load(file), args.threshold, args.minTimeDifference)
+        for regression in regressions:
+            print("Regression", regression)
+        print(f"{len(regressions)} regressions compared with {args.baseline}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# run in a new interpreter for each measure, so that every import is cold
+CHILD_SCRIPT = """
+import json, sys, time
+start_time = time.perf_counter()
+import main
+import_time = time.perf_counter() - start_time
+from ImageProcessor import ImageProcessor
+from TangramSolver import TangramSolver
+solver = TangramSolver(ImageProcessor(sys.argv[1]).image)
+print(json.dumps({
+    "importTime": import_time,
+    "firstSolutionTime": time.perf_counter() - start_time,
+    "solved": solver.solution_node is not None,
+    "guiImported": "pygame" in sys.modules or "tkinter" in sys.modules
+}))
+"""
+
+
+def measure_startup(image_path: str) -> dict:
+    """
+    Measures the start of the solver in a new interpreter
+    :param image_path: path of the puzzle solved once the modules are imported
+    :return: the time in seconds to import the modules of main.py, to solve the puzzle from the start of the script,
+             and to run the whole command line headless, with if the puzzle was solved and if a gui module was imported
+    """
+    output = subprocess.run([sys.executable, "-c", CHILD_SCRIPT, image_path], cwd=ROOT_DIRECTORY, capture_output=True, text=True, check=True).stdout
+    measure = json.loads(output.splitlines()[-1])
+    start_time = time.perf_counter()
+    subprocess.run([sys.executable, "main.py", "--imagePath", image_path, "--headless", "True"], cwd=ROOT_DIRECTORY, capture_output=True, check=True)
+    measure["commandLineTime"] = time.perf_counter() - start_time
+    return measure
+
+def get_slowest_imports(modules_number: int) -> list[tuple[str, float]]:
+    """
+    Gives the modules whose import takes the longest when main.py is imported, with python -X importtime
+    :param modules_number: number of modules given
+    :return: the name of each module and its cumulative import time in seconds, slowest first
+    """
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT_DIRECTORY, capture_output=True, text=True, check=True).stderr
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_time, module = line.split("|")
+        imports.append((module.strip(), int(cumulative_time) / 1e6))
+    return sorted(imports, key=lambda module_import: module_import[1], reverse=True)[:modules_number]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark of the start of the solver: cold import of its modules and time to the first solution')
+    parser.add_argument('--imagePath', type=str, default='user_shapes/3986446480108163284370.png', help='Puzzle solved after the imports, quickly solved so that the start dominates')
+    parser.add_argument('--repeats', type=int, default=5, help='Number of measures, the median being kept')
+    parser.add_argument('--slowestImports', type=int, default=10, help='Number of the slowest imports listed')
+    parser.add_argument('--output', type=str, default=None, help='Path of the json file in which the results are written')
+    args = parser.parse_args()
+
+    image_path = os.path.abspath(args.imagePath)
+    measures = [measure_startup(image_path) for _ in range(args.repeats)]
+    results = {
+        "python": sys.version.split()[0],
+        "repeats": args.repeats,
+        "importTime": statistics.median(measure["importTime"] for measure in measures),
+        "firstSolutionTime": statistics.median(measure["firstSolutionTime"] for measure in measures),
+        "commandLineTime": statistics.median(measure["commandLineTime"] for measure in measures),
+        "solved": all(measure["solved"] for measure in measures),
+        "guiImported": any(measure["guiImported"] for measure in measures),
+        "slowestImports": dict(get_slowest_imports(args.slowestImports))
+    }
+    print(f"Import {results['importTime']:.3f}s, first solution {results['firstSolutionTime']:.3f}s, whole command line {results['commandLineTime']:.3f}s"
+          f"{', gui modules imported' if results['guiImported'] else ''}")
+    for module, import_time in results["slowestImports"].items():
+        print(f"  {module}: {import_time:.3f}s")
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
@@ -0,0 +1,78 @@
+import argparse
+import inspect
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_states_per_second(image_path: str, duration: float) -> float:
+    """
+    Creates the same child state over and over, as the search does each time a piece is accepted
+    :param image_path: path of the puzzle used to create the states
+    :param duration: minimum duration of the measure in seconds
+    :return: the number of states created per second
+    """
+    from ImageProcessor import ImageProcessor
+    from TangramSolver import TangramSolver
+    from State import State
+    image_processor = ImageProcessor(image_path)
+    root_state = State(TangramSolver.get_available_pieces(), image_processor.image)
+    first_state = root_state.get_next_state()
+    if first_state is None:
+        raise ValueError("No piece can be placed on this puzzle")
+    piece_placed = first_state.used_pieces[-1]
+    piece_index = root_state.available_pieces.index(
+        next(piece for piece in root_state.available_pieces if piece.name == piece_placed.name))
+    if "piece_index" in inspect.signature(State.generate_next_state).parameters:
+        arguments = (first_state.image, piece_placed, piece_index)
+    else:  # older sources, where the state read the index of the placed piece from its own counters
+        root_state.current_working_piece_index = piece_index
+        arguments = (first_state.image, piece_placed)
+
+    states_number = 0
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < duration:
+        for _ in range(100):
+            root_state.generate_next_state(*arguments)
+        states_number += 100
+    return states_number / (time.perf_counter() - start_time)
+
+
+def measure_git_ref(ref: str, image_path: str, duration: float) -> float:
+    """
+    Measures the creation of the states with the sources of another commit, checked out in a temporary worktree and
+    measured in a new process
+    :param ref: git reference of the commit, like a hash or a branch
+    :param image_path: path of the puzzle used to create the states
+    :param duration: minimum duration of the measure in seconds
+    :return: the number of states created per second with the sources of the commit
+    """
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        worktree = os.path.join(temporary_directory, "sources")
+        subprocess.run(["git", "-C", ROOT_DIRECTORY, "worktree", "add", "--detach", worktree, ref], check=True, capture_output=True)
+        try:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--imagePath", os.path.abspath(image_path), "--duration", str(duration),
+                                     "--sourceDirectory", worktree], check=True, capture_output=True, text=True, cwd=worktree).stdout
+        finally:
+            subprocess.run(["git", "-C", ROOT_DIRECTORY, "worktree", "remove", "--force", worktree], check=True, capture_output=True)
+    return float(output.split()[0])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Microbenchmark of the creation of the search states')
+    parser.add_argument('--imagePath', type=str, default=os.path.join(ROOT_DIRECTORY, 'user_shapes', '3986446480108163284370.png'), help='Puzzle used to create the states')
+    parser.add_argument('--duration', type=float, default=3, help='Minimum duration of the measure in seconds')
+    parser.add_argument('--compareWith', type=str, default=None, help='Git reference of a commit whose sources are measured too, like the commit before an optimization')
+    parser.add_argument('--sourceDirectory', type=str, default=ROOT_DIRECTORY, help='Directory of the sources measured, the ones of this repository by default')
+    args = parser.parse_args()
+
+    sys.path.insert(0, args.sourceDirectory)
+    states_per_second = measure_states_per_second(args.imagePath, args.duration)
+    print(f"{states_per_second:.0f} states/s")
+    if args.compareWith is not None:
+        reference_states_per_second = measure_git_ref(args.compareWith, args.imagePath, args.duration)
+        print(f"{reference_states_per_second:.0f} states/s at {args.compareWith}, speedup {states_per_second / reference_states_per_second:.2f}x")
@@ -1,4 +1,5 @@
 from __future__ import annotations
+from copy import copy
 import numpy as np
 import settings
 import math
@@ -11,6 +12,7 @@ class Point:
         x:  coordinate in the horizontal axis
         y:  coordinate in the vertical axis
     """
+    __slots__ = ("x", "y")
 
     def __init__(self, x: float = 0.0, y: float = 0.0) -> None:
         self.x: float = x
@@ -63,6 +65,8 @@ class Vector(Point):
     """
     Vector class used for the directions of the edges
     """
+    __slots__ = ()
+
     def __init__(self, x, y):
         super().__init__(x, y)
 
@@ -107,6 +111,8 @@ class Edge:
         end_point:      Ending point of the edge
         direction:      Vector indicating the direction of the edge
     """
+    __slots__ = ("start_point", "end_point", "direction")
+
     def __init__(self, start_point: Point, end_point : Point):
         self.start_point = start_point
         self.end_point = end_point
@@ -118,18 +124,23 @@ class Edge:
 
 class Corner(Point):
     """
-    Used to represent the corners of the shape and the tangram pieces
+    Used to represent the corners of the shape and the tangram pieces, as a view on one row of the coordinates array of
+    their contour or piece, the edges being built from the neighbouring rows only when asked for
 
     Attributes:
+        coordinates:            coordinates of all the corners of the contour or piece, one row (x, y) per corner
+        index:                  row of this corner in the coordinates
         angle_between_edges:    Angle between the two edges
-        first_edge:             First edge starting from this point
-        second_edge:            Second edge starting from this point
+        first_edge:             First edge starting from this point, towards the previous corner
+        second_edge:            Second edge starting from this point, towards the next corner
     """
-    def __init__(self, x, y, first_edge = None, second_edge = None):
-        super().__init__(x, y)
-        self.angle_between_edges = 0
-        self.first_edge = first_edge
-        self.second_edge = second_edge
+    __slots__ = ("coordinates", "index", "angle_between_edges")
+
+    def __init__(self, coordinates: np.ndarray, index: int, angle_between_edges: float = 0):
+        super().__init__(*coordinates[index].tolist())
+        self.coordinates = coordinates
+        self.index = index
+        self.angle_between_edges = angle_between_edges
 
     def __str__(self) -> str:
         return "Corner: " + str(self.x) + ", " + str(self.y)
@@ -137,38 +148,97 @@ class Corner(Point):
     def __repr__(self) -> str:
         return str(self)
 
-    def __sub__(self, other: Corner) -> Corner:
-        new_corner = self
-        new_corner.x = self.x - other.x
-        new_corner.y = self.y - other.y
-        return new_corner
+    @property
+    def first_edge(self) -> Edge:
+        return Edge(self, Point(*self.coordinates[self.index - 1].tolist()))
+
+    @property
+    def second_edge(self) -> Edge:
+        return Edge(self, Point(*self.coordinates[(self.index + 1) % len(self.coordinates)].tolist()))
+
+    @staticmethod
+    def get_corners(coordinates: np.ndarray) -> list[Corner]:
+        """
+        Gives the corners of a contour or piece, the angles between their edges being computed at once
+        :param coordinates: coordinates of the corners, one row (x, y) per corner
+        :return: the list of the corners
+        """
+        angles = Corner.get_angles_between_edges(coordinates).tolist()
+        return [Corner(coordinates, i, angle) for i, angle in enumerate(angles)]
+
+    @staticmethod
+    def get_angles_between_edges(coordinates: np.ndarray) -> np.ndarray:
+        """
+        Computes the angles between the edges of all the corners of a contour or piece at once
+        :param coordinates: coordinates of the corners, one row (x, y) per corner
+        :return: the angle of each corner in degrees, negative when the next edge is clockwise from the previous one
+        """
+        first_edges = np.concatenate((coordinates[-1:], coordinates[:-1])) - coordinates
+        second_edges = np.concatenate((coordinates[1:], coordinates[:1])) - coordinates
+        dot_products = (first_edges * second_edges).sum(axis=1)
+        magnitudes = np.sqrt((first_edges ** 2).sum(axis=1) * (second_edges ** 2).sum(axis=1))
+        angles = np.degrees(np.arccos(np.clip(dot_products / magnitudes, -1, 1)))
+        cross_products = first_edges[:, 0] * second_edges[:, 1] - first_edges[:, 1] * second_edges[:, 0]
+        return np.where(cross_products < 0, -angles, angles)
+
 
-    def compute_angle_between_edges(self) -> None:
+class SubPuzzle:
+    """
+    Used to represent a connected region of the shape that is still to be filled, delimited by one contour
+
+    Attributes:
+        contour:        contour of the region in the image, as given by cv.findContours
+        corners:        corners of the region, linked by their edges
+        bounding_box:   bounding box of the contour (x, y, width, height)
+        start_point:    first point of the contour (y, x), used to sort the regions the same way after each update
+    """
+    def __init__(self, contour: np.ndarray, corners: list[Corner]):
+        self.contour: np.ndarray = contour
+        self.corners: list[Corner] = corners
+        x, y = contour[:, 0, 0], contour[:, 0, 1]
+        self.bounding_box: tuple[int, int, int, int] = (int(x.min()), int(y.min()), int(x.max() - x.min()) + 1, int(y.max() - y.min()) + 1)
+        self.start_point: tuple[int, int] = (int(contour[0][0][1]), int(contour[0][0][0]))
+
+    def intersects(self, box: tuple[int, int, int, int]) -> bool:
         """
-        Computes the angle between the two edges starting from this point
+        Tells if the bounding box of the region intersects another box
+        :param box: the other box (x, y, width, height)
+        :return: True if the two boxes intersect, False otherwise
         """
-        self.angle_between_edges = self.first_edge.direction.get_angle_with(self.second_edge.direction)
+        x, y, w, h = self.bounding_box
+        return x < box[0] + box[2] and box[0] < x + w and y < box[1] + box[3] and box[1] < y + h
 
 
 class Piece:
     """
-    Used to represent the tangram pieces
+    Used to represent the tangram pieces. The geometry is stored in a small array of coordinates so that rotations,
+    shifts and flips are single matrix operations, the corners objects being built from it only when asked for
 
     Attributes:
 
         side_length:        length of a side of the shape
-        corners:             coordinates of the vertexes of the shape
+        coordinates:        coordinates of the vertexes of the shape, one row (x, y) per corner
+        corners_angles:     angle between the edges of each corner, in degrees
+        corners:            corners of the shape with their edges, view built from the coordinates
         position_in_image:  coordinates of the shape in the image_processor submitted by the user
         pivot_point:        coordinates of the pivot point the shapes refer to in order to rotate
+        scale:              ratio between the size of the piece and the size given by TANGRAM_SIDE_LENGTH, below 1 for
+                            the pieces of the coarse search
         area:               area of the piece in pixels
         rotation:           angle of rotation of the piece in degrees
         color:              color of the piece, RGB
         name:               name of the piece
+        max_corners_shifts:       number of corners shifts before the piece is back to its original corner
+        distinct_corners_shifts:  number of first corners shifts giving different footprints, the following ones being
+                                  equivalent by symmetry of the piece
     """
 
-    def __init__(self, color: (int, int, int) = (0, 0, 0)) -> None:
-        self.side_length: int = settings.TANGRAM_SIDE_LENGTH
-        self.corners: list[Corner] = []
+    def __init__(self, color: (int, int, int) = (0, 0, 0), scale: float = 1) -> None:
+        self.scale: float = scale
+        self.side_length: int = settings.TANGRAM_SIDE_LENGTH * scale
+        self.coordinates: np.ndarray = np.zeros((0, 2))
+        self.corners_angles: np.ndarray = np.zeros(0)
+        self.corners_views: list[Corner] | None = None
         self.position_in_image: Point = Point()
         self.pivot_point: Point = Point()
         self.area: int = 0
@@ -176,6 +246,7 @@ class Piece:
         self.color: tuple[int] = color
         self.name: str = ""
         self.max_corners_shifts = 0
+        self.distinct_corners_shifts = 0
         self.corners_shifts_counter = 0
 
     def __str__(self):
@@ -184,16 +255,35 @@ class Piece:
     def __repr__(self):
         return str(self)
 
+    def copy(self) -> Piece:
+        """
+        Gives an independent copy of the piece without deep copying it: moving a piece always replaces its coordinates
+        array, position and pivot point instead of modifying them, so they can be shared until one of the copies moves
+        :return: the copy of the piece
+        """
+        return copy(self)
+
+    @property
+    def corners(self) -> list[Corner]:
+        if self.corners_views is None:
+            self.corners_views = [Corner(self.coordinates, i, angle) for i, angle in enumerate(self.corners_angles.tolist())]
+        return self.corners_views
+
+    @corners.setter
+    def corners(self, corners: list[Point]) -> None:
+        self.coordinates = np.array([[corner.x, corner.y] for corner in corners], dtype=float).reshape((-1, 2))
+        self.compute_edges()
+
     def shift_corners(self) -> None:
         """
         Shifts the corners of the piece by one index, to work with another of its corners
         """
-        self.corners.append(self.corners.pop(0))
-        for i in range(len(self.corners) - 1, -1, -1):
-            self.corners[i] -= self.corners[0]
-        self.pivot_point = self.corners[0]
+        self.coordinates = np.concatenate((self.coordinates[1:], self.coordinates[:1]))
+        self.coordinates -= self.coordinates[0]
+        self.corners_angles = np.concatenate((self.corners_angles[1:], self.corners_angles[:1]))
+        self.corners_views = None
+        self.pivot_point = Point(0, 0)
         self.corners_shifts_counter += 1
-        self.compute_edges()
 
     def rotate_shape_around_its_pivot_point(self, angle: float) -> None:
         """
@@ -203,33 +293,42 @@ class Piece:
         angle = - angle  # to rotate counterclockwise
         self.rotation += angle
         angle = np.deg2rad(angle)
-        for i in range(0, len(self.corners)):
-            ox, oy = self.pivot_point.x, self.pivot_point.y
-            px, py = self.corners[i].x, self.corners[i].y
-            qx = ox + np.cos(angle) * (px - ox) - np.sin(angle) * (py - oy)
-            qy = oy + np.sin(angle) * (px - ox) + np.cos(angle) * (py - oy)
-            self.corners[i] = Corner(qx, qy)
-        self.compute_edges()
+        cos, sin = np.cos(angle), np.sin(angle)
+        pivot = np.array([self.pivot_point.x, self.pivot_point.y])
+        self.coordinates = pivot + (self.coordinates - pivot) @ np.array([[cos, sin], [-sin, cos]])
+        self.corners_views = None  # a rotation keeps the angles between the edges
+
+    def get_points_array(self) -> np.ndarray:
+        """
+        Gives the coordinates of the shape in the image_processor reference frame, as an array
+        :return: the coordinates of the points, one row (x, y) per corner
+        """
+        return self.coordinates + (self.position_in_image.x, self.position_in_image.y)
 
     def get_points_in_image(self) -> list[Point]:
         """
         Gives the coordinates of the shape in the image_processor reference frame
         :return: the coordinates of the points
         """
-        coordinates_points = []
-        for point in self.corners:
-            coordinates_points.append(point + self.position_in_image)
-        return coordinates_points
+        return [Point(x, y) for x, y in self.get_points_array().tolist()]
+
+    def get_bounding_box(self) -> tuple[int, int, int, int]:
+        """
+        Gives the box containing all the pixels of the piece in the image_processor
+        :return: the bounding box (x, y, width, height)
+        """
+        points = self.get_points_array()
+        min_x, min_y = np.floor(points.min(axis=0)).astype(int)
+        max_x, max_y = np.ceil(points.max(axis=0)).astype(int)
+        return int(min_x) - 1, int(min_y) - 1, int(max_x - min_x) + 3, int(max_y - min_y) + 3
 
     def compute_edges(self) -> None:
         """
-        Computes the edges of all the corners of the piece
+        Computes the angles between the edges of all the corners of the piece at once, the corners objects being
+        rebuilt on demand
         """
-        len_corners = len(self.corners)
-        for i in range(0, len_corners):
-            self.corners[i].first_edge = Edge(self.corners[i], self.corners[i - 1])
-            self.corners[i].second_edge = Edge(self.corners[i], self.corners[(i + 1) % len_corners])
-            self.corners[i].compute_angle_between_edges()
+        self.corners_angles = Corner.get_angles_between_edges(self.coordinates)
+        self.corners_views = None
 
     def reset_rotation(self) -> None:
         """
@@ -243,17 +342,17 @@ class Square(Piece):
     Square tangram piece
     """
 
-    def __init__(self, color=(0, 0, 0)):
-        super().__init__(color)
-        self.side_length = (np.sqrt(2) * settings.TANGRAM_SIDE_LENGTH) / 4
-        self.corners = [
-            Corner(0, 0),
-            Corner(self.side_length, 0),
-            Corner(self.side_length, self.side_length),
-            Corner(0, self.side_length)
-        ]
+    def __init__(self, color=(0, 0, 0), scale: float = 1):
+        super().__init__(color, scale)
+        self.side_length = (np.sqrt(2) * settings.TANGRAM_SIDE_LENGTH * scale) / 4
+        self.coordinates = np.array([
+            [0, 0],
+            [self.side_length, 0],
+            [self.side_length, self.side_length],
+            [0, self.side_length]
+        ])
         self.max_corners_shifts = 4
-        self.pivot_point = self.corners[0]
+        self.distinct_corners_shifts = 1  # all the corners of the square give the same footprint
         self.compute_edges()
         self.area = self.side_length ** 2
         self.name = "Square"
@@ -264,21 +363,21 @@ class Triangle(Piece):
     Triangle tangram piece
     """
 
-    def __init__(self, color=(0, 0, 0)):
-        super().__init__(color)
+    def __init__(self, color=(0, 0, 0), scale: float = 1):
+        super().__init__(color, scale)
         self.side_length = 0
         self.max_corners_shifts = 3
+        self.distinct_corners_shifts = 3
 
     def setup_triangle(self) -> None:
         """
         Sets up the triangle attributes
         """
-        self.corners = [
-            Corner(0, 0),
-            Corner(self.side_length, 0),
-            Corner(self.side_length, self.side_length),
-        ]
-        self.pivot_point = self.corners[0]
+        self.coordinates = np.array([
+            [0, 0],
+            [self.side_length, 0],
+            [self.side_length, self.side_length],
+        ])
         self.compute_edges()
         self.area = (self.side_length ** 2) // 2
 
@@ -288,9 +387,9 @@ class SmallTriangle(Triangle):
     Small triangle tangram piece
     """
 
-    def __init__(self, color=(0, 0, 0)):
-        super().__init__(color)
-        self.side_length = (settings.TANGRAM_SIDE_LENGTH * np.sqrt(2)) / 4
+    def __init__(self, color=(0, 0, 0), scale: float = 1):
+        super().__init__(color, scale)
+        self.side_length = (settings.TANGRAM_SIDE_LENGTH * scale * np.sqrt(2)) / 4
         self.setup_triangle()
         self.name = "Small Triangle"
 
@@ -300,9 +399,9 @@ class MediumTriangle(Triangle):
     Medium triangle tangram piece
     """
 
-    def __init__(self, color=(0, 0, 0)):
-        super().__init__(color)
-        self.side_length = settings.TANGRAM_SIDE_LENGTH / 2
+    def __init__(self, color=(0, 0, 0), scale: float = 1):
+        super().__init__(color, scale)
+        self.side_length = settings.TANGRAM_SIDE_LENGTH * scale / 2
         self.setup_triangle()
         self.name = "Medium Triangle"
 
@@ -312,9 +411,9 @@ class LargeTriangle(Triangle):
     Large triangle tangram piece
     """
 
-    def __init__(self, color=(0, 0, 0)):
-        super().__init__(color)
-        self.side_length = (settings.TANGRAM_SIDE_LENGTH * np.sqrt(2)) / 2
+    def __init__(self, color=(0, 0, 0), scale: float = 1):
+        super().__init__(color, scale)
+        self.side_length = (settings.TANGRAM_SIDE_LENGTH * scale * np.sqrt(2)) / 2
         self.setup_triangle()
         self.name = "Large Triangle"
 
@@ -324,18 +423,18 @@ class Parallelogram(Piece):
     Parallelogram tangram piece
     """
 
-    def __init__(self, color=(0, 0, 0)):
-        super().__init__(color)
-        self.long_side_length = settings.TANGRAM_SIDE_LENGTH / 2
-        self.height = settings.TANGRAM_SIDE_LENGTH / 4
-        self.corners = [
-            Corner(0, 0),
-            Corner(self.long_side_length, 0),
-            Corner(3 * self.long_side_length / 2, self.height),
-            Corner(self.long_side_length / 2, self.height)
-        ]
+    def __init__(self, color=(0, 0, 0), scale: float = 1):
+        super().__init__(color, scale)
+        self.long_side_length = settings.TANGRAM_SIDE_LENGTH * scale / 2
+        self.height = settings.TANGRAM_SIDE_LENGTH * scale / 4
+        self.coordinates = np.array([
+            [0, 0],
+            [self.long_side_length, 0],
+            [3 * self.long_side_length / 2, self.height],
+            [self.long_side_length / 2, self.height]
+        ])
         self.max_corners_shifts = 4
-        self.pivot_point = self.corners[0]
+        self.distinct_corners_shifts = 2  # opposite corners give the same footprint, by central symmetry
         self.compute_edges()
         self.area = self.long_side_length * self.height
         self.name = "Parallelogram"
@@ -345,7 +444,7 @@ class Parallelogram(Piece):
         """
         Flips the parallelogram (mirrored shape)
         """
-        for corner in self.corners:
-            corner.x *= -1
+        self.coordinates = self.coordinates * (-1, 1)
+        self.corners_angles = -self.corners_angles  # a mirror reverses the angles between the edges
+        self.corners_views = None
         self.is_flipped = not self.is_flipped
-        self.compute_edges()
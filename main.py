@@ -1,24 +1,61 @@
 import time
 from TangramSolver import TangramSolver
-from utils import *
+from SearchEvent import SearchEvent
+from utils import place_all_pieces_on_image, show_image
 from ImageProcessor import ImageProcessor
-from ShapeComposer import ShapeComposer
 from StatsHandler import StatsHandler
+from ResultCache import ResultCache
+from MoveOrdering import MOVE_ORDERINGS
+from settings import *
 import argparse
 
+# the editor (pygame and tkinter), the batch solver and the solution index are imported only when they are used, to
+# keep the start of a headless solve short
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description='Tangram solver')
     parser.add_argument('--imagePath', type=str, default=None, help='Path to the image_processor to solve')
     parser.add_argument('--saveData', type=bool, default=False, help='Path to save the data relative to the solving process')
     parser.add_argument('--createFig', type=bool, default=True, help='Option to create a figure of using the editor')
+    parser.add_argument('--headless', type=bool, default=False, help='Option to solve without any window: the editor is not opened and the solution is not displayed')
+    parser.add_argument('--batch', type=str, default=None, help='Directory or glob pattern (like user_shapes/*.png) of puzzles to solve in batch')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes, used to solve several puzzles in batch mode or to split the search tree of a single puzzle')
+    parser.add_argument('--batchOutput', type=str, default='batch_results.jsonl', help='Path of the jsonl file where the batch results are written')
+    parser.add_argument('--engine', type=str, default=SOLVER_ENGINE, choices=['raster', 'exact', 'coarse'], help='Raster search on the pixels, exact search on the lattice of the tangram, or raster search on a downscaled image refined at full resolution')
+    parser.add_argument('--solutionIndex', type=str, default=None, help='Path of the index of the shapes already solved, looked up before solving and completed with the new solutions')
+    parser.add_argument('--resultCache', type=str, default=None, help='Directory of the cache of the results, in which the puzzles already solved are found by the hash of their image')
+    parser.add_argument('--searchStats', type=bool, default=COLLECT_SEARCH_STATS, help='Option to collect the counters and timers of the search, saved with the data')
+    parser.add_argument('--timeBudget', type=float, default=SOLVER_TIME_BUDGET, help='Maximum duration of the search in seconds, the best partial placement being given once it runs out')
+    parser.add_argument('--nodeBudget', type=int, default=SOLVER_NODE_BUDGET, help='Maximum number of nodes expanded by the search, the best partial placement being given once it runs out')
+    parser.add_argument('--ordering', type=str, default=MOVE_ORDERING, choices=list(MOVE_ORDERINGS), help='Order in which the solver tries the pieces and the corners of the shape')
+    parser.add_argument('--allSolutions', type=bool, default=False, help='Option to enumerate all the distinct solutions of the puzzle, printed as they are found and saved with the data')
+    parser.add_argument('--maxSolutions', type=int, default=MAX_SOLUTIONS_NUMBER, help='Number of distinct solutions after which the enumeration stops')
 
     args = parser.parse_args()
     image_path = ''
 
-    if args.imagePath is not None:
+    if args.batch is not None:
+        from BatchSolver import BatchSolver
+        batch_solver = BatchSolver(args.batch, args.batchOutput, args.workers, args.ordering, args.engine, args.solutionIndex, args.resultCache,
+                                   args.timeBudget, args.nodeBudget)
+        batch_solver.run()
+        print(f"Solved {batch_solver.solved_number}/{len(batch_solver.image_paths)} puzzles in {batch_solver.duration:.2f}s "
+              f"({batch_solver.get_puzzles_per_second():.2f} puzzles/s)")
+        if batch_solver.errors_number > 0:
+            print(f"{batch_solver.errors_number}/{len(batch_solver.image_paths)} puzzles could not be read or solved")
+        if batch_solver.incomplete_number > 0:
+            print(f"{batch_solver.incomplete_number}/{len(batch_solver.image_paths)} puzzles ran out of budget")
+        if args.solutionIndex is not None:
+            print(f"{batch_solver.index_hits_number}/{len(batch_solver.image_paths)} puzzles found in the solution index")
+            print(f"{batch_solver.index_additions_number} puzzles added to the solution index")
+        if args.resultCache is not None:
+            print(f"{batch_solver.cache_hits_number}/{len(batch_solver.image_paths)} puzzles found in the result cache")
+        exit(0)
+    elif args.imagePath is not None:
         image_path = args.imagePath
-    elif args.createFig:
+    elif args.createFig and not args.headless:
+        from ShapeComposer import ShapeComposer
         editor = ShapeComposer()
         image_path = editor.run()
     else:
@@ -26,15 +63,54 @@ if __name__ == "__main__":
         exit(0)
 
     image_processor = ImageProcessor(image_path)
-    stats_handler = StatsHandler(image_path)
+    whole_image = image_processor.get_whole_image()  # the results are given in the whole image, the solver working on the cropped one
+    stats_handler = StatsHandler(image_path, ResultCache(args.resultCache) if args.resultCache is not None else None)
+
+    if not args.allSolutions and stats_handler.load_cached_result(whole_image):  # the cache only holds one solution
+        print("Result found in the result cache")
+        used_pieces = stats_handler.get_used_pieces()
+        solve_duration = stats_handler.stats["time"]
+        status = stats_handler.status
+    else:
+        solution_index = None
+        if args.solutionIndex is not None:
+            from SolutionIndex import SolutionIndex
+            solution_index = SolutionIndex(args.solutionIndex)
+
+        start_time = time.time()
+        solver = TangramSolver(image_processor.image, args.workers if args.workers is not None else 1, move_ordering=args.ordering, engine=args.engine,
+                               solution_index=solution_index, collect_stats=args.searchStats, time_budget=args.timeBudget, node_budget=args.nodeBudget,
+                               lazy=args.allSolutions, enumerate_solutions=args.allSolutions, max_solutions_number=args.maxSolutions)
+        if args.allSolutions:
+            for event in solver.solve_steps():
+                if event.kind == SearchEvent.SOLUTION_FOUND:
+                    print(f"Solution {len(solver.solutions)} found after {time.time() - start_time:.2f}s")
+            print(f"{len(solver.solutions)} distinct solutions{', the enumeration stopped before the end' if solver.is_incomplete else ''}")
+            stats_handler.set_all_solutions([image_processor.get_pieces_in_whole_image(pieces) for pieces in solver.solutions])
+        solve_duration = time.time() - start_time
+        status = solver.status
+        if solver.engine_fallback is not None:
+            print(f"{solver.engine_fallback}, the raster search was used instead")
+        used_pieces = image_processor.get_pieces_in_whole_image(solver.partial_node.current_state.used_pieces) if status != "unsolvable" else None
+        if status == "incomplete":
+            print(f"Search incomplete, budget exhausted: best partial placement with {len(used_pieces)}/7 pieces")
 
-    start_time = time.time()
-    solver = TangramSolver(image_processor.image)
-    solve_duration = time.time() - start_time
+        if solution_index is not None:
+            print(f"Solution {'found in' if solver.is_index_hit else 'not in'} the solution index {solution_index.get_stats()}")
+            if solution_index.is_updated:
+                solution_index.save()
+        stats_handler.set_result(solve_duration, len(image_processor.corners), used_pieces, solver.search_stats, status)
+        if not args.allSolutions:
+            stats_handler.cache_result(whole_image)
 
-    if solver.solution_node is not None:
+    if used_pieces is not None:
         if args.saveData:
-            stats_handler.save_data(solve_duration, len(image_processor.corners), solver.solution_node.current_state.used_pieces, image_processor.image)
+            stats_handler.save_data(solve_duration, len(image_processor.corners), used_pieces, whole_image, stats_handler.search_stats, status)
 
-        result_image = place_all_pieces_on_image(image_processor.image, solver.solution_node.current_state.used_pieces)
-        show_image(result_image)
+        if args.headless:
+            print(f"Puzzle {status} in {solve_duration:.2f}s with {len(used_pieces)} pieces")
+        else:
+            result_image = place_all_pieces_on_image(whole_image, used_pieces)
+            show_image(result_image)
+    elif args.headless:
+        print(f"Puzzle unsolvable, searched in {solve_duration:.2f}s")
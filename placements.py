@@ -0,0 +1,106 @@
+from __future__ import annotations
+from typing import Iterator
+from utils import approx_eq, get_rotation_angle_between_piece_and_figure
+
+### CANDIDATE PLACEMENTS ###
+
+class Placement:
+    """
+    Describes one candidate placement of a piece on a corner of the shape, without moving any piece. The rotation of
+    the piece only depends on the other attributes and on the edges of the shape corner, it is derived on demand by
+    get_rotation instead of being computed for the placements rejected by their angles
+
+    Attributes:
+        piece_index:            index of the piece in the available pieces of the state
+        corner_shift:           number of corners shifts of the piece, i.e. index of the piece corner put on the shape
+        is_flipped:             True if the piece is mirrored (only for the parallelogram)
+        shape_corner_index:     index of the corner of the shape on which the piece is placed
+    """
+    __slots__ = ("piece_index", "corner_shift", "is_flipped", "shape_corner_index")
+
+    def __init__(self, piece_index: int, corner_shift: int, is_flipped: bool, shape_corner_index: int):
+        self.piece_index: int = piece_index
+        self.corner_shift: int = corner_shift
+        self.is_flipped: bool = is_flipped
+        self.shape_corner_index: int = shape_corner_index
+
+    def __repr__(self) -> str:
+        return f"Placement(piece {self.piece_index}, shift {self.corner_shift}, flipped {self.is_flipped}, corner {self.shape_corner_index})"
+
+    def get_rotation(self, state) -> float:
+        """
+        Gives the rotation aligning the piece with the corner of the shape, the one applied when the placement is tried
+        :param state: state from which the piece is placed
+        :return: the rotation angle in degrees, see get_rotation_angle_between_piece_and_figure
+        """
+        return get_rotation_angle_between_piece_and_figure(state.get_placed_piece(self), state.corners[self.shape_corner_index])
+
+
+def generate_placements(state) -> Iterator[Placement]:
+    """
+    Lazily gives all the placements of the available pieces on the corners of the shape, piece by piece, then corner
+    by corner, then flip, then corner shift. The pieces and the corners are taken in the order of the move ordering of
+    the state.
+    :param state: state from which the pieces are placed
+    :return: the generator of the placements
+    """
+    corners_order = state.move_ordering.order_corners(state)
+    for piece_index in state.move_ordering.order_pieces(state):
+        piece = state.available_pieces[piece_index]
+        for shape_corner_index in corners_order:
+            for is_flipped in ((False, True) if piece.name == "Parallelogram" else (False,)):
+                for corner_shift in range(piece.max_corners_shifts):
+                    yield Placement(piece_index, corner_shift, is_flipped, shape_corner_index)
+
+def skip_identical_pieces(state, placements: Iterator[Placement]) -> Iterator[Placement]:
+    """
+    Only keeps the first of the identical pieces, the others giving the same subtrees
+    :param state: state from which the pieces are placed
+    :param placements: placements to filter
+    :return: the filtered placements
+    """
+    for placement in placements:
+        if not state.is_piece_already_tried(placement.piece_index):
+            yield placement
+
+def skip_symmetric_corner_shifts(state, placements: Iterator[Placement]) -> Iterator[Placement]:
+    """
+    Skips the corners of the pieces giving the same footprint as a previous one, by symmetry of the piece
+    :param state: state from which the pieces are placed
+    :param placements: placements to filter
+    :return: the filtered placements
+    """
+    for placement in placements:
+        if placement.corner_shift < state.available_pieces[placement.piece_index].distinct_corners_shifts:
+            yield placement
+
+def keep_matching_corner_angles(state, placements: Iterator[Placement]) -> Iterator[Placement]:
+    """
+    Only keeps the placements where the angle of the piece corner matches the angle of the shape corner
+    :param state: state from which the pieces are placed
+    :param placements: placements to filter
+    :return: the filtered placements
+    """
+    for placement in placements:
+        piece = state.available_pieces[placement.piece_index]
+        shape_corner = state.corners[placement.shape_corner_index]
+        if approx_eq(abs(shape_corner.angle_between_edges), abs(piece.corners_angles[placement.corner_shift])):
+            yield placement
+        else:
+            state.search_stats.count_rejection("angleMismatch")
+
+
+# filters applied in this order on the generated placements, each one taking and giving a generator of placements
+PLACEMENT_FILTERS = [skip_identical_pieces, skip_symmetric_corner_shifts, keep_matching_corner_angles]
+
+def get_candidate_placements(state, filters=None) -> Iterator[Placement]:
+    """
+    Gives the lazy generator of the placements to try from a state, with the filters composed on top of it
+    :param state: state from which the pieces are placed
+    :param filters: filters to apply, PLACEMENT_FILTERS by default
+    :return: the generator of the candidate placements
+    """
+    placements = generate_placements(state)
+    for placement_filter in (filters if filters is not None else PLACEMENT_FILTERS):
+        placements = placement_filter(state, placements)
+    return placements
@@ -3,6 +3,54 @@ GRID_CELL_SIZE = 20
 GRID_SIZE = (GRID_W, GRID_H) = (MENU_WIDTH // GRID_CELL_SIZE, MENU_HEIGHT // GRID_CELL_SIZE)
 TANGRAM_SIDE_LENGTH = 280
 TANGRAM_AREA = TANGRAM_SIDE_LENGTH ** 2
+CROP_MARGIN = 20  # white margin in pixels kept around the shape when the image is cropped, at the size of the solver
 PIECE_ROTATION = 45
 MIN_DIST_BETWEEN_TWO_CORNERS = 5
+MIN_SCALED_DIST_BETWEEN_TWO_CORNERS = 1.5  # lower bound of the distance above once scaled down for the coarse search
 MIN_SUB_PUZZLE_AREA = .8 * ((TANGRAM_SIDE_LENGTH / 2) * (TANGRAM_SIDE_LENGTH / 4)) // 2 # area of the small triangle
+PARALLEL_SPLIT_DEPTH = 2
+TRANSPOSITION_TABLE_SIZE = 100_000  # number of dead configurations remembered by the solver
+PIECE_MASK_LIBRARY_PATH = "piece_masks.npz"  # built by running PieceMaskLibrary.py, the library is built at start if absent
+PIECE_MASK_ANGLE_STEP = .1  # precision in degrees of the rotations of the masks in the library
+PIECE_MASK_LIBRARY_MAX_BYTES = 50_000_000  # maximum memory taken by the masks of the orientations met during the search, the least recently used ones are removed
+PACKED_STATE_IMAGES = False  # stores the images of the search states with 8 pixels per byte
+SMALL_TRIANGLE_AREA = TANGRAM_AREA // 16  # unit of area of the pieces, the large triangle being 4 units
+FEASIBILITY_PRUNING = True  # prunes the states whose uncovered regions cannot be filled by the remaining pieces
+FEASIBILITY_AREA_TOLERANCE = .4  # accepted difference in units between a region and the pieces that may fill it
+FEASIBILITY_SLIVER_TOLERANCE = .3  # uncovered regions up to this area in units are slivers left by the rasterization of the pieces, the larger ones must be filled
+SOLVER_ENGINE = "raster"  # "raster" places the pieces on the pixels, "exact" on the exact polygons of the lattice for the shapes built on it, "coarse" on a downscaled image first
+EXACT_POLYGON_EPSILON = 3  # maximum distance in pixels between the contour and the polygon snapped on the lattice
+EXACT_MIN_EDGE_LENGTH = .3  # edges of the contour shorter than this, in eighths of the tangram side, are dropped
+EXACT_SNAP_TOLERANCE = .08  # maximum difference in eighths of the tangram side between an edge and its lattice length
+MOVE_ORDERING = "constrained"  # order in which the pieces and corners are tried, one of MoveOrdering.MOVE_ORDERINGS
+SOLUTION_INDEX_PATH = "solution_index.npz"  # solutions of the shapes already solved, see SolutionIndex
+SOLUTION_INDEX_ANGLES_NUMBER = 360  # number of directions of the angular profiles describing the shapes
+SOLUTION_INDEX_COEFFICIENTS_NUMBER = 24  # number of Fourier coefficients of each profile kept in the signatures
+SOLUTION_INDEX_MAX_DISTANCE = .12  # maximum distance between the signatures of two shapes considered the same
+SOLUTION_INDEX_CANDIDATES_NUMBER = 3  # number of closest entries of the index tried before looking for a solution
+SOLUTION_INDEX_MIN_COVERAGE = .96  # ratio of the area of the pieces moved from the index that must cover uncovered black pixels
+SOLUTION_INDEX_MAX_SHIFT = 12  # maximum shift in pixels of the pieces moved from the index to fit the new shape
+SOLUTION_INDEX_MAX_ROTATION_ERROR = 1.5  # maximum correction in degrees of the rotation between two shapes tried to fit the pieces
+RESULT_CACHE_DIRECTORY = "result_cache"  # results of the solver stored by hash of the processed image, see ResultCache
+RESULT_CACHE_MAX_SIZE = 50_000_000  # maximum size in bytes of the result cache, the least recently used results are removed
+RESULT_CACHE_EVICTION_RATIO = .9  # ratio of the maximum size under which the eviction brings the result cache, so that it does not scan it again at each new result
+COLLECT_SEARCH_STATS = False  # measures the search with counters and timers, see SearchStats
+SOLVER_TIME_BUDGET = None  # maximum duration of a search in seconds, the best partial placement is given once it runs out, None for no limit
+SOLVER_NODE_BUDGET = None  # maximum number of nodes expanded by a search, None for no limit
+MAX_SOLUTIONS_NUMBER = None  # number of distinct solutions after which the enumeration of the solutions stops, None for no limit
+SAME_PLACEMENT_MAX_DISTANCE = 10  # maximum distance in pixels between the vertexes of two pieces placed the same way, when enumerating the solutions
+ASYNC_EVENTS_QUEUE_SIZE = 64  # events of the search given to asyncio code and not read yet, the search waits once they are as many, see AsyncSolver
+SERVICE_HOST = "127.0.0.1"  # address of the solver service, see SolverService
+SERVICE_PORT = 8765
+SERVICE_WORKERS_NUMBER = None  # worker processes of the solver service, the number of cpus if None
+SERVICE_MAX_QUEUE_SIZE = 16  # requests waiting for a worker, the next ones are refused with a 503 status
+SERVICE_TIMEOUT = 60  # maximum duration of the search of a request in seconds, the best partial placement is given afterwards
+SERVICE_TIMEOUT_GRACE = 10  # time in seconds left to a worker after the timeout before the request fails with a 504 status
+SERVICE_LATENCY_WINDOW = 1000  # number of the last requests whose latency is given by the metrics
+SERVICE_MAX_REQUEST_SIZE = 10_000_000  # maximum size in bytes of the image of a request
+COARSE_SIDE_LENGTH = 70  # side length of the tangram in the coarse search of the "coarse" engine, see CoarseSolver
+COARSE_NODE_BUDGET = 300  # nodes expanded by the coarse search before falling back to the full resolution search
+COARSE_MAX_CORNER_DISTANCE = 30  # maximum distance in pixels between a coarse placement and the full resolution corners it is refined on
+COARSE_MAX_SHIFT = 8  # maximum shift in pixels of a coarse placement scaled up to fit the full resolution shape
+COARSE_MAX_ROTATION_ERROR = 3  # maximum correction in degrees of the orientation of a coarse placement scaled up, tried by steps of 1 degree
+COARSE_REFINEMENT_NODE_BUDGET = 200  # maximum number of pieces placed at full resolution while refining the coarse solutions
@@ -2,6 +2,9 @@ from __future__ import annotations
 import cv2 as cv
 from elements import *
 from settings import *
+from PieceMaskLibrary import PIECE_MASK_LIBRARY
+from SearchStats import SearchStats, DISABLED_SEARCH_STATS
+from PackedImage import PackedImage
 
 ### CALCULATIONS UTILS ###
 
@@ -29,32 +32,49 @@ def get_duplicate(values: list[float]) -> float:
                 result = values[i]
     return result
 
-def accept_new_piece(prev_img: np.ndarray, candidate_img: np.ndarray, piece_area: int) -> bool:
+def get_signed_area(points: np.ndarray) -> float:
+    """
+    Gives the area of a polygon with the shoelace formula, its sign telling the orientation of its vertexes
+    :param points: vertexes of the polygon, one row (x, y) per vertex
+    :return: the signed area, positive for the clockwise vertexes of the image (y downwards)
+    """
+    next_points = np.roll(points, -1, axis=0)
+    return float((points[:, 0] * next_points[:, 1] - next_points[:, 0] * points[:, 1]).sum()) / 2
+
+def accept_new_piece(image: np.ndarray | PackedImage, piece_mask: np.ndarray, piece_box: tuple[int, int, int, int], piece_area: int) -> bool:
     """
     Says if the placement of the new piece is rejected considering two criteria:
     If the new piece is placed over another piece
     Or if less than 97% of the new piece covers the drawing (black pixels)
-    :param prev_img: image_processor before placing the new piece
-    :param candidate_img: image_processor with the new piece placed
+    Only the pixels of the bounding box of the piece are looked at
+    :param image: image_processor before placing the new piece
+    :param piece_mask: mask of the pixels of the piece inside its bounding box
+    :param piece_box: bounding box of the piece in the image_processor (x, y, width, height)
     :param piece_area: area (number of pixels) of the piece placed
     :return: True if the piece is accepted, False otherwise
     """
     accept_ratio_black_covered = .96  # % of total pixels covered that are black
-    covered_black_pixels = (candidate_img == 255).sum() - (prev_img == 255).sum()
+    if isinstance(image, PackedImage):
+        covered_black_pixels = image.count_covered_black_pixels(piece_mask, piece_box)
+    else:
+        x, y, w, h = piece_box
+        covered_black_pixels = np.count_nonzero(piece_mask & (image[y:y + h, x:x + w] == 0))
     black_covered_ratio = covered_black_pixels / piece_area
     return black_covered_ratio > accept_ratio_black_covered
 
-def get_rotation_angle_between_piece_and_figure(piece_corner: Corner, shape_corner: Corner):
+def get_rotation_angle_between_piece_and_figure(piece: Piece, shape_corner: Corner):
     """
     Gives the rotation to give to the piece in order to be aligned with the shape
-    :param piece_corner: corner of the piece
+    :param piece: piece, aligned on its first corner
     :param shape_corner: corner of the shape
     :return: the rotation angle
     """
-    a1 = shape_corner.first_edge.direction.get_angle_with(piece_corner.first_edge.direction)
-    a2 = shape_corner.first_edge.direction.get_angle_with(piece_corner.second_edge.direction)
-    a3 = shape_corner.second_edge.direction.get_angle_with(piece_corner.first_edge.direction)
-    a4 = shape_corner.second_edge.direction.get_angle_with(piece_corner.second_edge.direction)
+    piece_first_edge = Vector(*(piece.coordinates[-1] - piece.coordinates[0]).tolist())
+    piece_second_edge = Vector(*(piece.coordinates[1] - piece.coordinates[0]).tolist())
+    a1 = shape_corner.first_edge.direction.get_angle_with(piece_first_edge)
+    a2 = shape_corner.first_edge.direction.get_angle_with(piece_second_edge)
+    a3 = shape_corner.second_edge.direction.get_angle_with(piece_first_edge)
+    a4 = shape_corner.second_edge.direction.get_angle_with(piece_second_edge)
     return get_duplicate([a1, a2, a3, a4])
 
 def are_two_triangle_corners_on_two_shape_corners(triangle_corners: list[Corner], shape_corners: list[Corner]) -> bool:
@@ -76,6 +96,37 @@ def are_two_triangle_corners_on_two_shape_corners(triangle_corners: list[Corner]
         triangle_corners_index += 1
     return close_triangle_corners_from_shape_corners > 1
 
+def can_pieces_fill_areas(areas: list[int], pieces: list[Piece]) -> bool:
+    """
+    Tells if the uncovered regions may be filled by the remaining pieces, only looking at their areas: each region must
+    be at least as large as the smallest piece and have the area of some subset of the pieces. The areas are counted in
+    small triangles, scaled to the remaining pieces since the shape is slightly larger than the pieces once resized.
+    The slivers left along the pieces by their rasterization, up to FEASIBILITY_SLIVER_TOLERANCE, are ignored.
+    :param areas: areas of the uncovered regions in pixels
+    :param pieces: remaining pieces
+    :return: True if every region may be filled, False otherwise
+    """
+    if len(pieces) == 0:
+        return True
+    small_triangle_area = SMALL_TRIANGLE_AREA * pieces[0].scale ** 2
+    areas = [area for area in areas if area > FEASIBILITY_SLIVER_TOLERANCE * small_triangle_area]
+    if len(areas) == 0:
+        return True
+    pieces_units = [round(piece.area / small_triangle_area) for piece in pieces]
+    area_unit = max(small_triangle_area, sum(areas) / sum(pieces_units))
+    subset_sums = {0}
+    for piece_units in pieces_units:
+        subset_sums |= {subset_sum + piece_units for subset_sum in subset_sums}
+    subset_sums.discard(0)
+    smallest_piece_units = min(pieces_units)
+    for area in areas:
+        area_units = area / area_unit
+        if area_units < smallest_piece_units - FEASIBILITY_AREA_TOLERANCE:
+            return False
+        if not any(abs(area_units - subset_sum) <= FEASIBILITY_AREA_TOLERANCE for subset_sum in subset_sums):
+            return False
+    return True
+
 ### IMAGE UTILS ###
 
 def show_image(image: np.ndarray) -> None:
@@ -112,32 +163,120 @@ def draw_piece_in_image(image: np.ndarray, piece, color: int | tuple[int, int, i
     :param color: color of the piece to draw, white by default
     :return the new matrix of the image_processor with the shape in it
     """
-    points = []
-    for point in piece.get_points_in_image():
-        points.append([point.x, point.y])
-    points = np.array(points, np.int32)
+    points = piece.get_points_array().astype(np.int32)
     points = points.reshape((-1, 1, 2))
     result_image = cv.fillPoly(image, [points], color)
     return result_image
 
-def is_piece_accepted_at_shape_corner(image: np.ndarray, piece: Piece, shape_corner: Corner) -> (bool, np.ndarray):
+def get_piece_mask(piece: Piece, image_shape: tuple[int, int]) -> (np.ndarray, tuple[int, int, int, int]):
+    """
+    Gives the rasterized piece from the mask library, placed in its bounding box instead of the whole image
+    :param piece: piece to rasterize, at its position in the image_processor
+    :param image_shape: shape of the image_processor, the box is clipped to it
+    :return: the boolean mask of the piece and its bounding box in the image_processor (x, y, width, height)
+    """
+    mask, (offset_x, offset_y) = PIECE_MASK_LIBRARY.get_mask(piece)
+    min_x = int(np.floor(round(piece.position_in_image.x + piece.pivot_point.x, 6))) + offset_x
+    min_y = int(np.floor(round(piece.position_in_image.y + piece.pivot_point.y, 6))) + offset_y
+    max_x, max_y = min_x + mask.shape[1], min_y + mask.shape[0]
+
+    x, y = max(min_x, 0), max(min_y, 0)  # clips the box to the image
+    w, h = min(max_x, image_shape[1]) - x, min(max_y, image_shape[0]) - y
+    if w <= 0 or h <= 0:
+        return np.zeros((0, 0), bool), (0, 0, 0, 0)
+    return mask[y - min_y:y - min_y + h, x - min_x:x - min_x + w], (x, y, w, h)
+
+def draw_piece_mask_in_image(image: np.ndarray | PackedImage, piece_mask: np.ndarray, piece_box: tuple[int, int, int, int], color: int = 255) -> np.ndarray | PackedImage:
+    """
+    Draws a rasterized piece on the image
+    :param image: image_processor we want to draw in
+    :param piece_mask: mask of the pixels of the piece inside its bounding box
+    :param piece_box: bounding box of the piece in the image_processor (x, y, width, height)
+    :param color: color of the piece to draw, white by default (packed images are always drawn in white)
+    :return: the image_processor with the piece drawn in it
+    """
+    if isinstance(image, PackedImage):
+        return image.draw_mask(piece_mask, piece_box)
+    x, y, w, h = piece_box
+    image[y:y + h, x:x + w][piece_mask] = color
+    return image
+
+def draw_pieces_masks_in_image(image: np.ndarray | PackedImage, pieces: list[Piece]) -> np.ndarray | PackedImage:
+    """
+    Draws placed pieces on the image with their masks from the library, giving the same pixels as the search placing
+    them one by one
+    :param image: image_processor we want to draw in
+    :param pieces: pieces to draw, at their position in the image_processor
+    :return: the image_processor with the pieces drawn in it
+    """
+    for piece in pieces:
+        piece_mask, piece_box = get_piece_mask(piece, image.shape)
+        image = draw_piece_mask_in_image(image, piece_mask, piece_box)
+    return image
+
+def is_piece_accepted_at_shape_corner(image: np.ndarray | PackedImage, piece: Piece, shape_corner: Corner, shape_corners: list[Corner],
+                                      search_stats: SearchStats = DISABLED_SEARCH_STATS) -> (bool, np.ndarray):
     """
     Tells if the piece placement at this corner of the shape is accepted or not, to know if trying to place it at this
     corner is worth it
     :param image: image_processor of which we place the piece
     :param piece: piece to place on the image_processor
     :param shape_corner: corner of the shape where we want to place the piece
-    :return: True if the placement is correct, False otherwise
+    :param shape_corners: all the corners of the image_processor
+    :param search_stats: stats of the search counting the rejections and timing the test
+    :return: True if the placement is correct, False otherwise, and the new image_processor if it is correct (the image
+    is only copied once the piece is accepted)
     """
-    rotation = get_rotation_angle_between_piece_and_figure(piece.corners[0], shape_corner)
+    rotation = get_rotation_angle_between_piece_and_figure(piece, shape_corner)
     piece.rotate_shape_around_its_pivot_point(rotation)
     piece.position_in_image = shape_corner
     if piece.name == "Large Triangle":  # if the large triangle doesn't touch two corners it can't be correct
-        if not are_two_triangle_corners_on_two_shape_corners(piece.get_points_in_image(), get_corners(image)):
+        if not are_two_triangle_corners_on_two_shape_corners(piece.get_points_in_image(), shape_corners):
+            search_stats.count_rejection("largeTriangleCorners")
             return False, image
-    candidate_image = draw_piece_in_image(image.copy(), piece)
-    piece_accepted = accept_new_piece(image, candidate_image, piece.area)
-    return piece_accepted, candidate_image
+    start_time = search_stats.start_timer()
+    piece_mask, piece_box = get_piece_mask(piece, image.shape)
+    search_stats.stop_timer("rasterization", start_time)
+    start_time = search_stats.start_timer()
+    is_accepted = accept_new_piece(image, piece_mask, piece_box, piece.area)
+    search_stats.stop_timer("acceptNewPiece", start_time)
+    if not is_accepted:
+        search_stats.count_rejection("coverageRatio")
+        return False, image
+    return True, draw_piece_mask_in_image(image.copy(), piece_mask, piece_box)
+
+def are_same_placements(piece: Piece, other_piece: Piece, max_distance: float = SAME_PLACEMENT_MAX_DISTANCE) -> bool:
+    """
+    Tells if two pieces cover the same polygon, whatever the order of their vertexes: the placements of a piece which
+    only differ by one of its symmetries, like a square rotated by 90 degrees, are the same
+    :param piece: first piece
+    :param other_piece: second piece
+    :param max_distance: maximum distance in pixels between a vertex of a piece and the closest vertex of the other one
+    :return: True if the pieces are of the same type and have the same vertexes, False otherwise
+    """
+    if piece.name != other_piece.name:
+        return False
+    points, other_points = piece.get_points_array(), other_piece.get_points_array()
+    distances = np.linalg.norm(points[:, None] - other_points[None], axis=2)
+    return bool((distances.min(axis=1) <= max_distance).all() and (distances.min(axis=0) <= max_distance).all())
+
+def are_same_solutions(pieces: list[Piece], other_pieces: list[Piece]) -> bool:
+    """
+    Tells if two solutions place the pieces the same way, whatever the order in which they were placed: solutions which
+    only differ by swapping two identical pieces or by the symmetries of the pieces are the same
+    :param pieces: pieces of the first solution
+    :param other_pieces: pieces of the second solution
+    :return: True if each piece of a solution is placed as a piece of the other one, False otherwise
+    """
+    if len(pieces) != len(other_pieces):
+        return False
+    unmatched_pieces = list(other_pieces)
+    for piece in pieces:
+        same_piece = next((other_piece for other_piece in unmatched_pieces if are_same_placements(piece, other_piece)), None)
+        if same_piece is None:
+            return False
+        unmatched_pieces.remove(same_piece)
+    return True
 
 def place_all_pieces_on_image(image: np.ndarray, pieces: list[Piece]) -> np.ndarray:
     """
@@ -159,41 +298,112 @@ def get_corners(image: np.ndarray) -> list[Corner]:
     :return: a list of the corners, which also has the edges in it
     """
     corners = []
+    for sub_puzzle in get_sub_puzzles(image):
+        corners.extend(sub_puzzle.corners)
+    return corners
+
+def get_sub_puzzles(image: np.ndarray, offset: tuple[int, int] = (0, 0), scale: float = 1) -> list[SubPuzzle]:
+    """
+    Gives the regions of the shape still to be filled, with their corners and edges
+    :param image: image_processor from which we want the regions
+    :param offset: position of the image in the full image_processor, when working on a part of it
+    :param scale: scale of the pieces, see Piece.scale, the distances and areas in pixels being scaled with it
+    :return: the list of the regions, sorted by the first point of their contour (bottom-right first)
+    """
+    sub_puzzles = []
     contours = cv.findContours(image, 1, 2)[0]
     for contour in contours[:-1]:  # last contour is the contour of the image
-        if cv.contourArea(contour) < MIN_SUB_PUZZLE_AREA:  # if the sub puzzle is too small, skips it
+        if cv.contourArea(contour) < MIN_SUB_PUZZLE_AREA * scale ** 2:  # if the sub puzzle is too small, skips it
             continue
+        if offset != (0, 0):
+            contour = contour + np.array(offset, dtype=contour.dtype)
+        sub_puzzles.append(SubPuzzle(contour, get_contour_corners(contour, scale)))
+    sub_puzzles.sort(key=lambda sub_puzzle: sub_puzzle.start_point, reverse=True)
+    return sub_puzzles
 
-        sub_puzzle_corners = [Corner(contour[0][0][0], contour[0][0][1])]
-        contour_length = len(contour)
+def get_contour_corners(contour: np.ndarray, scale: float = 1) -> list[Corner]:
+    """
+    Gives the corners of one contour of the shape, linked by their edges
+    :param contour: contour given by cv.findContours
+    :param scale: scale of the pieces, see Piece.scale, the distance under which two corners are merged being scaled
+    :return: the list of the corners of the contour
+    """
+    points = contour[:, 0].tolist()
+    sub_puzzle_corners = [points[0]]
+    min_distance = max(MIN_DIST_BETWEEN_TWO_CORNERS * scale, MIN_SCALED_DIST_BETWEEN_TWO_CORNERS)
 
-        for i in range(1, contour_length):  # gets all the corners
-            corner = Corner(contour[i][0][0], contour[i][0][1])
-            if not corner.is_close_to(sub_puzzle_corners[-1]):
-                sub_puzzle_corners.append(corner)
-            else:
-                # if too close, changes the last corner to the average of the two
-                sub_puzzle_corners[-1] = Corner(int((sub_puzzle_corners[-1].x + corner.x) / 2),
-                                                int((sub_puzzle_corners[-1].y + corner.y) / 2))
+    for x, y in points[1:]:  # gets all the corners
+        last_x, last_y = sub_puzzle_corners[-1]
+        if math.sqrt((x - last_x) ** 2 + (y - last_y) ** 2) >= min_distance:
+            sub_puzzle_corners.append([x, y])
+        else:
+            # if too close, changes the last corner to the average of the two
+            sub_puzzle_corners[-1] = [int((last_x + x) / 2), int((last_y + y) / 2)]
 
-        if sub_puzzle_corners[0].is_close_to(sub_puzzle_corners[-1]):
-            sub_puzzle_corners[0] = Corner(int((sub_puzzle_corners[-1].x + sub_puzzle_corners[0].x) / 2),
-                                            int((sub_puzzle_corners[-1].y + sub_puzzle_corners[0].y) / 2))
-            sub_puzzle_corners.pop()
+    (first_x, first_y), (last_x, last_y) = sub_puzzle_corners[0], sub_puzzle_corners[-1]
+    if math.sqrt((first_x - last_x) ** 2 + (first_y - last_y) ** 2) < min_distance:
+        sub_puzzle_corners[0] = [int((last_x + first_x) / 2), int((last_y + first_y) / 2)]
+        sub_puzzle_corners.pop()
 
-        corners_number = len(sub_puzzle_corners)
-        for i in range(corners_number):  # link them with edges
-            previous_corner = sub_puzzle_corners[i - 1]
-            corner = sub_puzzle_corners[i]
-            next_corner = sub_puzzle_corners[(i + 1) % corners_number]
+    return Corner.get_corners(np.array(sub_puzzle_corners, dtype=int).reshape((-1, 2)))
 
-            corner.first_edge = Edge(corner, previous_corner)
-            corner.second_edge = Edge(corner, next_corner)
+def update_sub_puzzles(image: np.ndarray | PackedImage, parent_sub_puzzles: list[SubPuzzle], changed_box: tuple[int, int, int, int],
+                       scale: float = 1) -> list[SubPuzzle]:
+    """
+    Gives the regions of the shape after a piece has been placed, only recomputing the regions touched by the piece.
+    Placing a piece only shrinks regions, so the touched regions are searched again in their own bounding box, the
+    other regions are kept as they are
+    :param image: image_processor with the new piece placed
+    :param parent_sub_puzzles: regions of the image_processor before placing the piece
+    :param changed_box: bounding box of the placed piece (x, y, width, height)
+    :param scale: scale of the pieces, see get_sub_puzzles
+    :return: the list of the regions, in the same order as get_sub_puzzles
+    """
+    touched_sub_puzzles = [sub_puzzle for sub_puzzle in parent_sub_puzzles if sub_puzzle.intersects(changed_box)]
+    if len(touched_sub_puzzles) == 0:
+        return parent_sub_puzzles.copy()
 
-            corner.compute_angle_between_edges()
+    min_x = min(sub_puzzle.bounding_box[0] for sub_puzzle in touched_sub_puzzles)
+    min_y = min(sub_puzzle.bounding_box[1] for sub_puzzle in touched_sub_puzzles)
+    max_x = max(sub_puzzle.bounding_box[0] + sub_puzzle.bounding_box[2] for sub_puzzle in touched_sub_puzzles)
+    max_y = max(sub_puzzle.bounding_box[1] + sub_puzzle.bounding_box[3] for sub_puzzle in touched_sub_puzzles)
 
-        corners.extend(sub_puzzle_corners)
-    return corners
+    # only keeps the touched regions in the crop, the other regions that overlap it are left to their parent contours
+    region_mask = np.zeros((max_y - min_y, max_x - min_x), np.uint8)
+    cv.fillPoly(region_mask, [sub_puzzle.contour - np.array((min_x, min_y), dtype=sub_puzzle.contour.dtype) for sub_puzzle in touched_sub_puzzles], 255)
+    cropped_image = np.where(region_mask == 255, get_image_region(image, (min_x, min_y, max_x - min_x, max_y - min_y)), 255).astype(np.uint8)
+    cropped_image = cv.copyMakeBorder(cropped_image, 1, 1, 1, 1, cv.BORDER_CONSTANT, value=255)
+
+    sub_puzzles = [sub_puzzle for sub_puzzle in parent_sub_puzzles if not sub_puzzle.intersects(changed_box)]
+    sub_puzzles.extend(get_sub_puzzles(cropped_image, (min_x - 1, min_y - 1), scale))
+    sub_puzzles.sort(key=lambda sub_puzzle: sub_puzzle.start_point, reverse=True)
+    return sub_puzzles
+
+def get_image_region(image: np.ndarray | PackedImage, box: tuple[int, int, int, int] = None) -> np.ndarray:
+    """
+    Gives a part of an image as a black (0) and white (255) array, unpacking it if needed
+    :param image: the image, packed or not
+    :param box: part of the image (x, y, width, height), the whole image by default
+    :return: the array of the pixels
+    """
+    if isinstance(image, PackedImage):
+        return image.unpack(box)
+    if box is None:
+        return image
+    x, y, w, h = box
+    return image[y:y + h, x:x + w]
+
+def get_uncovered_areas(image: np.ndarray | PackedImage, box: tuple[int, int, int, int]) -> list[int]:
+    """
+    Gives the areas of the connected black regions of a part of the image, including the ones too small to be a sub
+    puzzle since they cannot be filled either
+    :param image: the image, packed or not
+    :param box: part of the image containing the regions (x, y, width, height)
+    :return: the areas of the regions in pixels
+    """
+    black_pixels = (get_image_region(image, box) == 0).astype(np.uint8)
+    areas = cv.connectedComponentsWithStats(black_pixels)[2][1:, cv.CC_STAT_AREA]  # first component is the background
+    return areas.tolist()
 
 def validate_puzzle(path_to_image: str) -> bool:
     """